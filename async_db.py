@@ -0,0 +1,235 @@
+# async_db.py
+# asyncio versions of db.fetch_all_store_items, update_store_qty and save_order on psycopg 3
+# (pip install psycopg), for lanes that run on one event loop such as checkout_server.py.
+# An order's statements are sent in pipeline mode: the customer upsert, the order, its
+# lines (priced from store on the server) and the stock take go out back to back without
+# waiting for each other's results. The lines are checked after one sync, then the commit
+# is sent, so a save costs two round trips where the sync path waits on five or six.
+# Ids that later statements need are looked up on the server (the customer by phone key,
+# the order by its sequence) instead of being read back first.
+#
+#   pool = AsyncPool()
+#   order_id = await save_order(pool, customer, cart, delivery_charge, grand_total)
+#   await pool.close()
+#
+# Connections come from AsyncPool, which only ever opens max_conn of them, so many orders
+# can be in flight on one loop at once. Reads go to the primary; replica routing
+# (db.read_connection) is only wired into the sync path so far.
+import asyncio
+from contextlib import asynccontextmanager
+
+import db
+from customers import normalize_phone
+from driver import psycopg, psycopg_rows
+from metrics import timed
+from money import to_rupees
+from stock_shards import STORE_ROWS
+
+ASYNC_POOL_MAX_CONN = 20
+
+# Statements for psycopg 3 (server-side binding: arrays are cast, nothing is inlined)
+ADD_QTY = "UPDATE store SET qty = qty + %s::integer WHERE item_id = %s::integer"
+ADD_QTY_SHARDED = "SELECT stock_give(%s::integer, %s::integer)"
+TAKE_QTY = (
+    "UPDATE store SET qty = store.qty - v.qty FROM unnest(%s::integer[], %s::integer[]) AS v(item_id, qty) "
+    "WHERE store.item_id = v.item_id"
+)
+TAKE_QTY_SHARDED = "SELECT stock_give(v.item_id, -v.qty) FROM unnest(%s::integer[], %s::integer[]) AS v(item_id, qty)"
+INSERT_CUSTOMER = "INSERT INTO customer (name, phone, address) VALUES (%s, %s, %s)"
+# as db.STATEMENTS["upsert_customer"]: a pickup order keeps the stored address
+UPSERT_CUSTOMER = (
+    "INSERT INTO customer (name, phone, address, phone_key) VALUES (%s, %s, %s, %s) "
+    "ON CONFLICT (phone_key) DO UPDATE "
+    "SET name = EXCLUDED.name, phone = EXCLUDED.phone, address = CASE "
+    "WHEN EXCLUDED.address = 'Pickup - collect at store' THEN customer.address ELSE EXCLUDED.address END "
+    "RETURNING customer_id, xmax = 0"
+)
+# the customer_id comes from the statement before: a known id, the row for a phone key,
+# or the row just inserted for a customer without a phone
+INSERT_ORDER = "INSERT INTO orders (customer_id, delivery_charge, grand_total) VALUES ({customer}, %s, %s) RETURNING order_id"
+CUSTOMER_BY_ID = "%s::integer"
+CUSTOMER_BY_PHONE = "(SELECT customer_id FROM customer WHERE phone_key = %s)"
+CUSTOMER_JUST_INSERTED = "currval(pg_get_serial_sequence('customer', 'customer_id'))"
+INSERT_ORDER_ITEMS = (
+    "INSERT INTO order_items (order_id, item_id, quantity, price) "
+    "SELECT currval(pg_get_serial_sequence('orders', 'order_id')), v.item_id, v.qty, store.price "
+    "FROM unnest(%s::integer[], %s::integer[]) AS v(item_id, qty) JOIN store ON store.item_id = v.item_id "
+    "RETURNING item_id"
+)
+
+
+async def connect(host=None, port=None):
+    return await psycopg.AsyncConnection.connect(
+        host=host or db.DB_HOST,
+        port=port or db.DB_PORT,
+        dbname=db.DB_NAME,
+        user=db.DB_USER,
+        password=db.DB_PASSWORD,
+    )
+
+
+class AsyncPool:
+    """
+    At most max_conn connections, opened on demand and shared by the tasks of one event
+    loop; a task waits for a free one. A connection that breaks is closed, not reused.
+    """
+
+    def __init__(self, max_conn=ASYNC_POOL_MAX_CONN, connect=connect):
+        self.max_conn = max_conn
+        self._connect = connect
+        self._idle = []
+        self._opened = 0
+        self._free = asyncio.Condition()
+        self.stats = {"created": 0, "reused": 0, "discarded": 0}
+
+    async def getconn(self):
+        async with self._free:
+            while True:
+                while self._idle:
+                    conn = self._idle.pop()
+                    if not conn.closed:
+                        self.stats["reused"] += 1
+                        return conn
+                    self._opened -= 1
+                    self.stats["discarded"] += 1
+                if self._opened < self.max_conn:
+                    self._opened += 1
+                    break
+                await self._free.wait()
+        try:
+            conn = await self._connect()
+        except BaseException:
+            async with self._free:
+                self._opened -= 1
+                self._free.notify()
+            raise
+        self.stats["created"] += 1
+        return conn
+
+    async def putconn(self, conn, broken=False):
+        if broken or conn.closed:
+            await conn.close()
+            self.stats["discarded"] += 1
+        async with self._free:
+            if broken or conn.closed:
+                self._opened -= 1
+            else:
+                self._idle.append(conn)
+            self._free.notify()
+
+    @asynccontextmanager
+    async def connection(self):
+        """A connection for the duration of an async with-block. Rolls back on error."""
+        conn = await self.getconn()
+        broken = False
+        try:
+            yield conn
+        except psycopg.OperationalError:
+            broken = True
+            raise
+        except BaseException:
+            try:
+                await conn.rollback()
+            except psycopg.Error:
+                broken = True
+            raise
+        finally:
+            await self.putconn(conn, broken=broken)
+
+    async def close(self):
+        async with self._free:
+            idle, self._idle = self._idle, []
+            self._opened -= len(idle)
+        for conn in idle:
+            await conn.close()
+
+
+@timed("async_db.fetch_all_store_items")
+async def fetch_all_store_items(pool):
+    async with pool.connection() as conn:
+        cur = conn.cursor(row_factory=psycopg_rows.dict_row)
+        await cur.execute((STORE_ROWS if db.SHARDED_STOCK else "SELECT * FROM store") + " ORDER BY item_id")
+        items = await cur.fetchall()
+        await conn.rollback()  # end the read transaction so the connection goes back idle
+    return items
+
+
+@timed("async_db.update_store_qty")
+async def update_store_qty(pool, item_id, qty_change):
+    """Decrease or increase stock. qty_change can be negative or positive"""
+    async with pool.connection() as conn:
+        async with conn.pipeline():
+            if db.SHARDED_STOCK:
+                await conn.execute(ADD_QTY_SHARDED, (item_id, qty_change))
+            else:
+                await conn.execute(ADD_QTY, (qty_change, item_id))
+            await conn.commit()
+
+
+def _order_customer(customer):
+    """(customer statement and params or None, the order's customer SQL and params, phone_key)."""
+    phone_key = normalize_phone(customer['phone'])
+    row = (customer['name'], customer['phone'], customer['address'])
+    if phone_key is None:
+        return (INSERT_CUSTOMER, row), (CUSTOMER_JUST_INSERTED, ()), None
+    customer_id = db.CUSTOMER_CACHE.get(phone_key, customer)
+    if customer_id is not None:
+        return None, (CUSTOMER_BY_ID, (customer_id,)), phone_key
+    return (UPSERT_CUSTOMER, row + (phone_key,)), (CUSTOMER_BY_PHONE, (phone_key,)), phone_key
+
+
+@timed("async_db.save_order")
+async def save_order(pool, customer, cart, delivery_charge, grand_total):
+    """db.save_order for asyncio: same rows, with the statements pipelined (see the top)."""
+    upsert, (customer_sql, customer_params), phone_key = _order_customer(customer)
+    item_ids = list(cart)
+    qtys = [cart[item_id] for item_id in item_ids]
+    try:
+        order_id, customer_cur = await _save_pipelined(
+            pool, upsert, customer_sql, customer_params, item_ids, qtys, delivery_charge, grand_total
+        )
+    except psycopg.IntegrityError:
+        if upsert is not None:
+            raise
+        # a cached customer row merged away by another process: the pool rolled the order
+        # back, so send it again once through the upsert
+        db.CUSTOMER_CACHE.discard(phone_key)
+        upsert, (customer_sql, customer_params), phone_key = _order_customer(customer)
+        order_id, customer_cur = await _save_pipelined(
+            pool, upsert, customer_sql, customer_params, item_ids, qtys, delivery_charge, grand_total
+        )
+    if customer_cur is not None and phone_key is not None:
+        customer_id, inserted = await customer_cur.fetchone()
+        if not inserted:
+            # as in db._customer_id: only rows that already existed are cached
+            db.CUSTOMER_CACHE.put(phone_key, customer_id, customer)
+    return order_id
+
+
+async def _save_pipelined(pool, upsert, customer_sql, customer_params, item_ids, qtys, delivery_charge, grand_total):
+    """Send the order's statements, check its lines and commit. Returns (order_id, customer cursor or None)."""
+    customer_cur = None
+    async with pool.connection() as conn:
+        async with conn.pipeline() as pipeline:
+            if upsert is not None:
+                customer_cur = conn.cursor()
+                await customer_cur.execute(*upsert)
+            order_cur = conn.cursor()
+            await order_cur.execute(
+                INSERT_ORDER.format(customer=customer_sql),
+                customer_params + (to_rupees(delivery_charge or 0), to_rupees(grand_total)),
+            )
+            if item_ids:
+                lines_cur = conn.cursor()
+                await lines_cur.execute(INSERT_ORDER_ITEMS, (item_ids, qtys))
+                await conn.execute(TAKE_QTY_SHARDED if db.SHARDED_STOCK else TAKE_QTY, (item_ids, qtys))
+            await pipeline.sync()
+
+            order_id = (await order_cur.fetchone())[0]
+            if item_ids:
+                found = {row[0] for row in await lines_cur.fetchall()}
+                missing = [item_id for item_id in item_ids if item_id not in found]
+                if missing:
+                    raise ValueError(f"Items not found in store: {missing}")  # rolled back by the pool
+            await conn.commit()
+    return order_id, customer_cur
@@ -0,0 +1,344 @@
+# batch_orders.py
+# Headless order replay: reads one order per line of JSONL and runs it through the same
+# cart, delivery and bill logic as the interactive flows, without any input() prompts.
+#
+#   python batch_orders.py orders.jsonl -o results.jsonl --backend nodb
+#   cat orders.jsonl | python batch_orders.py - --backend db
+#   python batch_orders.py orders.jsonl --workers 4    # nodb: 4 processes, one shared stock
+#
+# Input line:
+#   {"customer": {"name": "Asha", "phone": "98xxxxxx", "address": "12 Main St"},
+#    "items": {"1": 3, "4": 1},            # or [[1, 3], [4, 1]] or [{"item_id": 1, "qty": 3}]
+#    "delivery_km": 12.5}                  # omit (or "pickup": true) for pickup
+#
+# An item may be named instead of numbered ({"milk": 2} or {"name": "milk", "qty": 2}); it
+# resolves to the best in-stock match of the backend's name search (see search_index.py).
+#
+# Without delivery_km, "location": [lat, lon] or an address the delivery config can locate
+# is priced by zone (see delivery.py); an order that can't be priced becomes a pickup.
+#
+# Output line: the order's status, bill lines and totals. Orders/sec goes to stderr.
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+
+import driver
+from cart import Cart
+from inventory import make_inventory
+from metrics import timed
+from money import format_money
+from search_index import SearchIndex
+
+PICKUP_ADDRESS = "Pickup - collect at store"
+WORKER_CHUNK = 64   # orders handed to a worker process at a time
+
+
+class OrderError(Exception):
+    pass
+
+
+def parse_items(raw):
+    """
+    Accept {"id": qty}, [[id, qty], ...] or [{"item_id": id, "qty": qty}, ...]. An id that
+    isn't a number (or a {"name": ..., "qty": ...} entry) is kept as a name to search for.
+    """
+    if isinstance(raw, dict):
+        pairs = raw.items()
+    elif isinstance(raw, list):
+        pairs = [(entry["item_id"] if "item_id" in entry else entry["name"], entry["qty"])
+                 if isinstance(entry, dict) else entry for entry in raw]
+    else:
+        raise OrderError("'items' must be an object or a list.")
+    items = []
+    for item_id, qty in pairs:
+        if not isinstance(qty, int) or isinstance(qty, bool) or qty <= 0:
+            # int() would turn 1.7 into 1 and true into 1
+            raise OrderError(f"Quantity for item {item_id} must be a positive whole number, not {qty!r}.")
+        try:
+            item_id = int(item_id) if not isinstance(item_id, str) or item_id.strip().isdigit() else item_id.strip()
+        except (TypeError, ValueError):
+            raise OrderError(f"Bad item line: {item_id!r} x {qty!r}")
+        if item_id == "":
+            raise OrderError("Item name cannot be empty.")
+        items.append((item_id, qty))
+    if not items:
+        raise OrderError("Order has no items.")
+    return items
+
+
+class NoDBBackend:
+    """In-memory store from shopping_cart_noDB (or a given one); nothing is persisted."""
+    blocking = False
+
+    def __init__(self, store=None):
+        import shopping_cart_noDB as flow
+        self.flow = flow
+        if store is None:
+            store = make_inventory(flow.STORE_INITIAL, flow.INVENTORY_LAYOUT)
+        flow.STORE = store
+        self._index = None  # built on the first name lookup
+
+    def new_cart(self):
+        return self.flow.new_cart()
+
+    def search(self, text, limit):
+        if self._index is None:
+            self._index = SearchIndex.from_store(self.flow.STORE)
+        return self._index.search(text, limit)
+
+    def save(self, cart, customer, delivery_charge, grand_total):
+        pass
+
+
+class DBBackend:
+    """PostgreSQL via the same catalog cache, stock holds and order save as shopping_cart_withDB."""
+    blocking = True   # cart and save calls do database I/O
+
+    def __init__(self):
+        import db
+        import shopping_cart_withDB as flow
+        from catalog_cache import CatalogCache, ensure_catalog_schema
+        from customers import ensure_customer_schema
+        from reservations import (
+            OutOfStock, ReservedCart, ensure_reservations_table, new_session_id, save_reserved_order,
+        )
+        from stock_shards import ensure_stock_shards_schema
+        self.flow = flow
+        ensure_reservations_table()
+        ensure_catalog_schema()
+        ensure_customer_schema()
+        if db.SHARDED_STOCK:
+            ensure_stock_shards_schema()
+        self.catalog = CatalogCache()
+        self._reserved_cart = ReservedCart
+        self._new_session_id = new_session_id
+        self._save = save_reserved_order
+        self._out_of_stock = OutOfStock
+
+    def new_cart(self):
+        return self._reserved_cart(self._new_session_id(), self.catalog.get())
+
+    def search(self, text, limit):
+        return self.catalog.search(text, limit)
+
+    def save(self, cart, customer, delivery_charge, grand_total):
+        try:
+            self._save(cart.session_id, customer, cart, delivery_charge, grand_total)
+        except self._out_of_stock as e:
+            raise OrderError(str(e))
+
+
+class StorageBackend:
+    """
+    Any storage.Storage: the catalog is loaded once into a local store that carts take
+    stock from, and orders are saved through the storage.
+    """
+    blocking = False  # SQLite commits are local; cart moves must stay on one thread
+
+    def __init__(self, storage):
+        import shopping_cart_noDB as flow  # for the delivery rates; nothing here needs a DB driver
+        self.flow = flow
+        self.storage = storage
+        self.store = {item["item_id"]: item for item in storage.fetch_all_store_items()}
+        self.index = SearchIndex.from_store(self.store)
+
+    def new_cart(self):
+        return Cart(self.store)
+
+    def search(self, text, limit):
+        return self.index.search(text, limit)
+
+    def save(self, cart, customer, delivery_charge, grand_total):
+        self.storage.save_order(customer, cart, delivery_charge, grand_total)
+
+
+def sqlite_backend():
+    from shopping_cart_noDB import STORE_INITIAL
+    from storage import SQLiteStorage
+    return StorageBackend(SQLiteStorage(seed=STORE_INITIAL))
+
+
+BACKENDS = {"nodb": NoDBBackend, "db": DBBackend, "sqlite": sqlite_backend}
+
+
+def delivery_charge_for_order(pricing, order):
+    """
+    Charge in paise, or None for pickup. "delivery_km" wins; otherwise "location": [lat, lon]
+    or the customer's address is priced by zone (see delivery.py).
+    """
+    if order.get("delivery_km") is not None:
+        dist = float(order["delivery_km"])
+        if not (math.isfinite(dist) and dist >= 0):
+            # the interactive prompt only takes distances from 0 up
+            raise OrderError(f"Bad delivery_km: {order['delivery_km']!r}")
+        return pricing.charge_for_distance(dist)
+    if order.get("location"):
+        return pricing.quote_location(*order["location"]).charge
+    address = (order.get("customer") or {}).get("address")
+    quote = pricing.quote(address) if address else None
+    return quote.charge if quote else None
+
+
+@timed("batch.run_order", kind="stage")
+def run_order(backend, order):
+    """Place one order. Returns the result record; stock is given back if the order fails."""
+    if not isinstance(order, dict):
+        raise OrderError("An order line must be a JSON object.")
+    customer = dict(order.get("customer") or {})
+    if not customer.get("name"):
+        raise OrderError("Customer name cannot be empty.")
+    customer.setdefault("phone", "")
+    items = parse_items(order.get("items"))
+
+    cart = backend.new_cart()
+    try:
+        for item_id, qty in items:
+            if isinstance(item_id, str):
+                found = backend.search(item_id, 1)
+                if not found:
+                    raise OrderError(f"No item matches {item_id!r}.")
+                item_id = found[0]
+            if item_id not in cart.store:
+                raise OrderError(f"Invalid item ID {item_id}.")
+            if not cart.add(item_id, qty):
+                raise OrderError(f"Only {cart.store[item_id]['qty']} x {cart.store[item_id]['name']} in stock.")
+
+        delivery_charge = None
+        if not order.get("pickup"):
+            delivery_charge = delivery_charge_for_order(backend.flow.PRICING, order)
+        if delivery_charge is None:
+            # too far (or asked for pickup): same fallback as the interactive prompt
+            customer["address"] = PICKUP_ADDRESS
+        else:
+            customer.setdefault("address", "")
+
+        subtotal = cart.subtotal
+        grand_total = subtotal if delivery_charge is None else subtotal + delivery_charge
+        backend.save(cart, customer, delivery_charge, grand_total)
+    except Exception:
+        cart.clear()
+        raise
+
+    return {
+        "status": "ok",
+        "customer": customer,
+        "lines": [
+            {"item_id": item_id, "name": name, "qty": qty, "price": format_money(price), "total": format_money(total)}
+            for item_id, name, qty, price, total in cart.lines()
+        ],
+        "subtotal": format_money(subtotal),
+        "delivery_charge": format_money(delivery_charge or 0),
+        "grand_total": format_money(grand_total),
+    }
+
+
+def rejectable_errors():
+    """Errors that reject one order; the driver's only count once something has loaded it."""
+    errors = (OrderError, ValueError, KeyError, TypeError)
+    if driver.loaded():
+        # a deadlock, serialization failure or constraint hit by one order: report it, go on
+        errors += (driver.psycopg2.Error,)
+    return errors
+
+
+def run_line(backend, line_no, line):
+    """The result record for one JSONL line, or None if the line is blank."""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        result = run_order(backend, json.loads(line))
+    except rejectable_errors() as e:
+        result = {"status": "rejected", "error": str(e)}
+    result["line"] = line_no
+    return result
+
+
+def write_results(results, out):
+    """Write result records to out as JSONL. Returns (ok, failed)."""
+    ok = failed = 0
+    for result in results:
+        if result is None:
+            continue
+        if result["status"] == "ok":
+            ok += 1
+        else:
+            failed += 1
+        out.write(json.dumps(result) + "\n")
+    return ok, failed
+
+
+def replay(lines, out, backend):
+    """Run every JSONL order in lines, writing one result per order to out. Returns (ok, failed)."""
+    return write_results((run_line(backend, line_no, line) for line_no, line in enumerate(lines, start=1)), out)
+
+
+_worker_backend = None
+
+
+def _start_worker(store):
+    global _worker_backend
+    import shopping_cart_noDB as flow
+    flow.INVENTORY_LAYOUT = "shared"   # carts take stock with the block's locks
+    _worker_backend = NoDBBackend(store)
+
+
+def _run_numbered(numbered):
+    return run_line(_worker_backend, *numbered)
+
+
+def replay_parallel(lines, out, workers):
+    """
+    replay() for the nodb backend over several processes. They share one stock through a
+    private SharedInventory that is removed afterwards; results keep the input order.
+    """
+    from shared_inventory import SharedInventory
+    from shopping_cart_noDB import STORE_INITIAL
+
+    store = SharedInventory.create(f"shop_batch_{os.getpid()}", STORE_INITIAL)
+    try:
+        with multiprocessing.Pool(workers, _start_worker, (store,)) as pool:
+            results = pool.imap(_run_numbered, enumerate(lines, start=1), chunksize=WORKER_CHUNK)
+            return write_results(results, out)
+    finally:
+        store.unlink()
+        store.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay JSONL orders without prompts.")
+    parser.add_argument("input", nargs="?", default="-", help="JSONL file of orders, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="where to write JSONL results (default stdout)")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="nodb")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes sharing one stock (nodb backend only; default %(default)s)")
+    args = parser.parse_args(argv)
+    if args.workers > 1 and args.backend != "nodb":
+        parser.error("--workers needs the nodb backend")
+
+    backend = BACKENDS[args.backend]() if args.workers == 1 else None
+    src = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        start = time.perf_counter()
+        if backend is None:
+            ok, failed = replay_parallel(src, out, args.workers)
+        else:
+            ok, failed = replay(src, out, backend)
+        elapsed = time.perf_counter() - start
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if out is not sys.stdout:
+            out.close()
+    total = ok + failed
+    rate = total / elapsed if elapsed > 0 else float("inf")
+    print(f"{total} orders ({ok} ok, {failed} rejected) in {elapsed:.3f}s — {rate:,.0f} orders/sec", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# bench_async_db.py
+# Order saves per second: db.save_order on a thread pool (how checkout_server.py runs it)
+# versus async_db.save_order from one event loop, at several concurrency levels.
+# Each order is a returning customer buying CART_LINES throwaway items, which are created
+# for the run; the orders, their lines and the items are deleted afterwards.
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import async_db
+import db
+from customers import ensure_customer_schema
+
+ORDERS = 1000
+CART_LINES = 3
+CONCURRENCY = [1, 10, 50]
+
+CUSTOMER = {"name": "Bench Customer", "phone": "0000000000", "address": "Bench Street"}
+
+
+def make_items(count):
+    with db.pooled_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO store (name, price, qty) "
+            "SELECT 'bench async item ' || g, 10.00, 100000000 FROM generate_series(1, %s) AS g "
+            "RETURNING item_id",
+            (count,)
+        )
+        item_ids = [row[0] for row in cur.fetchall()]
+        conn.commit()
+        cur.close()
+    return item_ids
+
+
+def clean_up(item_ids, order_ids):
+    with db.pooled_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM order_items WHERE order_id = ANY(%s)", (order_ids,))
+        cur.execute("DELETE FROM orders WHERE order_id = ANY(%s)", (order_ids,))
+        cur.execute("DELETE FROM store WHERE item_id = ANY(%s)", (item_ids,))
+        conn.commit()
+        cur.close()
+
+
+def run_sync(cart, workers):
+    db.configure_pool(1, workers)
+    with ThreadPoolExecutor(workers) as executor:
+        start = time.perf_counter()
+        order_ids = list(executor.map(lambda _: db.save_order(CUSTOMER, cart, 5000, 8000), range(ORDERS)))
+        return time.perf_counter() - start, order_ids
+
+
+async def run_async(cart, workers):
+    pool = async_db.AsyncPool(workers)
+    try:
+        start = time.perf_counter()
+        order_ids = await asyncio.gather(*(async_db.save_order(pool, CUSTOMER, cart, 5000, 8000) for _ in range(ORDERS)))
+        return time.perf_counter() - start, list(order_ids)
+    finally:
+        await pool.close()
+
+
+def main():
+    ensure_customer_schema()
+    item_ids = make_items(CART_LINES)
+    cart = {item_id: 1 for item_id in item_ids}
+    order_ids = []
+    try:
+        print(f"{ORDERS} orders of {CART_LINES} lines each")
+        print(f"{'Concurrency':>11} {'Sync (orders/s)':>16} {'Async pipeline':>15} {'Speedup':>8}")
+        print("-" * 53)
+        for workers in CONCURRENCY:
+            sync_seconds, ids = run_sync(cart, workers)
+            order_ids += ids
+            async_seconds, ids = asyncio.run(run_async(cart, workers))
+            order_ids += ids
+            print(f"{workers:>11} {ORDERS / sync_seconds:>16,.0f} {ORDERS / async_seconds:>15,.0f} "
+                  f"{sync_seconds / async_seconds:>7.1f}x")
+    finally:
+        clean_up(item_ids, order_ids)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# bench_inventory_memory.py
+# Bytes per item for the dict-of-dicts store versus the slotted and columnar inventories.
+import gc
+import tracemalloc
+
+from inventory import make_inventory
+
+SIZES = [10_000, 100_000, 1_000_000]
+LAYOUTS = ["dict", "slots", "columnar"]
+
+
+def source_items(count):
+    # names and prices are generated on the fly so the source itself isn't measured
+    for item_id in range(1, count + 1):
+        yield item_id, {"name": f"Item {item_id}", "price": 10.0 + item_id % 500, "qty": item_id % 100}
+
+
+class _Source:
+    def __init__(self, count):
+        self.count = count
+
+    def items(self):
+        return source_items(self.count)
+
+
+def measure(layout, count):
+    gc.collect()
+    tracemalloc.start()
+    store = make_inventory(_Source(count), layout)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del store
+    return current / count
+
+
+def main():
+    print(f"{'Items':>10} " + " ".join(f"{layout + ' (B/item)':>18}" for layout in LAYOUTS))
+    print("-" * (11 + 19 * len(LAYOUTS)))
+    for count in SIZES:
+        row = [measure(layout, count) for layout in LAYOUTS]
+        print(f"{count:>10} " + " ".join(f"{value:>18.1f}" for value in row))
+
+
+if __name__ == "__main__":
+    main()
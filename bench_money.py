@@ -0,0 +1,38 @@
+# bench_money.py
+# A million line totals (price x qty, summed) with Decimal rupees versus integer paise.
+import random
+import time
+from decimal import Decimal
+
+from money import format_money, to_paise
+
+LINES = 1_000_000
+
+
+def main():
+    rng = random.Random(42)
+    prices = [Decimal(rng.randint(100, 99_999)).scaleb(-2) for _ in range(1000)]
+    lines = [(prices[rng.randrange(len(prices))], rng.randint(1, 20)) for _ in range(LINES)]
+    paise_lines = [(to_paise(price), qty) for price, qty in lines]
+
+    start = time.perf_counter()
+    subtotal = Decimal("0.00")
+    for price, qty in lines:
+        subtotal += price * qty
+    decimal_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    subtotal_paise = 0
+    for price, qty in paise_lines:
+        subtotal_paise += price * qty
+    paise_time = time.perf_counter() - start
+
+    assert f"{subtotal:.2f}" == format_money(subtotal_paise), "totals differ"
+    print(f"{LINES:,} line totals")
+    print(f"  Decimal : {decimal_time:.3f}s")
+    print(f"  paise   : {paise_time:.3f}s  ({decimal_time / paise_time:.1f}x faster)")
+    print(f"  subtotal: Rs {format_money(subtotal_paise)} (both)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# bench_prepared.py
+# What PREPARE/EXECUTE saves per order: the server's planning time for each statement of an
+# order (from EXPLAIN SUMMARY), and the wall time of saving orders with and without the
+# prepared statements in db.STATEMENTS.
+# Everything runs inside a transaction that is rolled back, so the database is left untouched.
+import re
+import time
+
+import db
+from customers import ensure_customer_schema
+from db import pooled_connection, _insert_order_batched
+
+CART_SIZES = [1, 10, 100]
+ROUNDS = 200
+
+CUSTOMER = {"name": "Bench Customer", "phone": "0000000000", "address": "Bench Street"}
+
+ORDER_STATEMENTS = ["upsert_customer", "insert_order", "store_prices", "insert_order_items", "store_take_qty"]
+
+
+def make_items(cur, count):
+    cur.execute(
+        "INSERT INTO store (name, price, qty) "
+        "SELECT 'bench item ' || g, 10.00, 1000000 FROM generate_series(1, %s) AS g "
+        "RETURNING item_id",
+        (count,)
+    )
+    return [row[0] for row in cur.fetchall()]
+
+
+def planning_ms(cur, name, params):
+    sql, _ = db.STATEMENTS[name]
+    cur.execute("EXPLAIN (SUMMARY) " + sql, params)
+    plan = "\n".join(row[0] for row in cur.fetchall())
+    return float(re.search(r"Planning Time: ([\d.]+) ms", plan).group(1))
+
+
+def order_planning_ms(cur, item_ids):
+    qtys = [1] * len(item_ids)
+    cur.execute("SELECT customer_id FROM customer LIMIT 1")
+    row = cur.fetchone()
+    customer_id = row[0] if row else 1
+    params = {
+        "upsert_customer": (CUSTOMER["name"], CUSTOMER["phone"], CUSTOMER["address"], CUSTOMER["phone"]),
+        "insert_order": (customer_id, 50, 100),
+        "store_prices": (item_ids,),
+        "insert_order_items": (1, item_ids, qtys, [10] * len(item_ids)),
+        "store_take_qty": (item_ids, qtys),
+    }
+    # median of a few EXPLAINs per statement, summed over the order
+    total = 0.0
+    for name in ORDER_STATEMENTS:
+        samples = sorted(planning_ms(cur, name, params[name]) for _ in range(5))
+        total += samples[len(samples) // 2]
+    return total
+
+
+def time_orders(cur, cart, prepared):
+    db.USE_PREPARED = prepared
+    _insert_order_batched(cur, CUSTOMER, cart, 50, 100)  # warm up (and PREPARE)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        _insert_order_batched(cur, CUSTOMER, cart, 50, 100)
+    return (time.perf_counter() - start) / ROUNDS
+
+
+def main():
+    ensure_customer_schema()
+    use_prepared = db.USE_PREPARED
+    try:
+        with pooled_connection() as conn:
+            cur = conn.cursor()
+            item_ids = make_items(cur, max(CART_SIZES))
+            print(f"{'Lines':>6} {'Planning/order (ms)':>20} {'Unprepared (ms)':>16} {'Prepared (ms)':>14} {'Saved':>7}")
+            print("-" * 68)
+            for size in CART_SIZES:
+                cart = {item_id: 1 for item_id in item_ids[:size]}
+                planning = order_planning_ms(cur, item_ids[:size])
+                plain = time_orders(cur, cart, prepared=False)
+                prepared = time_orders(cur, cart, prepared=True)
+                saved = (plain - prepared) / plain
+                print(f"{size:>6} {planning:>20.3f} {plain * 1000:>16.3f} {prepared * 1000:>14.3f} {saved:>6.0%}")
+            cur.close()
+            conn.rollback()
+    finally:
+        db.USE_PREPARED = use_prepared
+
+
+if __name__ == "__main__":
+    main()
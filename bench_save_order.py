@@ -0,0 +1,49 @@
+# bench_save_order.py
+# Compares the per-line save_order (3N+2 statements) with the batched one (5 statements).
+# Everything runs inside a transaction that is rolled back, so the database is left untouched.
+import time
+
+from customers import ensure_customer_schema
+from db import pooled_connection, _insert_order_per_line, _insert_order_batched
+
+CART_SIZES = [1, 10, 100]
+ROUNDS = 20
+
+CUSTOMER = {"name": "Bench Customer", "phone": "0000000000", "address": "Bench Street"}
+
+
+def make_items(cur, count):
+    cur.execute(
+        "INSERT INTO store (name, price, qty) "
+        "SELECT 'bench item ' || g, 10.00, 1000000 FROM generate_series(1, %s) AS g "
+        "RETURNING item_id",
+        (count,)
+    )
+    return [row[0] for row in cur.fetchall()]
+
+
+def time_variant(cur, insert_order, cart):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        insert_order(cur, CUSTOMER, cart, 50, 100)
+    return (time.perf_counter() - start) / ROUNDS
+
+
+def main():
+    ensure_customer_schema()
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        item_ids = make_items(cur, max(CART_SIZES))
+        print(f"{'Lines':>6} {'Per-line (ms)':>14} {'Batched (ms)':>13} {'Speedup':>8}")
+        print("-" * 44)
+        for size in CART_SIZES:
+            cart = {item_id: 1 for item_id in item_ids[:size]}
+            old = time_variant(cur, _insert_order_per_line, cart)
+            new = time_variant(cur, _insert_order_batched, cart)
+            print(f"{size:>6} {old * 1000:>14.2f} {new * 1000:>13.2f} {old / new:>7.1f}x")
+        cur.close()
+        conn.rollback()
+
+
+if __name__ == "__main__":
+    main()
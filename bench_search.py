@@ -0,0 +1,81 @@
+# bench_search.py
+# Name search at catalog scale: build time of the SearchIndex and per-query latency for
+# short and long prefixes and multi-word queries, over a synthetic catalog of ITEMS names.
+# Queries are timed cold (first time a prefix is seen) and warm (repeated).
+import gc
+import random
+import sys
+import time
+
+from search_index import SearchIndex
+
+ITEMS = 1_000_000
+TOP_K = 10
+ROUNDS = 200
+
+WORDS = (
+    "apple banana mango grape orange lemon lime onion potato tomato garlic ginger carrot "
+    "milk curd butter ghee paneer cheese cream bread bun cake cookie biscuit rusk toast "
+    "rice wheat flour atta maida sooji dal chana rajma moong masoor toor urad besan "
+    "salt sugar jaggery honey jam sauce ketchup pickle chutney oil mustard coconut "
+    "tea coffee juice soda water soap shampoo detergent brush paste towel tissue"
+).split()
+SIZES = ("100g", "250g", "500g", "1kg", "2kg", "5kg", "200ml", "500ml", "1L", "2L")
+BRANDS = ("Amul", "Tata", "Aashirvaad", "Fortune", "Britannia", "Parle", "Haldiram", "Nestle", "Dabur", "Patanjali")
+
+QUERIES = ["a", "m", "ap", "mil", "amul", "amul mil", "tata salt 1kg", "pan", "britannia bis", "zzz"]
+
+
+def make_catalog(count, seed=7):
+    rng = random.Random(seed)
+    return {
+        item_id: {
+            "name": f"{rng.choice(BRANDS)} {' '.join(rng.sample(WORDS, rng.randint(1, 2))).title()} {rng.choice(SIZES)}",
+            "qty": rng.choice((0, 5, 20, 100)),
+        }
+        for item_id in range(1, count + 1)
+    }
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else ITEMS
+    catalog = make_catalog(count)
+    start = time.perf_counter()
+    index = SearchIndex.from_store(catalog)
+    print(f"Indexed {count:,} items in {time.perf_counter() - start:.2f}s")
+    # the catalog and index live for the whole run: keep the cyclic GC from rescanning them
+    gc.collect()
+    gc.freeze()
+
+    print(f"{'Query':<16} {'Hits':>5} {'Cold (us)':>10} {'p50 (us)':>9} {'p99 (us)':>9}")
+    print("-" * 53)
+    for query in QUERIES:
+        start = time.perf_counter()
+        hits = index.search(query, TOP_K)
+        cold = time.perf_counter() - start
+        samples = []
+        for _ in range(ROUNDS):
+            start = time.perf_counter()
+            index.search(query, TOP_K)
+            samples.append(time.perf_counter() - start)
+        print(f"{query:<16} {len(hits):>5} {cold * 1e6:>10.0f} {percentile(samples, 0.5) * 1e6:>9.0f} "
+              f"{percentile(samples, 0.99) * 1e6:>9.0f}")
+
+    rng = random.Random(1)
+    samples = []
+    for _ in range(ROUNDS):
+        item_id = rng.randint(1, count)
+        catalog[item_id]["name"] = f"{rng.choice(BRANDS)} {rng.choice(WORDS).title()} {rng.choice(SIZES)}"
+        start = time.perf_counter()
+        index.update(item_id, catalog[item_id])
+        samples.append(time.perf_counter() - start)
+    print(f"\nRename (update) p50 {percentile(samples, 0.5) * 1e6:.0f}us, p99 {percentile(samples, 0.99) * 1e6:.0f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# bench_startup.py
+# How long a DB lane takes to put its first menu on screen.
+#   import   importing shopping_cart_withDB with psycopg2 deferred (as now) vs imported up front
+#   cold     a fresh lane process until the menu appears, with the warm-up thread off and on,
+#            and with the lazy catalog (see lazy_catalog.py) plus warm-up
+#   warm     the next customer's menu in a running lane (catalog already loaded, delta refresh)
+# Cold starts run `shopping_cart_withDB.main()` in a child process (unbuffered) and stop the
+# clock when the menu header is read from its stdout; the lane is then told to exit.
+import contextlib
+import os
+import subprocess
+import sys
+import time
+
+RUNS = 7
+MENU_MARK = "Welcome to the Store"
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def median(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2]
+
+
+def time_python(code):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=HERE, check=True)
+    return time.perf_counter() - start
+
+
+def time_to_menu(warm_up, lazy=False):
+    code = f"import shopping_cart_withDB as flow; flow.WARM_UP = {warm_up}; flow.LAZY_CATALOG = {lazy}; flow.main()"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-u", "-c", code], cwd=HERE, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+    )
+    for line in proc.stdout:
+        if MENU_MARK in line:
+            elapsed = time.perf_counter() - start
+            break
+    else:
+        raise RuntimeError(f"The lane exited (status {proc.wait()}) without showing a menu.")
+    proc.communicate("0\n")   # no items: the lane exits
+    return elapsed
+
+
+def time_warm_menu(runs):
+    import shopping_cart_withDB as flow
+    from catalog_cache import CatalogCache
+
+    catalog = flow._warm_up(CatalogCache())
+    samples = []
+    with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+        for _ in range(runs):
+            catalog.invalidate()  # every new customer past max_staleness pays for a delta refresh
+            start = time.perf_counter()
+            flow.print_menu(catalog.get())
+            samples.append(time.perf_counter() - start)
+    return median(samples)
+
+
+def main():
+    interpreter = median(time_python("pass") for _ in range(RUNS))
+    lazy = median(time_python("import shopping_cart_withDB") for _ in range(RUNS)) - interpreter
+    eager = median(time_python("import psycopg2, shopping_cart_withDB") for _ in range(RUNS)) - interpreter
+    cold_off = median(time_to_menu(False) for _ in range(RUNS))
+    cold_on = median(time_to_menu(True) for _ in range(RUNS))
+    cold_lazy = median(time_to_menu(True, lazy=True) for _ in range(RUNS))
+    warm = time_warm_menu(RUNS)
+
+    print(f"Median of {RUNS} runs (ms)")
+    print("-" * 48)
+    print(f"{'import, psycopg2 up front':<34} {eager * 1000:>10.1f}")
+    print(f"{'import, psycopg2 deferred':<34} {lazy * 1000:>10.1f}")
+    print(f"{'cold start to menu, no warm-up':<34} {cold_off * 1000:>10.1f}")
+    print(f"{'cold start to menu, warm-up':<34} {cold_on * 1000:>10.1f}")
+    print(f"{'cold start to menu, lazy + warm-up':<34} {cold_lazy * 1000:>10.1f}")
+    print(f"{'warm: next customer menu':<34} {warm * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
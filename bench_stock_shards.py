@@ -0,0 +1,79 @@
+# bench_stock_shards.py
+# Many lanes selling the same item at once: the plain single-row stock update versus the
+# item spread over N shards (see stock_shards.py).
+# Each worker has its own connection and sells one unit per transaction, holding the
+# transaction open for HOLD_MS (standing in for the rest of the order) before committing.
+# A throwaway item is created for the run and deleted afterwards.
+import threading
+import time
+
+from db import get_connection
+from stock_shards import ensure_stock_shards_schema, shard_item
+
+WORKERS = 32
+SALES_PER_WORKER = 50
+HOLD_MS = 2
+SHARD_COUNTS = [0, 4, 16, 32]   # 0 = the plain store row
+
+ROW_SALE = "UPDATE store SET qty = qty - 1 WHERE item_id = %s AND qty >= 1 RETURNING qty"
+SHARDED_SALE = "SELECT stock_take(%s, 1)"
+
+
+def worker(item_id, sale_sql, latencies, failures):
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        for _ in range(SALES_PER_WORKER):
+            start = time.perf_counter()
+            cur.execute(sale_sql, (item_id,))
+            row = cur.fetchone()
+            if row is None or row[0] is None:
+                failures.append(1)
+            time.sleep(HOLD_MS / 1000)
+            conn.commit()
+            latencies.append(time.perf_counter() - start)
+    finally:
+        cur.close()
+        conn.close()
+
+
+def run(item_id, shards):
+    shard_item(item_id, shards)
+    sale_sql = SHARDED_SALE if shards else ROW_SALE
+    latencies, failures = [], []
+    threads = [threading.Thread(target=worker, args=(item_id, sale_sql, latencies, failures)) for _ in range(WORKERS)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return len(latencies) / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)], len(failures)
+
+
+def main():
+    ensure_stock_shards_schema()
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("INSERT INTO store (name, price, qty) VALUES ('bench hot item', 10.00, 1000000) RETURNING item_id")
+    item_id = cur.fetchone()[0]
+    conn.commit()
+    try:
+        print(f"{WORKERS} lanes x {SALES_PER_WORKER} sales of one item, {HOLD_MS} ms per transaction")
+        print(f"{'Shards':>7} {'Sales/s':>9} {'p50 (ms)':>9} {'p95 (ms)':>9} {'Failed':>7}")
+        print("-" * 45)
+        for shards in SHARD_COUNTS:
+            rate, p50, p95, failed = run(item_id, shards)
+            label = shards if shards else "row"
+            print(f"{label:>7} {rate:>9.0f} {p50 * 1000:>9.2f} {p95 * 1000:>9.2f} {failed:>7}")
+    finally:
+        cur.execute("DELETE FROM store_stock_shards WHERE item_id = %s", (item_id,))
+        cur.execute("DELETE FROM store WHERE item_id = %s", (item_id,))
+        conn.commit()
+        cur.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
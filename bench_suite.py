@@ -0,0 +1,271 @@
+# bench_suite.py
+# Benchmarks for the cart flow, billing and persistence, with results written to JSON and
+# compared against a saved baseline.
+#
+#   python bench_suite.py --save-baseline          # record bench_baseline.json
+#   python bench_suite.py                          # run, write bench_results.json, compare
+#   python bench_suite.py --only save_order --quick
+#
+# The interactive functions (choose_items, edit_cart, remove_from_cart) are driven by a
+# scripted input() and their printing goes to /dev/null. Persistence runs against the
+# in-memory store and a throwaway SQLite file; bench_save_order.py covers PostgreSQL.
+# Each benchmark is repeated and the best round is kept, which is the least noisy number.
+# Exit status is 1 if anything is slower than the baseline by more than the tolerance.
+import argparse
+import builtins
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import shopping_cart_noDB as flow
+from cart import Cart
+from inventory import make_inventory
+from storage import MemoryStorage, SQLiteStorage
+
+RESULTS_PATH = "bench_results.json"
+BASELINE_PATH = "bench_baseline.json"
+TOLERANCE = 0.25                  # slower than baseline by more than this is a regression
+REPEATS = 5
+
+CATALOG_SIZES = [100, 1_000, 10_000]
+CART_SIZES = [1, 10, 100]
+
+CUSTOMER = {"name": "Bench Customer", "phone": "0000000000", "address": "Bench Street"}
+
+
+def make_catalog(count):
+    return {i: {"name": f"Item {i}", "price": 10.0 + i % 90, "qty": 1_000_000} for i in range(1, count + 1)}
+
+
+class ScriptedInput:
+    """Stands in for input(): hands out the given answers in order."""
+
+    def __init__(self):
+        self._answers = iter(())
+
+    def feed(self, answers):
+        self._answers = iter(answers)
+
+    def __call__(self, prompt=""):
+        try:
+            return next(self._answers)
+        except StopIteration:
+            raise RuntimeError(f"Script ran out of answers at prompt {prompt!r}") from None
+
+
+@contextlib.contextmanager
+def scripted_console():
+    script = ScriptedInput()
+    real_input = builtins.input
+    builtins.input = script
+    with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+        try:
+            yield script
+        finally:
+            builtins.input = real_input
+
+
+def best_of(run, ops, repeats):
+    """run() does ops operations and returns the seconds it spent; keep the best round."""
+    best = min(run() for _ in range(repeats))
+    return {"seconds_per_op": best / ops, "ops_per_sec": ops / best if best else 0.0, "ops": ops, "repeats": repeats}
+
+
+# --- cart flow ---------------------------------------------------------------
+
+def bench_choose_items(repeats, adds=50):
+    """One choose_items call adding `adds` lines (menu printed before each)."""
+    def run():
+        flow.STORE = make_inventory(flow.STORE_INITIAL, flow.INVENTORY_LAYOUT)
+        answers = []
+        for i in range(adds):
+            answers += [str(i % len(flow.STORE_INITIAL) + 1), "1", "y" if i < adds - 1 else "n"]
+        with scripted_console() as script:
+            script.feed(answers)
+            start = time.perf_counter()
+            flow.choose_items()
+            return time.perf_counter() - start
+    return best_of(run, adds, repeats)
+
+
+def bench_edit_cart(repeats, edits=200):
+    def run():
+        flow.STORE = make_inventory(flow.STORE_INITIAL, flow.INVENTORY_LAYOUT)
+        cart = Cart(flow.STORE, catalog=flow.STORE_INITIAL)
+        for item_id in flow.STORE_INITIAL:
+            cart.add(item_id, 1)
+        ids = list(flow.STORE_INITIAL)
+        answers = []
+        for i in range(edits):
+            answers += [str(ids[i % len(ids)]), str(2 + i % 3)]
+        with scripted_console() as script:
+            script.feed(answers)
+            start = time.perf_counter()
+            for _ in range(edits):
+                flow.edit_cart(cart)
+            return time.perf_counter() - start
+    return best_of(run, edits, repeats)
+
+
+def bench_remove_from_cart(repeats, rounds=40):
+    """remove_from_cart on every line of a full cart; refilling the cart is not timed."""
+    ids = list(flow.STORE_INITIAL)
+
+    def run():
+        flow.STORE = make_inventory(flow.STORE_INITIAL, flow.INVENTORY_LAYOUT)
+        cart = Cart(flow.STORE, catalog=flow.STORE_INITIAL)
+        elapsed = 0.0
+        with scripted_console() as script:
+            for _ in range(rounds):
+                for item_id in ids:
+                    cart.add(item_id, 1)
+                script.feed([str(item_id) for item_id in ids])
+                start = time.perf_counter()
+                for _ in ids:
+                    flow.remove_from_cart(cart)
+                elapsed += time.perf_counter() - start
+        return elapsed
+    return best_of(run, rounds * len(ids), repeats)
+
+
+def bench_print_bill(repeats, lines, bills=200):
+    catalog = make_catalog(lines)
+    cart = Cart(make_inventory(catalog))
+    for item_id in catalog:
+        cart.add(item_id, 2)
+
+    def run():
+        with scripted_console():
+            start = time.perf_counter()
+            for _ in range(bills):
+                flow.print_bill(cart, dict(CUSTOMER), 5000)
+            return time.perf_counter() - start
+    return best_of(run, bills, repeats)
+
+
+# --- persistence -----------------------------------------------------------------
+
+@contextlib.contextmanager
+def open_backend(kind, catalog):
+    if kind == "memory":
+        yield MemoryStorage(catalog)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = SQLiteStorage(os.path.join(tmp, "bench.db"), seed=catalog)
+        try:
+            yield storage
+        finally:
+            storage.close()
+
+
+def bench_fetch(repeats, kind, size, fetches=20):
+    with open_backend(kind, make_catalog(size)) as storage:
+        def run():
+            start = time.perf_counter()
+            for _ in range(fetches):
+                storage.fetch_all_store_items()
+            return time.perf_counter() - start
+        return best_of(run, fetches, repeats)
+
+
+def bench_save_order(repeats, kind, lines, orders=50):
+    catalog = make_catalog(max(CART_SIZES))
+    cart = {item_id: 1 for item_id in list(catalog)[:lines]}
+    with open_backend(kind, catalog) as storage:
+        def run():
+            start = time.perf_counter()
+            for _ in range(orders):
+                storage.save_order(CUSTOMER, cart, 5000, 10000)
+            return time.perf_counter() - start
+        return best_of(run, orders, repeats)
+
+
+def benchmarks(quick=False):
+    """(name, callable(repeats)) for every benchmark in the suite."""
+    catalog_sizes = CATALOG_SIZES[:2] if quick else CATALOG_SIZES
+    cases = [
+        ("cart.choose_items", bench_choose_items),
+        ("cart.edit_cart", bench_edit_cart),
+        ("cart.remove_from_cart", bench_remove_from_cart),
+    ]
+    for lines in CART_SIZES:
+        cases.append((f"bill.print_bill[lines={lines}]", lambda r, n=lines: bench_print_bill(r, n)))
+    for kind in ("memory", "sqlite"):
+        for size in catalog_sizes:
+            cases.append((f"{kind}.fetch_all_store_items[items={size}]", lambda r, k=kind, n=size: bench_fetch(r, k, n)))
+        for lines in CART_SIZES:
+            cases.append((f"{kind}.save_order[lines={lines}]", lambda r, k=kind, n=lines: bench_save_order(r, k, n)))
+    return cases
+
+
+# --- baseline comparison ---------------------------------------------------------
+
+def compare(results, baseline, tolerance):
+    """Print each result against the baseline. Returns the names that regressed."""
+    regressions = []
+    print(f"{'Benchmark':<42} {'per op':>11} {'baseline':>11} {'change':>8}")
+    print("-" * 76)
+    for name, result in results.items():
+        per_op = result["seconds_per_op"]
+        base = baseline.get(name, {}).get("seconds_per_op")
+        if base is None:
+            print(f"{name:<42} {per_op * 1e6:>9.1f}us {'-':>11} {'new':>8}")
+            continue
+        change = per_op / base - 1
+        flag = ""
+        if change > tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<42} {per_op * 1e6:>9.1f}us {base * 1e6:>9.1f}us {change:>+7.0%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the cart flow, billing and persistence.")
+    parser.add_argument("-o", "--output", default=RESULTS_PATH, help=f"results file (default {RESULTS_PATH})")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help=f"baseline to compare with (default {BASELINE_PATH})")
+    parser.add_argument("--save-baseline", action="store_true", help="also write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="allowed slowdown as a fraction before flagging a regression (default %(default)s)")
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--only", help="run only benchmarks whose name contains this")
+    parser.add_argument("--quick", action="store_true", help="skip the largest catalog size")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, run in benchmarks(args.quick):
+        if args.only and args.only not in name:
+            continue
+        print(f"  {name} ...", file=sys.stderr)
+        results[name] = run(args.repeats)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.tolerance)
+    print(f"\nResults written to {args.output}" + (f"; baseline saved to {args.baseline}" if args.save_baseline else ""))
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
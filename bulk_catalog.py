@@ -0,0 +1,198 @@
+# bulk_catalog.py
+# Bulk catalog loads and table dumps over COPY.
+# An import streams the CSV through COPY into a temp staging table and merges it into
+# `store` with one set-based statement, so a supplier feed of a few hundred thousand
+# price/qty changes is a handful of round trips instead of one UPDATE per item.
+#
+#   python bulk_catalog.py import feed.csv              # qty is the new stock on hand
+#   python bulk_catalog.py import feed.csv --add-qty    # qty is added to the stock
+#   python bulk_catalog.py export store store.csv
+#   python bulk_catalog.py export orders -              # to stdout
+#
+# The feed has a header row naming its columns: item_id plus any of name, price, qty. For
+# existing items an empty or missing column keeps the current value; unknown item_ids are
+# added when the row has a name and a price, and counted as skipped otherwise. If an item
+# appears twice, the later row wins. Rows that change nothing are left untouched, so the
+# catalog cache's delta refresh only sees real changes.
+import argparse
+import csv
+import sys
+import time
+
+import db
+from db import pooled_connection, read_connection
+
+FEED_COLUMNS = ("item_id", "name", "price", "qty")
+COPY_BUFFER = 1 << 16       # bytes per read while streaming to COPY
+
+STAGING_TABLE = """
+CREATE TEMP TABLE store_import (
+    line    BIGSERIAL,
+    item_id INTEGER NOT NULL,
+    name    TEXT,
+    price   NUMERIC(10, 2),
+    qty     INTEGER
+) ON COMMIT DROP
+"""
+
+# sharded items take their stock change through stock_give (see stock_shards.py); their
+# qty is then cleared from the staging rows so the merge leaves store.qty alone
+MOVE_SHARDED_QTY = """
+SELECT stock_give(f.item_id, CASE WHEN %(add_qty)s THEN f.qty ELSE f.qty - stock_level(f.item_id) END)
+FROM (SELECT DISTINCT ON (item_id) item_id, qty FROM store_import ORDER BY item_id, line DESC) f
+JOIN store s ON s.item_id = f.item_id
+WHERE s.stock_shards > 0 AND f.qty IS NOT NULL
+"""
+CLEAR_SHARDED_QTY = """
+UPDATE store_import i SET qty = NULL FROM store s WHERE s.item_id = i.item_id AND s.stock_shards > 0
+"""
+
+# SET and the change check read the store row being updated (not a snapshot of it), so an
+# --add-qty import doesn't lose a sale that commits while the merge runs
+MERGE = """
+WITH feed AS (
+    SELECT DISTINCT ON (item_id) item_id, name, price, qty
+    FROM store_import ORDER BY item_id, line DESC
+), updated AS (
+    UPDATE store s
+    SET name = coalesce(f.name, s.name),
+        price = coalesce(f.price, s.price),
+        qty = CASE WHEN f.qty IS NULL THEN s.qty WHEN %(add_qty)s THEN s.qty + f.qty ELSE f.qty END
+    FROM feed f
+    WHERE s.item_id = f.item_id
+      AND (s.name, s.price, s.qty) IS DISTINCT FROM (
+          coalesce(f.name, s.name),
+          coalesce(f.price, s.price),
+          CASE WHEN f.qty IS NULL THEN s.qty WHEN %(add_qty)s THEN s.qty + f.qty ELSE f.qty END
+      )
+    RETURNING s.item_id
+), inserted AS (
+    INSERT INTO store (item_id, name, price, qty)
+    SELECT f.item_id, f.name, f.price, coalesce(f.qty, 0)
+    FROM feed f
+    WHERE f.name IS NOT NULL AND f.price IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM store s WHERE s.item_id = f.item_id)
+    RETURNING item_id
+)
+SELECT (SELECT count(*) FROM feed),
+       (SELECT count(*) FROM feed f JOIN store s ON s.item_id = f.item_id),
+       (SELECT count(*) FROM updated),
+       (SELECT count(*) FROM inserted)
+"""
+
+# explicit item_ids skip the serial; move it past them so new rows don't collide
+BUMP_ITEM_SEQUENCE = """
+SELECT setval(pg_get_serial_sequence('store', 'item_id'), (SELECT max(item_id) FROM store))
+WHERE pg_get_serial_sequence('store', 'item_id') IS NOT NULL
+"""
+
+EXPORTS = {
+    "store": "SELECT item_id, name, price, {qty} AS qty FROM store ORDER BY item_id",
+    "orders": "SELECT * FROM orders ORDER BY order_id",
+    "order_items": "SELECT * FROM order_items ORDER BY order_id, item_id",
+}
+
+
+def feed_columns(header_line):
+    """The staging columns named by the CSV header row. ValueError if it doesn't fit."""
+    columns = [name.strip().lower() for name in next(csv.reader([header_line]))]
+    unknown = [name for name in columns if name not in FEED_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown column(s) {', '.join(unknown)}; expected {', '.join(FEED_COLUMNS)}.")
+    if "item_id" not in columns or len(columns) < 2 or len(set(columns)) != len(columns):
+        raise ValueError("The header needs item_id and at least one of name, price, qty, each once.")
+    return columns
+
+
+def import_csv(f, add_qty=False):
+    """
+    Merge the CSV in the text file f into store, in one transaction.
+    Returns {"rows", "items", "matched", "updated", "inserted", "skipped", "seconds"}.
+    """
+    start = time.perf_counter()
+    columns = feed_columns(f.readline())
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(STAGING_TABLE)
+        cur.copy_expert(f"COPY store_import ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", f, size=COPY_BUFFER)
+        rows = cur.rowcount
+        if db.SHARDED_STOCK and "qty" in columns:
+            cur.execute(MOVE_SHARDED_QTY, {"add_qty": add_qty})
+            cur.execute(CLEAR_SHARDED_QTY)
+        cur.execute(MERGE, {"add_qty": add_qty})
+        items, matched, updated, inserted = cur.fetchone()
+        if inserted:
+            cur.execute(BUMP_ITEM_SEQUENCE)
+        conn.commit()
+        cur.close()
+    return {
+        "rows": rows,
+        "items": items,
+        "matched": matched,
+        "updated": updated,
+        "inserted": inserted,
+        "skipped": items - matched - inserted,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def export_csv(table, f):
+    """Write a table (see EXPORTS) to the text file f as CSV with a header. Returns (rows, seconds)."""
+    query = EXPORTS[table]
+    if table == "store":
+        query = query.format(
+            qty="CASE WHEN stock_shards = 0 THEN qty ELSE stock_level(item_id) END" if db.SHARDED_STOCK else "qty"
+        )
+    start = time.perf_counter()
+    with read_connection() as conn:  # a replica if one is configured and current (see db.py)
+        cur = conn.cursor()
+        cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)", f, size=COPY_BUFFER)
+        rows = cur.rowcount
+        cur.close()
+        conn.rollback()  # end the read transaction so the connection goes back idle
+    return rows, time.perf_counter() - start
+
+
+def rate(rows, seconds):
+    return f"{rows / seconds:,.0f} rows/sec" if seconds > 0 else "- rows/sec"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load the catalog from CSV, or dump tables to CSV, via COPY.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    load = commands.add_parser("import", help="merge a CSV feed into store")
+    load.add_argument("csv", help="CSV file with a header row, or - for stdin")
+    load.add_argument("--add-qty", action="store_true", help="add qty to the stock instead of replacing it")
+    dump = commands.add_parser("export", help="write a table as CSV")
+    dump.add_argument("table", choices=sorted(EXPORTS))
+    dump.add_argument("csv", nargs="?", default="-", help="output file, or - for stdout (default)")
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        f = sys.stdin if args.csv == "-" else open(args.csv, newline="", encoding="utf-8")
+        try:
+            result = import_csv(f, add_qty=args.add_qty)
+        except ValueError as e:
+            parser.error(str(e))
+        finally:
+            if f is not sys.stdin:
+                f.close()
+        print(
+            f"{result['rows']} row(s) for {result['items']} item(s): {result['updated']} updated, "
+            f"{result['matched'] - result['updated']} unchanged, {result['inserted']} added, "
+            f"{result['skipped']} skipped (unknown item without name/price) "
+            f"in {result['seconds']:.2f}s — {rate(result['rows'], result['seconds'])}",
+            file=sys.stderr
+        )
+    else:
+        f = sys.stdout if args.csv == "-" else open(args.csv, "w", newline="", encoding="utf-8")
+        try:
+            rows, seconds = export_csv(args.table, f)
+        finally:
+            if f is not sys.stdout:
+                f.close()
+        print(f"Exported {rows} {args.table} row(s) in {seconds:.2f}s — {rate(rows, seconds)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
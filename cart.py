@@ -0,0 +1,128 @@
+# cart.py
+# A shopping cart that keeps its own totals.
+# Every add/edit/remove updates the running subtotal, line count and reserved quantity and
+# moves the stock in the store in the same call, so showing the cart never has to walk the
+# store again.
+from collections.abc import Mapping
+
+from money import to_paise
+
+
+class Cart(Mapping):
+    """
+    item_id -> qty, readable like the plain dict the cart used to be.
+
+    store is where stock is taken from and given back to. catalog is where names and
+    prices are read from when an item is first added (defaults to store); the price is
+    remembered per line so totals don't change if the catalog does mid-session.
+    Prices, line totals and the subtotal are integer paise (see money.py).
+    """
+
+    def __init__(self, store, catalog=None):
+        self.store = store
+        self.catalog = store if catalog is None else catalog
+        self._qty = {}
+        self._lines = {}          # item_id -> (name, price in paise)
+        self.subtotal = 0
+        self.reserved_qty = 0
+
+    # --- Mapping interface -------------------------------------------------
+
+    def __getitem__(self, item_id):
+        return self._qty[item_id]
+
+    def __iter__(self):
+        return iter(self._qty)
+
+    def __len__(self):
+        return len(self._qty)
+
+    def __contains__(self, item_id):
+        return item_id in self._qty
+
+    @property
+    def line_count(self):
+        return len(self._qty)
+
+    def name(self, item_id):
+        return self._lines[item_id][0]
+
+    def price(self, item_id):
+        return self._lines[item_id][1]
+
+    def lines(self):
+        """Yield (item_id, name, qty, price, line_total) for display."""
+        for item_id, qty in self._qty.items():
+            name, price = self._lines[item_id]
+            yield item_id, name, qty, price, price * qty
+
+    # --- Stock movement; overridden by carts that hold stock elsewhere ----
+
+    def _take_stock(self, item_id, qty):
+        """Take qty off the shelf. Returns False if there isn't enough."""
+        if self.store[item_id]["qty"] < qty:
+            return False
+        self.store[item_id]["qty"] -= qty
+        return True
+
+    def _return_stock(self, item_id, qty):
+        self.store[item_id]["qty"] += qty
+
+    def _return_all_stock(self):
+        for item_id, qty in self._qty.items():
+            self.store[item_id]["qty"] += qty
+
+    # --- Changes -------------------------------------------------------------
+
+    def _apply(self, item_id, delta):
+        new_qty = self._qty.get(item_id, 0) + delta
+        if item_id not in self._lines:
+            info = self.catalog[item_id]
+            self._lines[item_id] = (info["name"], to_paise(info["price"]))
+        price = self._lines[item_id][1]
+        if new_qty == 0:
+            del self._qty[item_id]
+            del self._lines[item_id]
+        else:
+            self._qty[item_id] = new_qty
+        self.reserved_qty += delta
+        self.subtotal += price * delta
+
+    def add(self, item_id, qty):
+        """Add qty of item_id, taking it from stock. Returns False if the stock ran out."""
+        if qty <= 0:
+            raise ValueError("Quantity to add must be positive.")
+        if not self._take_stock(item_id, qty):
+            return False
+        self._apply(item_id, qty)
+        return True
+
+    def set_qty(self, item_id, new_qty):
+        """Change the quantity of a line already in the cart (0 removes it). False if stock ran out."""
+        if new_qty < 0:
+            raise ValueError("Quantity cannot be negative.")
+        current = self._qty[item_id]
+        if new_qty > current:
+            if not self._take_stock(item_id, new_qty - current):
+                return False
+        elif new_qty < current:
+            self._return_stock(item_id, current - new_qty)
+        if new_qty != current:
+            self._apply(item_id, new_qty - current)
+        return True
+
+    def remove(self, item_id):
+        """Drop a line and give its stock back. Returns the quantity removed."""
+        qty = self._qty[item_id]
+        self._return_stock(item_id, qty)
+        self._apply(item_id, -qty)
+        return qty
+
+    def clear(self):
+        """Cancel: give every line's stock back and empty the cart."""
+        if self._qty:
+            self._return_all_stock()
+        self._qty.clear()
+        self._lines.clear()
+        self.subtotal = 0
+        self.reserved_qty = 0
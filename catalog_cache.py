@@ -0,0 +1,177 @@
+# catalog_cache.py
+# In-process copy of the `store` table for the checkout loop.
+# The catalog is loaded once; after that only rows whose `updated_at` moved since the last
+# sync are fetched and patched into the same dict, so a new customer costs one small query
+# instead of a full reload. The name search index (see search_index.py) is built on first
+# use and patched with the same changed rows. Refreshes read from a replica when one is
+# configured (see db.read_connection), so menu stock may trail the primary by a few seconds;
+# stock holds and order saves are always checked on the primary.
+# Deleted items are recorded in `store_deletions` by a trigger and dropped by the next
+# delta; a cache that has not synced for longer than those records are kept reloads fully.
+# Refreshes are serialized, so lanes on several threads can share one cache.
+import threading
+import time
+
+import db
+from db import is_replica, pooled_connection, read_connection
+from driver import extras
+from metrics import timed
+from search_index import SearchIndex
+from stock_shards import STORE_ROWS
+
+CATALOG_MAX_STALENESS = 5.0     # seconds a cached catalog may be served without a delta refresh
+SYNC_OVERLAP = 2.0              # seconds re-read on every delta, covers transactions committing late
+DELETION_RETENTION = 24 * 3600  # seconds store_deletions keeps a deleted item_id
+
+CATALOG_SCHEMA = """
+ALTER TABLE store ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+CREATE INDEX IF NOT EXISTS store_updated_at_idx ON store (updated_at);
+CREATE OR REPLACE FUNCTION store_touch_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := clock_timestamp();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+DROP TRIGGER IF EXISTS store_touch_updated_at ON store;
+CREATE TRIGGER store_touch_updated_at BEFORE UPDATE ON store
+    FOR EACH ROW EXECUTE FUNCTION store_touch_updated_at();
+CREATE TABLE IF NOT EXISTS store_deletions (
+    item_id    INTEGER     NOT NULL,
+    deleted_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+);
+CREATE INDEX IF NOT EXISTS store_deletions_deleted_at_idx ON store_deletions (deleted_at);
+CREATE OR REPLACE FUNCTION store_record_deletion() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO store_deletions (item_id) VALUES (OLD.item_id);
+    DELETE FROM store_deletions WHERE deleted_at < clock_timestamp() - interval '%(retention)s seconds';
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+DROP TRIGGER IF EXISTS store_record_deletion ON store;
+CREATE TRIGGER store_record_deletion AFTER DELETE ON store
+    FOR EACH ROW EXECUTE FUNCTION store_record_deletion();
+""" % {"retention": DELETION_RETENTION}
+
+# item_ids deleted since the last sync and not added back since
+DELETED_SINCE = (
+    "SELECT DISTINCT d.item_id FROM store_deletions d "
+    "WHERE d.deleted_at > %s - %s * interval '1 second' "
+    "AND NOT EXISTS (SELECT 1 FROM store WHERE store.item_id = d.item_id)"
+)
+
+
+def ensure_catalog_schema():
+    """Add the updated_at column, the deletions table and the triggers that delta refreshes rely on."""
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(CATALOG_SCHEMA)
+        conn.commit()
+        cur.close()
+
+
+class CatalogCache:
+    """
+    item_id -> item dict, kept close to the database.
+
+    get() serves the cached dict while it is younger than max_staleness and otherwise
+    patches in the rows changed (and drops those deleted) since the last sync. Item dicts
+    are updated in place, so references held by a cart stay valid.
+    """
+
+    def __init__(self, max_staleness=CATALOG_MAX_STALENESS):
+        self.max_staleness = max_staleness
+        self.items = {}
+        self._synced_at = None        # database clock of the last sync
+        self._checked_at = None       # local monotonic clock of the last sync (None: refresh on next get)
+        self._synced_mono = None      # the same, kept by invalidate()
+        self._synced_on_replica = False
+        self._index = None            # SearchIndex over items, built by the first search
+        self._lock = threading.RLock()  # refreshes, the index and stats
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "full_loads": 0,
+            "delta_refreshes": 0,
+            "rows_patched": 0,
+            "rows_deleted": 0,
+            "refresh_seconds": 0.0,
+        }
+
+    def get(self):
+        with self._lock:
+            # a lane that waited for another's refresh gets its result without refreshing again
+            if self._checked_at is not None and time.monotonic() - self._checked_at < self.max_staleness:
+                self.stats["hits"] += 1
+                return self.items
+            self.stats["misses"] += 1
+            self.refresh()
+            return self.items
+
+    @property
+    def index(self):
+        with self._lock:
+            if self._index is None:
+                self._index = SearchIndex.from_store(self.items)
+            return self._index
+
+    def search(self, text, limit):
+        """Item ids best matching text (see SearchIndex.search)."""
+        with self._lock:
+            return self.index.search(text, limit)
+
+    @timed("db.catalog_refresh")
+    def refresh(self, full=False):
+        with self._lock:
+            self._refresh(full)
+
+    def _refresh(self, full):
+        start = time.perf_counter()
+        if self._synced_mono is not None and time.monotonic() - self._synced_mono > DELETION_RETENTION / 2:
+            full = True  # deletions from before the last sync may have been pruned already
+        with read_connection() as conn:
+            cur = conn.cursor(cursor_factory=extras.RealDictCursor)
+            cur.execute("SELECT now() AS synced_at")
+            synced_at = cur.fetchone()["synced_at"]
+            rows_sql = STORE_ROWS if db.SHARDED_STOCK else "SELECT * FROM store"
+            if full or self._synced_at is None:
+                cur.execute(rows_sql + " ORDER BY item_id")
+                self.items = {row["item_id"]: row for row in cur.fetchall()}
+                self._index = None
+                self.stats["full_loads"] += 1
+            else:
+                # sharded items sell without touching their store row, so they are always re-read
+                changed = "updated_at > %s - %s * interval '1 second'"
+                if db.SHARDED_STOCK:
+                    changed += " OR stock_shards > 0"
+                overlap = SYNC_OVERLAP
+                if is_replica(conn) or self._synced_on_replica:
+                    # a row may turn up on the replica up to that much after its updated_at
+                    overlap += db.get_read_router().staleness_bound
+                cur.execute(DELETED_SINCE, (self._synced_at, overlap))
+                deleted = [row["item_id"] for row in cur.fetchall()]
+                for item_id in deleted:
+                    if self.items.pop(item_id, None) is not None and self._index is not None:
+                        self._index.update(item_id, None)
+                cur.execute(rows_sql + f" WHERE {changed} ORDER BY item_id", (self._synced_at, overlap))
+                rows = cur.fetchall()
+                for row in rows:
+                    item = self.items.get(row["item_id"])
+                    if item is None:
+                        self.items[row["item_id"]] = row
+                    else:
+                        item.update(row)
+                    if self._index is not None:
+                        self._index.update(row["item_id"], self.items[row["item_id"]])
+                self.stats["delta_refreshes"] += 1
+                self.stats["rows_patched"] += len(rows)
+                self.stats["rows_deleted"] += len(deleted)
+            cur.close()
+            conn.rollback()
+        self._synced_at = synced_at
+        self._synced_on_replica = is_replica(conn)
+        self._checked_at = self._synced_mono = time.monotonic()
+        self.stats["refresh_seconds"] += time.perf_counter() - start
+
+    def invalidate(self):
+        """Force the next get() to refresh, e.g. right after this process wrote stock."""
+        self._checked_at = None
@@ -0,0 +1,95 @@
+# checkout_client.py
+# Replays scripted customer sessions against checkout_server.py, many at once.
+# A script is a list of answers, sent one per "? " prompt; the session ends when the
+# script runs out or the server hangs up. Reports sessions/sec and how many sessions
+# reached a bill.
+#
+#   python checkout_client.py --sessions 500 --concurrency 200
+#   python checkout_client.py --script sessions.jsonl      # one JSON list of answers per line
+import argparse
+import asyncio
+import json
+import time
+
+from checkout_server import DEFAULT_HOST, DEFAULT_PORT, PROMPT_PREFIX
+
+# buy 1 apple, check out as pickup, then leave
+DEFAULT_SCRIPT = ["1", "1", "n", "1", "Load Test", "0000000000", "2", "n"]
+
+
+async def run_session(host, port, answers, transcript=None):
+    """Play one session. Returns True if a bill was printed."""
+    reader, writer = await asyncio.open_connection(host, port)
+    answers = iter(answers)
+    billed = False
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            text = line.decode(errors="replace").rstrip("\n")
+            if transcript is not None:
+                transcript.append(text)
+            if "GRAND TOTAL" in text:
+                billed = True
+            if text.startswith(PROMPT_PREFIX):
+                answer = next(answers, None)
+                if answer is None:
+                    break
+                writer.write((answer + "\n").encode())
+                await writer.drain()
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+    return billed
+
+
+async def replay(host, port, scripts, sessions, concurrency):
+    limit = asyncio.Semaphore(concurrency)
+    results = {"billed": 0, "unbilled": 0, "errors": 0}
+
+    async def one(n):
+        async with limit:
+            try:
+                billed = await run_session(host, port, scripts[n % len(scripts)])
+                results["billed" if billed else "unbilled"] += 1
+            except OSError:
+                results["errors"] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(sessions)))
+    return results, time.perf_counter() - start
+
+
+def load_scripts(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay scripted sessions against the checkout server.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--script", help="JSONL file, one list of answers per session")
+    parser.add_argument("--show", action="store_true", help="print the transcript of one session and exit")
+    args = parser.parse_args(argv)
+
+    scripts = load_scripts(args.script) if args.script else [DEFAULT_SCRIPT]
+    if args.show:
+        transcript = []
+        asyncio.run(run_session(args.host, args.port, scripts[0], transcript))
+        print("\n".join(transcript))
+        return
+    results, elapsed = asyncio.run(replay(args.host, args.port, scripts, args.sessions, args.concurrency))
+    rate = args.sessions / elapsed if elapsed > 0 else float("inf")
+    print(f"{args.sessions} sessions at concurrency {args.concurrency} in {elapsed:.2f}s "
+          f"({rate:,.0f} sessions/sec): {results}")
+
+
+if __name__ == "__main__":
+    main()
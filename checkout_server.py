@@ -0,0 +1,384 @@
+# checkout_server.py
+# Many checkout lanes in one process: an asyncio TCP server where every connection is an
+# independent customer session running the same menu -> cart -> checkout flow as the console
+# scripts. All sessions share one catalog and one stock view (the in-memory store, or the
+# catalog cache plus database holds); blocking database work runs on a bounded thread pool
+# so a slow query never stalls the other lanes.
+#
+# Line protocol: the server sends plain text lines; a line starting with "? " is a prompt
+# and the client answers with one line. Works with `nc localhost 8765` too.
+#
+#   python checkout_server.py --backend nodb --port 8765
+#   python checkout_client.py --port 8765 --sessions 500 --concurrency 200
+import argparse
+import asyncio
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from batch_orders import BACKENDS, PICKUP_ADDRESS
+from money import format_money
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DB_WORKERS = 16            # upper bound on concurrent blocking DB calls
+MENU_PAGE_SIZE = 20
+PROMPT_PREFIX = "? "
+
+
+class SessionClosed(Exception):
+    pass
+
+
+class Session:
+    """One customer lane on one connection."""
+
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.backend = server.backend
+        self.reader = reader
+        self.writer = writer
+
+    # --- I/O -------------------------------------------------------------
+
+    async def say(self, text=""):
+        self.writer.write((text + "\n").encode())
+        await self.writer.drain()
+
+    async def ask(self, prompt):
+        await self.say(PROMPT_PREFIX + prompt)
+        line = await self.reader.readline()
+        if not line:
+            raise SessionClosed()
+        return line.decode(errors="replace").strip()
+
+    async def ask_int(self, prompt, min_value=None, max_value=None):
+        while True:
+            try:
+                val = int(await self.ask(prompt))
+            except ValueError:
+                await self.say("Please enter a valid integer.")
+                continue
+            if min_value is not None and val < min_value:
+                await self.say(f"Value must be at least {min_value}.")
+                continue
+            if max_value is not None and val > max_value:
+                await self.say(f"Value must be at most {max_value}.")
+                continue
+            return val
+
+    async def ask_float(self, prompt, min_value=None):
+        while True:
+            try:
+                val = float(await self.ask(prompt))
+            except ValueError:
+                await self.say("Please enter a valid number.")
+                continue
+            if min_value is not None and val < min_value:
+                await self.say(f"Value must be at least {min_value}.")
+                continue
+            return val
+
+    async def ask_yes(self, prompt):
+        answer = (await self.ask(prompt)).lower()
+        while answer not in ("y", "yes", "n", "no"):
+            await self.say("Invalid input. Try again.")
+            answer = (await self.ask(prompt)).lower()
+        return answer in ("y", "yes")
+
+    # --- Rendering (same layout as the console scripts) ------------------
+
+    async def show_menu(self, store, name_filter=None):
+        await self.say("\nWelcome to the Store — Available Items")
+        if name_filter:
+            await self.say(f"(showing items matching '{name_filter}')")
+        await self.say("-" * 44)
+        await self.say(f"{'ID':<3} {'Item':<18} {'Price(Rs)':>9} {'Stock':>8}")
+        await self.say("-" * 44)
+        if name_filter:
+            # ranked name search (see search_index.py), best matches first
+            matches = await self.server.call(self.backend.search, name_filter, MENU_PAGE_SIZE)
+            rows = [(item_id, store[item_id]) for item_id in matches]
+        else:
+            rows = list(store.items())
+        shown = 0
+        for item_id, info in rows:
+            if shown and shown % MENU_PAGE_SIZE == 0:
+                if (await self.ask("-- Enter for more, q to stop --")).lower() == "q":
+                    break
+            await self.say(f"{item_id:<3} {info['name']:<18} {info['price']:>9.2f} {info['qty']:>8}")
+            shown += 1
+        if shown == 0:
+            await self.say("No matching items.")
+        await self.say("-" * 44)
+
+    async def show_cart(self, cart):
+        if not cart:
+            await self.say("\nCart is empty.")
+            return
+        lines = ["\nCurrent Cart:", "-" * 60, f"{'ID':<3} {'Item':<25} {'Qty':>5} {'Price':>9} {'Total':>10}", "-" * 60]
+        for item_id, name, qty, price, total in cart.lines():
+            lines.append(f"{item_id:<3} {name:<25} {qty:>5} {format_money(price):>9} {format_money(total):>10}")
+        lines += ["-" * 60, f"{'Subtotal':<44} {format_money(cart.subtotal):>12}"]
+        await self.say("\n".join(lines))
+
+    async def show_bill(self, cart, customer, delivery_charge, grand_total):
+        lines = [
+            "\n" + "=" * 60, " " * 20 + "FINAL BILL", "=" * 60,
+            f"Customer: {customer['name']}", f"Phone:    {customer['phone']}", f"Address:  {customer['address']}",
+            "-" * 60, f"{'Item':<25} {'Qty':>5} {'Price(Rs)':>12} {'Total(Rs)':>12}", "-" * 60,
+        ]
+        for _, name, qty, price, total in cart.lines():
+            lines.append(f"{name:<25} {qty:>5} {format_money(price):>12} {format_money(total):>12}")
+        lines += ["-" * 60, f"{'Subtotal':<44} {format_money(cart.subtotal):>12}"]
+        if delivery_charge is None:
+            lines.append(f"{'Delivery (pickup)':<44} {format_money(0):>12}")
+        else:
+            lines.append(f"{'Delivery charge':<44} {format_money(delivery_charge):>12}")
+        lines += ["=" * 60, f"{'GRAND TOTAL (Rs)':<44} {format_money(grand_total):>12}", "=" * 60,
+                  "Thank you for shopping with us!", "=" * 60]
+        await self.say("\n".join(lines))
+
+    # --- Flow ----------------------------------------------------------------
+
+    async def choose_items(self, cart):
+        store = cart.store
+        name_filter = None
+        while True:
+            await self.show_menu(store, name_filter)
+            await self.say("Enter the ID of the item to add to cart (or 0 to finish, /name to search, / to show all):")
+            answer = await self.ask("Item ID:")
+            if answer.startswith("/"):
+                name_filter = answer[1:].strip() or None
+                continue
+            try:
+                item_id = int(answer)
+            except ValueError:
+                await self.say("Please enter a valid integer.")
+                continue
+            if item_id == 0:
+                break
+            if item_id not in store:
+                await self.say("Invalid item ID. Try again.")
+                continue
+            store_qty = store[item_id]["qty"]
+            if store_qty <= 0:
+                await self.say(f"Sorry, {store[item_id]['name']} is OUT OF STOCK.")
+                continue
+            qty = await self.ask_int(f"Enter quantity (1 to {store_qty}):", min_value=1, max_value=store_qty)
+            if not await self.server.call(cart.add, item_id, qty):
+                await self.say(f"Sorry, only {store[item_id]['qty']} x {store[item_id]['name']} left (sold at another counter).")
+                continue
+            await self.say(f"Added {qty} x {store[item_id]['name']} to cart.")
+            if not await self.ask_yes("Add more items? (y/n):"):
+                break
+        if not cart:
+            await self.say("No items selected.")
+
+    async def edit_cart(self, cart):
+        if not cart:
+            await self.say("Cart is empty. Nothing to edit.")
+            return
+        await self.show_cart(cart)
+        item_id = await self.ask_int("Enter the item ID to edit (0 to cancel):", min_value=0)
+        if item_id == 0 or item_id not in cart:
+            return
+        current_qty = cart[item_id]
+        available = cart.store[item_id]["qty"] + current_qty
+        new_qty = await self.ask_int(
+            f"Enter new quantity for {cart.name(item_id)} (0 to remove, max {available}):",
+            min_value=0, max_value=available
+        )
+        name = cart.name(item_id)
+        if new_qty == current_qty:
+            await self.say("Quantity unchanged.")
+        elif not await self.server.call(cart.set_qty, item_id, new_qty):
+            await self.say("Not enough stock to increase to that quantity.")
+        elif new_qty == 0:
+            await self.say(f"Removed {name} from cart.")
+        elif new_qty > current_qty:
+            await self.say(f"Increased {name} to {new_qty}.")
+        else:
+            await self.say(f"Decreased {name} to {new_qty}.")
+
+    async def remove_from_cart(self, cart):
+        if not cart:
+            await self.say("Cart is empty. Nothing to remove.")
+            return
+        await self.show_cart(cart)
+        item_id = await self.ask_int("Enter the item ID to remove (0 to cancel):", min_value=0)
+        if item_id == 0 or item_id not in cart:
+            return
+        name = cart.name(item_id)
+        qty = await self.server.call(cart.remove, item_id)
+        await self.say(f"Removed {qty} x {name} from cart.")
+
+    async def manage_cart(self, cart):
+        """Returns True to check out, False if the order was cancelled."""
+        while True:
+            if not cart:
+                await self.say("\nYour cart is empty. Please add items before checkout.")
+                await self.choose_items(cart)
+                if not cart:
+                    await self.say("No items added. Cancelling order.")
+                    return False
+                continue
+            await self.show_cart(cart)
+            await self.say("\nCart options:\n1) Proceed to checkout\n2) Edit item quantity\n3) Remove item"
+                           "\n4) Add more items\n5) Cancel order")
+            choice = await self.ask("Choose an option (1-5):")
+            if choice == "1":
+                return True
+            elif choice == "2":
+                await self.edit_cart(cart)
+            elif choice == "3":
+                await self.remove_from_cart(cart)
+            elif choice == "4":
+                await self.choose_items(cart)
+            elif choice == "5":
+                await self.server.call(cart.clear)
+                return False
+            else:
+                await self.say("Invalid option. Please enter a number between 1 and 5.")
+
+    async def checkout(self, cart):
+        await self.say("\n--- Customer Details ---")
+        name = await self.ask("Full name:")
+        while not name:
+            await self.say("Name cannot be empty.")
+            name = await self.ask("Full name:")
+        customer = {"name": name, "phone": await self.ask("Phone number:")}
+
+        delivery_charge = None
+        while True:
+            await self.say("\nDelivery options:\n1) Delivery\n2) Pickup")
+            choice = await self.ask("Select 1 for Delivery or 2 for Pickup:")
+            if choice in ("1", "2"):
+                break
+            await self.say("Invalid choice. Please select 1 or 2.")
+        if choice == "1":
+            customer["address"] = await self.ask("Address (for delivery/pickup):")
+            pricing = self.backend.flow.PRICING
+            quote = pricing.quote(customer["address"]) if customer["address"] else None
+            zone = pricing.zone_named(quote.zone) if quote is not None and quote.zone else None
+            while delivery_charge is None:
+                if quote is not None:
+                    dist, delivery_charge = quote.distance_km, quote.charge
+                    await self.say(f"Distance from store: {dist:.1f} km" + (f" ({quote.zone})" if quote.zone else ""))
+                    quote = None
+                else:
+                    dist = await self.ask_float("Enter distance from store in km (e.g. 12.5):", min_value=0.0)
+                    delivery_charge = self.backend.flow.delivery_charge_for(dist, zone)
+                if delivery_charge is not None:
+                    await self.say(f"Delivery available. Charge: Rs {format_money(delivery_charge)}")
+                    break
+                await self.say(pricing.unavailable_message(dist))
+                if await self.ask("Choose: (1) Enter another distance  (2) Pickup instead. Select 1 or 2:") != "1":
+                    await self.say("You chose pickup. No delivery will be applied.")
+                    customer["address"] = PICKUP_ADDRESS
+                    break
+        else:
+            customer["address"] = PICKUP_ADDRESS
+            await self.say("Pickup selected. No delivery charge will be applied.")
+
+        grand_total = cart.subtotal if delivery_charge is None else cart.subtotal + delivery_charge
+        await self.show_bill(cart, customer, delivery_charge, grand_total)
+        try:
+            await self.server.call(self.backend.save, cart, customer, delivery_charge, grand_total)
+        except Exception as e:
+            await self.server.call(cart.clear)
+            await self.say(f"Order could not be saved: {e}")
+            return
+        self.server.stats["orders"] += 1
+        await self.say("Order saved!")
+
+    async def run(self):
+        await self.say("=== Simple Console Shopping Cart ===")
+        while True:
+            cart = await self.server.call(self.backend.new_cart)
+            try:
+                await self.choose_items(cart)
+                if not cart:
+                    await self.say("No purchase made. Goodbye.")
+                    return
+                if await self.manage_cart(cart):
+                    await self.checkout(cart)
+                else:
+                    await self.say("Order cancelled.")
+            except Exception:
+                # customer walked away, or the database failed mid-order: put their stock back
+                if cart:
+                    try:
+                        await self.server.call(cart.clear)
+                    except Exception as e:
+                        print(f"Session: could not release the cart ({e!r}); its holds expire on their own.",
+                              file=sys.stderr)
+                raise
+            if not await self.ask_yes("Process another customer? (y/n):"):
+                await self.say("Goodbye.")
+                return
+
+
+class CheckoutServer:
+
+    def __init__(self, backend, db_workers=DB_WORKERS):
+        self.backend = backend
+        self.executor = ThreadPoolExecutor(max_workers=db_workers, thread_name_prefix="db")
+        self.stats = {"sessions": 0, "active": 0, "orders": 0, "disconnects": 0, "errors": 0}
+
+    async def call(self, fn, *args):
+        """Run fn on the DB pool if the backend blocks, inline otherwise."""
+        if not getattr(self.backend, "blocking", False):
+            return fn(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, fn, *args)
+
+    async def handle(self, reader, writer):
+        self.stats["sessions"] += 1
+        self.stats["active"] += 1
+        try:
+            await Session(self, reader, writer).run()
+        except (SessionClosed, ConnectionError):
+            self.stats["disconnects"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            print("Session failed:", file=sys.stderr)
+            traceback.print_exc()
+            try:
+                await Session(self, reader, writer).say(f"Sorry, this lane hit an error ({e}). Please try again.")
+            except ConnectionError:
+                pass
+        finally:
+            self.stats["active"] -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None):
+        server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        if ready is not None:
+            ready.set()
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve checkout lanes over TCP.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="nodb")
+    parser.add_argument("--db-workers", type=int, default=DB_WORKERS)
+    args = parser.parse_args(argv)
+
+    server = CheckoutServer(BACKENDS[args.backend](), args.db_workers)
+    print(f"Checkout server listening on {args.host}:{args.port} ({args.backend} backend)")
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print(f"\nStopped. {server.stats}")
+
+
+if __name__ == "__main__":
+    main()
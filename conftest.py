@@ -0,0 +1,2 @@
+# test_db_connection.py is a script that connects when imported, not a pytest module
+collect_ignore = ["test_db_connection.py"]
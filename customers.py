@@ -0,0 +1,136 @@
+# customers.py
+# One `customer` row per phone number.
+# Phones are normalized (digits only, without the +91 / leading 0) into `phone_key`, which
+# has a unique index, so an order from a returning customer reuses their row through
+# INSERT ... ON CONFLICT instead of adding a new one. The checkout process keeps an LRU of
+# phone_key -> customer_id, so a repeat customer whose details haven't changed costs no
+# customer query at all.
+#
+# Existing databases have one row per order; `python customers.py` (or the first start of
+# the DB flow) backfills phone_key, merges the duplicates into the newest row and then
+# creates the unique index.
+import re
+import threading
+from collections import OrderedDict
+
+from driver import extras
+
+CUSTOMER_CACHE_SIZE = 10_000
+
+CUSTOMER_SCHEMA = """
+ALTER TABLE customer ADD COLUMN IF NOT EXISTS phone_key TEXT;
+"""
+CUSTOMER_INDEX = "customer_phone_key_uniq"
+
+# rows sharing a phone_key all point their orders at the newest row, then are deleted
+MERGE_DUPLICATES = """
+CREATE TEMP TABLE customer_merge ON COMMIT DROP AS
+SELECT customer_id,
+       max(customer_id) OVER (PARTITION BY phone_key) AS keep_id
+FROM customer
+WHERE phone_key IS NOT NULL;
+DELETE FROM customer_merge WHERE customer_id = keep_id;
+UPDATE orders SET customer_id = m.keep_id FROM customer_merge m WHERE orders.customer_id = m.customer_id;
+DELETE FROM customer USING customer_merge m WHERE customer.customer_id = m.customer_id;
+"""
+
+
+def normalize_phone(phone):
+    """'+91 98450-12345', '098450 12345' and '9845012345' all give '9845012345'. None if no digits."""
+    digits = re.sub(r"\D", "", phone or "")
+    if len(digits) == 12 and digits.startswith("91"):
+        digits = digits[2:]
+    elif len(digits) == 11 and digits.startswith("0"):
+        digits = digits[1:]
+    return digits or None
+
+
+class CustomerCache:
+    """LRU of phone_key -> (customer_id, name, phone, address) as last saved."""
+
+    def __init__(self, max_size=CUSTOMER_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, phone_key, customer):
+        """The cached id if the customer's details are unchanged since it was saved, else None."""
+        details = (customer["name"], customer["phone"], customer["address"])
+        with self._lock:
+            entry = self._entries.get(phone_key)
+            if entry is None or entry[1:] != details:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(phone_key)
+            self.stats["hits"] += 1
+            return entry[0]
+
+    def put(self, phone_key, customer_id, customer):
+        with self._lock:
+            self._entries[phone_key] = (customer_id, customer["name"], customer["phone"], customer["address"])
+            self._entries.move_to_end(phone_key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, phone_key):
+        with self._lock:
+            self._entries.pop(phone_key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def migrate_customers(cur):
+    """
+    Backfill phone_key, merge duplicate customers and add the unique index, on the
+    caller's transaction. Returns (rows backfilled, rows merged away).
+    """
+    cur.execute(CUSTOMER_SCHEMA)
+    # no new customers while rows are being merged
+    cur.execute("LOCK TABLE customer IN SHARE ROW EXCLUSIVE MODE")
+    cur.execute("SELECT customer_id, phone FROM customer WHERE phone_key IS NULL")
+    keys = [(customer_id, normalize_phone(phone)) for customer_id, phone in cur.fetchall()]
+    keys = [(customer_id, key) for customer_id, key in keys if key]
+    if keys:
+        extras.execute_values(
+            cur,
+            "UPDATE customer SET phone_key = v.phone_key FROM (VALUES %s) AS v(customer_id, phone_key) "
+            "WHERE customer.customer_id = v.customer_id",
+            keys, page_size=1000
+        )
+    cur.execute(MERGE_DUPLICATES)
+    merged = cur.rowcount
+    cur.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {CUSTOMER_INDEX} ON customer (phone_key)")
+    return len(keys), merged
+
+
+def ensure_customer_schema():
+    """Run the migration unless the unique phone index is already there."""
+    from db import pooled_connection  # db imports this module for normalize_phone and the cache
+
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT to_regclass(%s)", (CUSTOMER_INDEX,))
+        if cur.fetchone()[0] is None:
+            backfilled, merged = migrate_customers(cur)
+            if merged:
+                print(f"Customers: merged {merged} duplicate row(s) by phone ({backfilled} phone(s) normalized).")
+        conn.commit()
+        cur.close()
+
+
+def main():
+    from db import pooled_connection
+
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        backfilled, merged = migrate_customers(cur)
+        conn.commit()
+        cur.close()
+    print(f"Normalized {backfilled} phone(s); merged {merged} duplicate customer row(s).")
+
+
+if __name__ == "__main__":
+    main()
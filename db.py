@@ -1,60 +1,610 @@
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import itertools
+import os
+import re
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+from customers import CustomerCache, normalize_phone
+from driver import errors, extensions, extras, psycopg2
+from metrics import timed
+from money import to_rupees
+from stock_shards import STORE_ROWS
 
 # Update these with your DB credentials
 DB_HOST = 'localhost'
+DB_PORT = 5432
 DB_NAME = 'shopping_cart'
 DB_USER = 'admin'
 DB_PASSWORD = 'admin123'
 
+# Read endpoints (streaming replicas of DB_HOST) for catalog and reporting reads, as "host"
+# or "host:port"; e.g. SHOP_DB_REPLICAS=localhost:5433. Writes and stock checks always go
+# to DB_HOST, and so do reads while no replica is within REPLICA_MAX_LAG (see read_connection).
+DB_REPLICAS = [spec.strip() for spec in os.environ.get("SHOP_DB_REPLICAS", "").split(",") if spec.strip()]
+REPLICA_MAX_LAG = 5.0               # seconds a replica may trail the primary and still serve reads
+REPLICA_LAG_CHECK_EVERY = 1.0       # seconds between lag checks of one replica
+REPLICA_RETRY_AFTER = 10.0          # seconds a replica that failed is left out
+REPLICA_CONNECT_TIMEOUT = 2         # seconds, so a dead replica can't hold up a read for long
+
+# Connection pool settings
+POOL_MIN_CONN = 1
+POOL_MAX_CONN = 10
+POOL_CHECKOUT_TIMEOUT = 30         # seconds to wait for a free connection
+POOL_HEALTH_CHECK_AFTER = 30       # ping connections idle for longer than this (seconds)
+
+# Rows fetched per round trip by the streaming catalog cursor
+CATALOG_ITERSIZE = 2000
+
+# PREPARE the hot statements once per connection and EXECUTE them afterwards (see STATEMENTS)
+USE_PREPARED = True
+
+# Move stock through the stock_take/stock_give SQL functions so items can be sharded (see stock_shards.py)
+SHARDED_STOCK = False
+
 
-def get_connection():
+def get_connection(host=None, port=None, **kwargs):
     return psycopg2.connect(
-        host=DB_HOST,
+        host=host or DB_HOST,
+        port=port or DB_PORT,
         dbname=DB_NAME,
         user=DB_USER,
-        password=DB_PASSWORD
+        password=DB_PASSWORD,
+        **kwargs
     )
 
 
+class PoolExhausted(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Keeps connections open between calls so every helper doesn't pay for a
+    new TCP + auth handshake. Connections are health checked when checked out.
+    """
+
+    def __init__(self, min_conn=POOL_MIN_CONN, max_conn=POOL_MAX_CONN,
+                 checkout_timeout=POOL_CHECKOUT_TIMEOUT, health_check_after=POOL_HEALTH_CHECK_AFTER,
+                 connect=get_connection):
+        if min_conn < 0 or max_conn < 1 or min_conn > max_conn:
+            raise ValueError("Pool sizes must satisfy 0 <= min_conn <= max_conn and max_conn >= 1.")
+        self.min_conn = min_conn
+        self.max_conn = max_conn
+        self.checkout_timeout = checkout_timeout
+        self.health_check_after = health_check_after
+        self._connect = connect
+        self._idle = []            # list of (conn, time returned to pool)
+        self._in_use = 0
+        self._lock = threading.Condition()
+        self.stats = {"created": 0, "reused": 0, "discarded": 0}
+        for _ in range(min_conn):
+            self._idle.append((self._new_connection(), time.monotonic()))
+
+    def _new_connection(self):
+        conn = self._connect()
+        self.stats["created"] += 1
+        return conn
+
+    def _is_healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if time.monotonic() - idle_since < self.health_check_after:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        self.stats["discarded"] += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    @timed("db.pool.getconn")
+    def getconn(self):
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            # connecting and health checks are network I/O: only the bookkeeping holds the lock
+            conn, idle_since = self._reserve(deadline)
+            if conn is None:
+                try:
+                    return self._new_connection()
+                except BaseException:
+                    self._release_slot()
+                    raise
+            if self._is_healthy(conn, idle_since):
+                self.stats["reused"] += 1
+                return conn
+            self._discard(conn)
+            self._release_slot()
+
+    def _reserve(self, deadline):
+        """Take an idle connection, or a slot to open a new one in: (conn, idle_since) or (None, None)."""
+        with self._lock:
+            while True:
+                if self._idle:
+                    self._in_use += 1
+                    return self._idle.pop()
+                if self._in_use < self.max_conn:
+                    self._in_use += 1
+                    return None, None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhausted(f"No free connection after {self.checkout_timeout}s (max {self.max_conn}).")
+                self._lock.wait(remaining)
+
+    def _release_slot(self):
+        with self._lock:
+            self._in_use -= 1
+            self._lock.notify()
+
+    def putconn(self, conn, broken=False):
+        if not broken and not conn.closed and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        keep = not broken and not conn.closed
+        if not keep:
+            self._discard(conn)
+        with self._lock:
+            self._in_use -= 1
+            if keep:
+                self._idle.append((conn, time.monotonic()))
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self):
+        """Check a connection out for the duration of a with-block. Rolls back on error."""
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except psycopg2.InterfaceError:
+            broken = True
+            raise
+        except Exception:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+            raise
+        finally:
+            self.putconn(conn, broken=broken)
+
+    def closeall(self):
+        with self._lock:
+            for conn, _ in self._idle:
+                conn.close()
+            self._idle = []
+
+    def reuse_ratio(self):
+        total = self.stats["created"] + self.stats["reused"]
+        return self.stats["reused"] / total if total else 0.0
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def configure_pool(min_conn=POOL_MIN_CONN, max_conn=POOL_MAX_CONN, **kwargs):
+    """Replace the shared pool, e.g. to change its size. Closes idle connections of the old one."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+        _pool = ConnectionPool(min_conn, max_conn, **kwargs)
+    return _pool
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+@contextmanager
+def pooled_connection():
+    with get_pool().connection() as conn:
+        yield conn
+
+
+def pool_stats():
+    pool = get_pool()
+    return dict(pool.stats, reuse_ratio=pool.reuse_ratio())
+
+
+# Seconds the replica's replay trails the primary. A replica that has replayed everything
+# it received counts as current even if its last replayed commit is old (an idle primary).
+REPLICA_LAG = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+_replica_connections = weakref.WeakSet()   # connections opened to a read endpoint
+
+
+def parse_endpoint(spec):
+    """'host' or 'host:port' -> (host, port)."""
+    host, sep, port = spec.partition(":")
+    return host, int(port) if sep else DB_PORT
+
+
+def _connect_replica(host, port):
+    conn = get_connection(host, port, connect_timeout=REPLICA_CONNECT_TIMEOUT)
+    _replica_connections.add(conn)
+    return conn
+
+
+class Replica:
+    """One read endpoint: its own pool and what its last lag check found."""
+
+    def __init__(self, spec, max_conn=POOL_MAX_CONN):
+        self.spec = spec
+        host, port = parse_endpoint(spec)
+        self.pool = ConnectionPool(0, max_conn, connect=lambda: _connect_replica(host, port))
+        self.lag = None               # seconds behind the primary; None until checked or after a failure
+        self.checked_at = None        # monotonic time of the last lag check
+        self.down_until = 0.0         # monotonic time before which the replica is left out
+        self.checking = threading.Lock()
+
+
+class ReadRouter:
+    """
+    Hands out connections for reads that may be slightly stale: one of the replicas in
+    turn, skipping those more than max_lag behind or recently failed, else the primary.
+    Each replica's lag is checked at most every check_every seconds, by whichever read
+    finds it due; other reads meanwhile go by the last check.
+    """
+
+    def __init__(self, replicas, max_lag=REPLICA_MAX_LAG, check_every=REPLICA_LAG_CHECK_EVERY,
+                 retry_after=REPLICA_RETRY_AFTER):
+        self.replicas = [Replica(spec) for spec in replicas]
+        self.max_lag = max_lag
+        self.check_every = check_every
+        self.retry_after = retry_after
+        self._turn = itertools.count()
+        self.stats = {"replica_reads": 0, "primary_reads": 0, "lag_checks": 0, "too_far_behind": 0, "failures": 0}
+
+    @property
+    def staleness_bound(self):
+        """Upper bound on how far behind the primary a replica read can be (seconds)."""
+        return self.max_lag + self.check_every
+
+    def _failed(self, replica):
+        replica.lag = None
+        replica.down_until = time.monotonic() + self.retry_after
+        self.stats["failures"] += 1
+
+    def _check_lag(self, replica):
+        self.stats["lag_checks"] += 1
+        try:
+            with replica.pool.connection() as conn:
+                cur = conn.cursor()
+                cur.execute(REPLICA_LAG)
+                replica.lag = float(cur.fetchone()[0])
+                cur.close()
+                conn.rollback()
+        except (psycopg2.Error, PoolExhausted):
+            self._failed(replica)
+        replica.checked_at = time.monotonic()
+
+    def _usable(self, replica):
+        now = time.monotonic()
+        if now < replica.down_until:
+            return False
+        due = replica.checked_at is None or now - replica.checked_at >= self.check_every
+        if due and replica.checking.acquire(blocking=False):
+            try:
+                self._check_lag(replica)
+            finally:
+                replica.checking.release()
+        if replica.lag is None:
+            return False
+        if replica.lag > self.max_lag:
+            self.stats["too_far_behind"] += 1
+            return False
+        return True
+
+    def _checkout(self):
+        """(replica, connection) for the next usable replica, or (None, None)."""
+        first = next(self._turn)
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(first + i) % len(self.replicas)]
+            if not self._usable(replica):
+                continue
+            try:
+                return replica, replica.pool.getconn()
+            except (psycopg2.Error, PoolExhausted):
+                self._failed(replica)
+        return None, None
+
+    @contextmanager
+    def connection(self):
+        replica, conn = self._checkout()
+        if replica is None:
+            self.stats["primary_reads"] += 1
+            with pooled_connection() as conn:
+                yield conn
+            return
+        self.stats["replica_reads"] += 1
+        broken = False
+        try:
+            yield conn
+        except psycopg2.OperationalError:
+            # the replica went away (or cancelled the query under recovery conflict)
+            broken = True
+            self._failed(replica)
+            raise
+        except Exception:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+            raise
+        finally:
+            replica.pool.putconn(conn, broken=broken)
+
+    def closeall(self):
+        for replica in self.replicas:
+            replica.pool.closeall()
+
+
+_router = None
+
+
+def configure_replicas(replicas, **kwargs):
+    """Route reads to these endpoints ("host[:port]"); an empty list sends them all to the primary."""
+    global _router
+    with _pool_lock:
+        if _router is not None:
+            _router.closeall()
+        _router = ReadRouter(replicas, **kwargs)
+    return _router
+
+
+def get_read_router():
+    global _router
+    if _router is None:
+        with _pool_lock:
+            if _router is None:
+                _router = ReadRouter(DB_REPLICAS)
+    return _router
+
+
+@contextmanager
+def read_connection():
+    """
+    A connection for catalog and reporting reads, which may trail the primary by up to
+    get_read_router().staleness_bound. Never use it to check stock before a write.
+    """
+    with get_read_router().connection() as conn:
+        yield conn
+
+
+def is_replica(conn):
+    return conn in _replica_connections
+
+
+# Hot statements, written with %s placeholders so they also run unprepared.
+# name -> (SQL, parameter types for PREPARE)
+STATEMENTS = {
+    "store_add_qty": (
+        "UPDATE store SET qty = qty + %s WHERE item_id = %s",
+        ("integer", "integer"),
+    ),
+    "store_prices": (
+        "SELECT item_id, price FROM store WHERE item_id = ANY(%s)",
+        ("integer[]",),
+    ),
+    "store_take_qty": (
+        "UPDATE store SET qty = store.qty - v.qty FROM unnest(%s, %s) AS v(item_id, qty) "
+        "WHERE store.item_id = v.item_id",
+        ("integer[]", "integer[]"),
+    ),
+    # SHARDED_STOCK versions of the two above
+    "stock_add_qty": (
+        "SELECT stock_give(%s, %s)",
+        ("integer", "integer"),
+    ),
+    "stock_take_qty": (
+        "SELECT stock_give(v.item_id, -v.qty) FROM unnest(%s, %s) AS v(item_id, qty)",
+        ("integer[]", "integer[]"),
+    ),
+    "insert_customer": (
+        "INSERT INTO customer (name, phone, address) VALUES (%s, %s, %s) RETURNING customer_id",
+        ("text", "text", "text"),
+    ),
+    # xmax = 0 only on a freshly inserted row (see customers.py). A pickup order's placeholder
+    # address (batch_orders.PICKUP_ADDRESS) leaves the stored one alone: past orders show it.
+    "upsert_customer": (
+        "INSERT INTO customer (name, phone, address, phone_key) VALUES (%s, %s, %s, %s) "
+        "ON CONFLICT (phone_key) DO UPDATE "
+        "SET name = EXCLUDED.name, phone = EXCLUDED.phone, address = CASE "
+        "WHEN EXCLUDED.address = 'Pickup - collect at store' THEN customer.address ELSE EXCLUDED.address END "
+        "RETURNING customer_id, xmax = 0",
+        ("text", "text", "text", "text"),
+    ),
+    "insert_order": (
+        "INSERT INTO orders (customer_id, delivery_charge, grand_total) VALUES (%s, %s, %s) RETURNING order_id",
+        ("integer", "numeric", "numeric"),
+    ),
+    "insert_order_items": (
+        "INSERT INTO order_items (order_id, item_id, quantity, price) "
+        "SELECT %s, v.item_id, v.qty, v.price FROM unnest(%s, %s, %s) AS v(item_id, qty, price)",
+        ("integer", "integer[]", "integer[]", "numeric[]"),
+    ),
+}
+
+CUSTOMER_CACHE = CustomerCache()  # phone_key -> customer_id of returning customers
+
+# connection -> names prepared on it. Keyed weakly, so a connection that is closed and
+# replaced (reconnect, pool discard) starts empty and its statements are prepared again.
+_prepared = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+
+
+def _numbered(sql):
+    counter = itertools.count(1)
+    return re.sub(r"%s", lambda _: f"${next(counter)}", sql)
+
+
+def execute_statement(cur, name, params=()):
+    """
+    Run one of STATEMENTS on cur. With USE_PREPARED the statement is PREPAREd the first
+    time it is used on the cursor's connection and EXECUTEd from then on, so the server
+    skips parsing and, after a few runs, planning.
+    """
+    sql, types = STATEMENTS[name]
+    if not USE_PREPARED:
+        cur.execute(sql, params)
+        return
+    conn = cur.connection
+    with _prepared_lock:
+        names = _prepared.setdefault(conn, set())
+    if name not in names:
+        cur.execute(f"PREPARE {name} ({', '.join(types)}) AS {_numbered(sql)}")
+        names.add(name)
+    try:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(types))})", params)
+    except errors.InvalidSqlStatementName:
+        # the session lost its statements (e.g. DISCARD ALL); prepare again on next use
+        names.clear()
+        raise
+
+
+@timed("db.fetch_all_store_items")
 def fetch_all_store_items():
-    conn = get_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute("SELECT * FROM store ORDER BY item_id")
-    items = cur.fetchall()
-    cur.close()
-    conn.close()
+    with read_connection() as conn:
+        cur = conn.cursor(cursor_factory=extras.RealDictCursor)
+        cur.execute((STORE_ROWS if SHARDED_STOCK else "SELECT * FROM store") + " ORDER BY item_id")
+        items = cur.fetchall()
+        cur.close()
+        conn.rollback()  # end the read transaction so the connection goes back idle
+    return items
+
+
+@timed("db.fetch_store_items_by_id")
+def fetch_store_items_by_id(item_ids):
+    """The store rows for item_ids, in one query. Ids not in the store are left out."""
+    with read_connection() as conn:
+        cur = conn.cursor(cursor_factory=extras.RealDictCursor)
+        cur.execute((STORE_ROWS if SHARDED_STOCK else "SELECT * FROM store") + " WHERE item_id = ANY(%s)", (list(item_ids),))
+        items = cur.fetchall()
+        cur.close()
+        conn.rollback()
     return items
 
 
+_cursor_ids = itertools.count(1)
+
+
+def iter_store_items(name_filter=None, itersize=CATALOG_ITERSIZE):
+    """
+    Yield store rows lazily through a named (server-side) cursor, itersize rows per round
+    trip, so the whole catalog never has to sit in memory. name_filter is a case-insensitive
+    substring match on the item name. The pooled connection is held until the generator is
+    exhausted or closed.
+    """
+    query = STORE_ROWS if SHARDED_STOCK else "SELECT * FROM store"
+    params = ()
+    if name_filter:
+        escaped = name_filter.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query += " WHERE name ILIKE %s"
+        params = (f"%{escaped}%",)
+    query += " ORDER BY item_id"
+    with read_connection() as conn:
+        cur = conn.cursor(name=f"store_stream_{next(_cursor_ids)}", cursor_factory=extras.RealDictCursor)
+        cur.itersize = itersize
+        cur.execute(query, params)
+        try:
+            for row in cur:
+                yield row
+        finally:
+            cur.close()
+            conn.rollback()
+
+
+@timed("db.update_store_qty")
 def update_store_qty(item_id, qty_change):
     """Decrease or increase stock. qty_change can be negative or positive"""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("UPDATE store SET qty = qty + %s WHERE item_id = %s", (qty_change, item_id))
-    conn.commit()
-    cur.close()
-    conn.close()
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        if SHARDED_STOCK:
+            execute_statement(cur, "stock_add_qty", (item_id, qty_change))
+        else:
+            execute_statement(cur, "store_add_qty", (qty_change, item_id))
+        conn.commit()
+        cur.close()
 
 
-def save_order(customer, cart, delivery_charge, grand_total):
-    conn = get_connection()
-    cur = conn.cursor()
-    # Insert customer
-    cur.execute(
-        "INSERT INTO customer (name, phone, address) VALUES (%s,%s,%s) RETURNING customer_id",
-        (customer['name'], customer['phone'], customer['address'])
-    )
-    customer_id = cur.fetchone()[0]
+def _customer_id(cur, customer, new_customers=None):
+    """
+    (id of the customer's row, whether it came from CUSTOMER_CACHE), reusing the row for
+    their phone number if there is one. A transaction that saves several orders passes one
+    set as new_customers to collect the phone keys whose rows it inserted.
+    """
+    phone_key = normalize_phone(customer['phone'])
+    if phone_key is None:
+        execute_statement(cur, "insert_customer", (customer['name'], customer['phone'], customer['address']))
+        return cur.fetchone()[0], False
+    customer_id = CUSTOMER_CACHE.get(phone_key, customer)
+    if customer_id is not None:
+        return customer_id, True
+    execute_statement(cur, "upsert_customer", (customer['name'], customer['phone'], customer['address'], phone_key))
+    customer_id, inserted = cur.fetchone()
+    if inserted:
+        if new_customers is not None:
+            new_customers.add(phone_key)
+    elif phone_key not in (new_customers or ()):
+        # only rows that already existed are cached: a new row vanishes if this transaction
+        # rolls back, and xmax can't tell one inserted earlier in it from one that existed
+        CUSTOMER_CACHE.put(phone_key, customer_id, customer)
+    return customer_id, False
 
-    # Insert order
-    cur.execute(
-        "INSERT INTO orders (customer_id, delivery_charge, grand_total) VALUES (%s,%s,%s) RETURNING order_id",
-        (customer_id, delivery_charge if delivery_charge else 0, grand_total)
-    )
+
+def _insert_customer_and_order(cur, customer, delivery_charge, grand_total, new_customers=None):
+    # delivery_charge and grand_total are paise (see money.py); the columns hold rupees
+    customer_id, cached = _customer_id(cur, customer, new_customers)
+    totals = (to_rupees(delivery_charge or 0), to_rupees(grand_total))
+    if not cached:
+        execute_statement(cur, "insert_order", (customer_id,) + totals)
+        return cur.fetchone()[0]
+
+    # A cached row may have been merged away by another process. Try it under a savepoint
+    # so the order's transaction survives, then go through the upsert once.
+    cur.execute("SAVEPOINT cached_customer")
+    try:
+        execute_statement(cur, "insert_order", (customer_id,) + totals)
+    except psycopg2.IntegrityError:
+        cur.execute("ROLLBACK TO SAVEPOINT cached_customer")
+        CUSTOMER_CACHE.discard(normalize_phone(customer['phone']))
+        customer_id, _ = _customer_id(cur, customer, new_customers)
+        execute_statement(cur, "insert_order", (customer_id,) + totals)
     order_id = cur.fetchone()[0]
+    cur.execute("RELEASE SAVEPOINT cached_customer")
+    return order_id
 
-    # Insert order items
+
+def _insert_order_per_line(cur, customer, cart, delivery_charge, grand_total):
+    """Original implementation: three statements per cart line. Kept for benchmarking."""
+    order_id = _insert_customer_and_order(cur, customer, delivery_charge, grand_total)
     for item_id, qty in cart.items():
         cur.execute(
             "SELECT price FROM store WHERE item_id = %s",
@@ -67,7 +617,43 @@ def save_order(customer, cart, delivery_charge, grand_total):
         )
         # Reduce stock
         cur.execute("UPDATE store SET qty = qty - %s WHERE item_id = %s", (qty, item_id))
+    return order_id
+
+
+def _insert_order_batched(cur, customer, cart, delivery_charge, grand_total, decrement_stock=True,
+                          new_customers=None):
+    """
+    Same effect as _insert_order_per_line, but a fixed 5 statements regardless of cart size.
+    Pass decrement_stock=False when the stock was already taken (see reservations.py), and
+    one new_customers set for all the orders of a transaction (see _customer_id).
+    """
+    order_id = _insert_customer_and_order(cur, customer, delivery_charge, grand_total, new_customers)
+    if not cart:
+        return order_id
+    item_ids = list(cart)
 
-    conn.commit()
-    cur.close()
-    conn.close()
+    # All prices in one query
+    execute_statement(cur, "store_prices", (item_ids,))
+    prices = dict(cur.fetchall())
+    missing = [item_id for item_id in item_ids if item_id not in prices]
+    if missing:
+        raise ValueError(f"Items not found in store: {missing}")
+
+    # All order lines in one INSERT over parallel arrays (one statement text for any cart size)
+    qtys = [cart[item_id] for item_id in item_ids]
+    execute_statement(cur, "insert_order_items", (order_id, item_ids, qtys, [prices[item_id] for item_id in item_ids]))
+
+    # All stock decrements in one set-based UPDATE
+    if decrement_stock:
+        execute_statement(cur, "stock_take_qty" if SHARDED_STOCK else "store_take_qty", (item_ids, qtys))
+    return order_id
+
+
+@timed("db.save_order")
+def save_order(customer, cart, delivery_charge, grand_total):
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        order_id = _insert_order_batched(cur, customer, cart, delivery_charge, grand_total)
+        conn.commit()
+        cur.close()
+    return order_id
@@ -0,0 +1,205 @@
+# delivery.py
+# Delivery pricing: any number of distance tiers, surcharges and per-zone overrides,
+# loaded from config. The tier for a distance is found with bisect. When the customer's
+# address has coordinates, its zone is looked up in a grid precomputed over the zones and the
+# quote is cached per address, so repeat customers skip the calculation.
+#
+# Config (JSON file or dict); every key is optional:
+#   {"store": {"lat": 12.9716, "lon": 77.5946},
+#    "road_factor": 1.3,                             # road km per straight-line km
+#    "tiers": [[15, 50], [30, 100]],                 # [max km, charge Rs], any number
+#    "surcharges": [{"name": "fuel", "percent": 5}, {"name": "packing", "flat": 10}],
+#    "zones": [{"name": "airport", "bbox": [lat_min, lon_min, lat_max, lon_max], "flat": 150},
+#              {"name": "old town", "bbox": [...], "tiers": [[5, 30], [10, 60]]},
+#              {"name": "lake", "bbox": [...], "blocked": true}],
+#    "addresses": {"12 main st": [12.98, 77.60]}}    # known addresses -> coordinates
+import json
+import math
+import os
+import re
+from bisect import bisect_left
+from collections import namedtuple
+from functools import lru_cache
+
+from money import percent_of, to_paise
+
+DELIVERY_CONFIG = os.environ.get("DELIVERY_CONFIG", "delivery.json")
+EARTH_RADIUS_KM = 6371.0
+GRID_CELL_DEG = 0.005           # ~550 m cells
+ADDRESS_CACHE_SIZE = 4096
+
+# (charge in paise or None if not deliverable, distance in km or None, zone name or None)
+DeliveryQuote = namedtuple("DeliveryQuote", ["charge", "distance_km", "zone"])
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def normalize_address(address):
+    """Cache key for an address: case, spacing and comma spacing don't matter."""
+    address = re.sub(r"\s*,\s*", ", ", address.lower())
+    return re.sub(r"\s+", " ", address).strip(" ,.")
+
+
+class Tiers:
+    """Sorted [max km, charge] pairs; charge_for() is a bisect over the limits."""
+
+    def __init__(self, tiers):
+        pairs = sorted((float(max_km), to_paise(charge)) for max_km, charge in tiers)
+        if not pairs:
+            raise ValueError("At least one delivery tier is needed.")
+        self.limits = [max_km for max_km, _ in pairs]
+        self.charges = [charge for _, charge in pairs]
+
+    @property
+    def max_km(self):
+        return self.limits[-1]
+
+    def charge_for(self, dist):
+        """Charge in paise for dist km (a tier covers distances up to and including its limit)."""
+        if not (math.isfinite(dist) and dist >= 0):
+            return None  # NaN would bisect to the first tier
+        i = bisect_left(self.limits, dist)
+        return self.charges[i] if i < len(self.charges) else None
+
+
+class Zone:
+
+    def __init__(self, config):
+        self.name = config["name"]
+        self.bbox = tuple(config["bbox"])
+        self.blocked = bool(config.get("blocked"))
+        self.flat = to_paise(config["flat"]) if "flat" in config else None
+        self.tiers = Tiers(config["tiers"]) if "tiers" in config else None
+
+    def contains(self, lat, lon):
+        lat_min, lon_min, lat_max, lon_max = self.bbox
+        return lat_min <= lat <= lat_max and lon_min <= lon <= lon_max
+
+
+class DeliveryPricing:
+
+    def __init__(self, config=None, geocode=None, cache_size=ADDRESS_CACHE_SIZE):
+        config = config or {}
+        self.tiers = Tiers(config.get("tiers", [[15, 50], [30, 100]]))
+        self.surcharges = config.get("surcharges", [])
+        self.zones = [Zone(zone) for zone in config.get("zones", [])]
+        self.road_factor = float(config.get("road_factor", 1.0))
+        store = config.get("store")
+        self.store_location = (store["lat"], store["lon"]) if store else None
+        self.addresses = {normalize_address(a): tuple(c) for a, c in config.get("addresses", {}).items()}
+        self.geocode = geocode
+        self._build_grid()
+        self.quote_address = lru_cache(maxsize=cache_size)(self._quote_normalized_address)
+
+    @classmethod
+    def from_rates(cls, rates, **kwargs):
+        """From the old DELIVERY_RATES list of (max km, charge Rs)."""
+        return cls({"tiers": [list(rate) for rate in rates]}, **kwargs)
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), **kwargs)
+
+    @property
+    def max_km(self):
+        return self.tiers.max_km
+
+    def unavailable_message(self, dist):
+        if dist > self.max_km:
+            return f"Delivery not available for distances greater than {self.max_km:g} km."
+        return "Delivery not available to this area."
+
+    # --- zone grid -------------------------------------------------------------
+
+    def _build_grid(self):
+        """Zone index of every grid cell over the zones' bounding boxes (first zone listed wins)."""
+        self._grid = {}
+        for index, zone in reversed(list(enumerate(self.zones))):
+            lat_min, lon_min, lat_max, lon_max = zone.bbox
+            for row in range(math.floor(lat_min / GRID_CELL_DEG), math.floor(lat_max / GRID_CELL_DEG) + 1):
+                for col in range(math.floor(lon_min / GRID_CELL_DEG), math.floor(lon_max / GRID_CELL_DEG) + 1):
+                    self._grid[(row, col)] = index
+
+    def zone_at(self, lat, lon):
+        index = self._grid.get((math.floor(lat / GRID_CELL_DEG), math.floor(lon / GRID_CELL_DEG)))
+        if index is None:
+            return None
+        zone = self.zones[index]
+        if zone.contains(lat, lon):
+            return zone
+        # a cell on a zone's edge: fall back to checking the boxes
+        for zone in self.zones:
+            if zone.contains(lat, lon):
+                return zone
+        return None
+
+    def zone_named(self, name):
+        return next((zone for zone in self.zones if zone.name == name), None)
+
+    # --- pricing ---------------------------------------------------------------
+
+    def _with_surcharges(self, base):
+        total = base
+        for surcharge in self.surcharges:
+            if "percent" in surcharge:
+                total += percent_of(base, surcharge["percent"])
+            if "flat" in surcharge:
+                total += to_paise(surcharge["flat"])
+        return total
+
+    def charge_for_distance(self, dist, zone=None):
+        """Charge in paise for dist km (in zone, if given), or None if not deliverable."""
+        if zone is not None:
+            if zone.blocked:
+                return None
+            if zone.flat is not None:
+                return self._with_surcharges(zone.flat)
+            if zone.tiers is not None:
+                base = zone.tiers.charge_for(dist)
+                return None if base is None else self._with_surcharges(base)
+        base = self.tiers.charge_for(dist)
+        return None if base is None else self._with_surcharges(base)
+
+    def quote_location(self, lat, lon):
+        if self.store_location is None:
+            raise ValueError("Delivery config has no store location to measure from.")
+        dist = haversine_km(self.store_location[0], self.store_location[1], lat, lon) * self.road_factor
+        zone = self.zone_at(lat, lon)
+        return DeliveryQuote(self.charge_for_distance(dist, zone), round(dist, 3), zone.name if zone else None)
+
+    def locate(self, address):
+        """(lat, lon) for an address: a known address, "lat, lon" itself, or the geocode hook."""
+        key = normalize_address(address)
+        if key in self.addresses:
+            return self.addresses[key]
+        match = re.fullmatch(r"\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*", address)
+        if match:
+            return float(match.group(1)), float(match.group(2))
+        if self.geocode is not None:
+            return self.geocode(address)
+        return None
+
+    def _quote_normalized_address(self, key):
+        if self.store_location is None:
+            return None
+        location = self.locate(key)
+        if location is None:
+            return None
+        return self.quote_location(*location)
+
+    def quote(self, address):
+        """Quote for an address, or None if it can't be located. Cached per normalized address."""
+        return self.quote_address(normalize_address(address))
+
+
+def load_pricing(rates, path=DELIVERY_CONFIG):
+    """Pricing from the config file at path if there is one, else from the (max km, Rs) rates."""
+    if path and os.path.exists(path):
+        return DeliveryPricing.from_file(path)
+    return DeliveryPricing.from_rates(rates)
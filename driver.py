@@ -0,0 +1,43 @@
+# driver.py
+# psycopg2, imported the first time it is used instead of when a lane starts.
+# The DB flow imports db, catalog_cache, reservations, ... at startup, and loading the
+# driver (and libpq with it) is most of that import time, though nothing needs it before
+# the first connection. Modules use these stand-ins rather than importing psycopg2:
+#
+#   from driver import psycopg2, extras     # psycopg2.connect(...), extras.RealDictCursor
+#
+# psycopg (version 3, for async_db.py) is proxied the same way.
+import importlib
+import sys
+
+
+class LazyModule:
+    """Stands in for a module; the module is imported on the first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded yet"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+psycopg2 = LazyModule("psycopg2")
+errors = LazyModule("psycopg2.errors")
+extensions = LazyModule("psycopg2.extensions")
+extras = LazyModule("psycopg2.extras")
+
+psycopg = LazyModule("psycopg")
+psycopg_rows = LazyModule("psycopg.rows")
+
+
+def loaded():
+    """True once anything has imported psycopg2."""
+    return "psycopg2" in sys.modules
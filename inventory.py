@@ -0,0 +1,187 @@
+# inventory.py
+# Compact stand-ins for the item_id -> {"name", "price", "qty"} dict used as the store.
+# The layouts keep the lookups the cart code relies on: `item_id in store`, store.items(),
+# store[item_id]["name"] / ["price"] and store[item_id]["qty"] -= n.
+#
+#   SlottedInventory   one __slots__ record per item instead of a dict per item
+#   ColumnarInventory  parallel array columns for id/price/qty, a list of names and an
+#                      id -> row index map; item records are only created on access
+#   SharedInventory    the columnar layout in shared memory, one stock view for every
+#                      process on the machine (see shared_inventory.py)
+from array import array
+from collections.abc import Mapping
+
+from money import to_paise, to_rupees
+
+FIELDS = ("name", "price", "qty")
+
+
+class Item:
+    __slots__ = ("name", "price", "qty")
+
+    def __init__(self, name, price, qty):
+        self.name = name
+        self.price = price
+        self.qty = qty
+
+    def __getitem__(self, field):
+        if field not in FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __setitem__(self, field, value):
+        if field not in FIELDS:
+            raise KeyError(field)
+        setattr(self, field, value)
+
+    def __repr__(self):
+        return f"Item(name={self.name!r}, price={self.price!r}, qty={self.qty!r})"
+
+
+class Inventory(Mapping):
+    """Read side shared by both layouts; subclasses provide storage."""
+
+    @classmethod
+    def from_dict(cls, store, **kwargs):
+        inventory = cls(**kwargs)
+        for item_id, info in store.items():
+            inventory.add(item_id, info["name"], info["price"], info["qty"])
+        return inventory
+
+    def to_dict(self):
+        return {item_id: {field: item[field] for field in FIELDS} for item_id, item in self.items()}
+
+    def copy(self):
+        return type(self).from_dict(self)
+
+
+class SlottedInventory(Inventory):
+
+    def __init__(self):
+        self._items = {}
+
+    def add(self, item_id, name, price, qty):
+        self._items[item_id] = Item(name, price, qty)
+
+    def __getitem__(self, item_id):
+        return self._items[item_id]
+
+    def __contains__(self, item_id):
+        return item_id in self._items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class ColumnarItem:
+    """Live view of one row of a ColumnarInventory; writes go straight to the columns."""
+    __slots__ = ("_inventory", "_index")
+
+    def __init__(self, inventory, index):
+        self._inventory = inventory
+        self._index = index
+
+    def __getitem__(self, field):
+        inv = self._inventory
+        if field == "qty":
+            return inv._qty[self._index]
+        if field == "price":
+            return inv._to_price(inv._price_paise[self._index])
+        if field == "name":
+            return inv._names[self._index]
+        raise KeyError(field)
+
+    def __setitem__(self, field, value):
+        inv = self._inventory
+        if field == "qty":
+            inv._qty[self._index] = value
+        elif field == "price":
+            inv._price_paise[self._index] = to_paise(value)
+        elif field == "name":
+            inv._names[self._index] = value
+        else:
+            raise KeyError(field)
+
+    def __repr__(self):
+        return f"ColumnarItem(name={self['name']!r}, price={self['price']!r}, qty={self['qty']!r})"
+
+
+class ColumnarInventory(Inventory):
+    """
+    Prices are kept as integer paise. They are handed back as float by default, or as
+    Decimal with decimal_prices=True (what the DB flow expects).
+    """
+
+    def __init__(self, decimal_prices=False):
+        self.decimal_prices = decimal_prices
+        self._ids = array("q")
+        self._price_paise = array("q")
+        self._qty = array("q")
+        self._names = []
+        self._index = {}
+
+    def _to_price(self, paise):
+        if self.decimal_prices:
+            return to_rupees(paise)
+        return paise / 100
+
+    def add(self, item_id, name, price, qty):
+        if item_id in self._index:
+            row = self._index[item_id]
+            self._names[row] = name
+            self._price_paise[row] = to_paise(price)
+            self._qty[row] = qty
+            return
+        self._index[item_id] = len(self._ids)
+        self._ids.append(item_id)
+        self._names.append(name)
+        self._price_paise.append(to_paise(price))
+        self._qty.append(qty)
+
+    def copy(self):
+        clone = type(self)(decimal_prices=self.decimal_prices)
+        clone._ids = array("q", self._ids)
+        clone._price_paise = array("q", self._price_paise)
+        clone._qty = array("q", self._qty)
+        clone._names = list(self._names)
+        clone._index = dict(self._index)
+        return clone
+
+    def __getitem__(self, item_id):
+        return ColumnarItem(self, self._index[item_id])
+
+    def __contains__(self, item_id):
+        return item_id in self._index
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+
+LAYOUTS = {
+    "dict": None,
+    "slots": SlottedInventory,
+    "columnar": ColumnarInventory,
+    "shared": None,       # shared_inventory.py, which builds on ColumnarInventory
+}
+
+
+def make_inventory(store, layout="slots", **kwargs):
+    """
+    Build a store of the given layout from an item_id -> info dict. 'dict' deep-copies;
+    'shared' attaches to the shared block, seeding it from store only if it doesn't exist.
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown inventory layout: {layout!r} (choose from {', '.join(LAYOUTS)})")
+    if layout == "shared":
+        from shared_inventory import open_shared_inventory
+        return open_shared_inventory(store, **kwargs)
+    cls = LAYOUTS[layout]
+    if cls is None:
+        return {item_id: dict(info) for item_id, info in store.items()}
+    return cls.from_dict(store, **kwargs)
@@ -0,0 +1,188 @@
+# lazy_catalog.py
+# The catalog for stores too big to load whole.
+# LazyCatalog fetches an item by id the first time it is entered, shown or looked up, and
+# keeps it in a size-bounded LRU whose entries are re-read after a TTL. Lookups that miss
+# are batched: get_many() fetches all of its misses in one query, and any other expired
+# item a cart still holds rides along. PinningCart pins the items of its lines so they
+# can't be evicted before checkout; a pinned item past its TTL is refreshed in place.
+#
+# Iterating a LazyCatalog only walks the resident items, so the DB flow browses the menu
+# through db.iter_store_items() in this mode (see shopping_cart_withDB.LAZY_CATALOG).
+import sys
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from db import fetch_store_items_by_id
+from reservations import ReservedCart
+
+LAZY_CATALOG_SIZE = 5_000       # items kept resident, not counting pinned ones over the limit
+LAZY_CATALOG_TTL = 30.0         # seconds before a resident item is re-read from the database
+
+
+class LazyCatalog(Mapping):
+    """item_id -> store row, fetched on demand. Row dicts are updated in place on refresh."""
+
+    def __init__(self, max_items=LAZY_CATALOG_SIZE, ttl=LAZY_CATALOG_TTL, fetch=fetch_store_items_by_id):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._fetch = fetch
+        self._entries = OrderedDict()  # item_id -> (row, fetched at, monotonic)
+        self._pins = {}                # item_id -> pin count
+        self.stats = {"hits": 0, "misses": 0, "queries": 0, "rows_fetched": 0, "evictions": 0}
+
+    def get(self):
+        """The store for the next customer (the same object; it refreshes itself per item)."""
+        return self
+
+    # --- Lookups -------------------------------------------------------------
+
+    def _fresh(self, item_id, now):
+        entry = self._entries.get(item_id)
+        if entry is None or now - entry[1] >= self.ttl:
+            return None
+        self._entries.move_to_end(item_id)
+        return entry[0]
+
+    def get_many(self, item_ids):
+        """{item_id: row} for the ids that exist, with every miss fetched in one query."""
+        now = time.monotonic()
+        found, missing = {}, []
+        for item_id in item_ids:
+            row = self._fresh(item_id, now)
+            if row is None:
+                missing.append(item_id)
+            else:
+                found[item_id] = row
+        self.stats["hits"] += len(found)
+        if missing:
+            self.stats["misses"] += len(missing)
+            # pinned items that went stale are refreshed in the same round trip
+            stale = [item_id for item_id in self._pins if item_id not in found
+                     and item_id in self._entries and now - self._entries[item_id][1] >= self.ttl]
+            rows = self._load(set(missing).union(stale), now)
+            found.update((item_id, rows[item_id]) for item_id in missing if item_id in rows)
+        return found
+
+    def _load(self, item_ids, now):
+        rows = self._fetch(list(item_ids))
+        self.stats["queries"] += 1
+        self.stats["rows_fetched"] += len(rows)
+        loaded = {}
+        for row in rows:
+            loaded[row["item_id"]] = self._put(row, now)
+        for item_id in item_ids:
+            if item_id not in loaded and item_id not in self._pins:
+                self._entries.pop(item_id, None)  # deleted from the store
+        self._evict()
+        return loaded
+
+    def _put(self, row, now):
+        entry = self._entries.get(row["item_id"])
+        if entry is not None:
+            entry[0].update(row)  # carts hold the old dict
+            row = entry[0]
+        self._entries[row["item_id"]] = (row, now)
+        self._entries.move_to_end(row["item_id"])
+        return row
+
+    def _evict(self):
+        while len(self._entries) > self.max_items:
+            victim = next((item_id for item_id in self._entries if item_id not in self._pins), None)
+            if victim is None:
+                return  # everything left is pinned
+            del self._entries[victim]
+            self.stats["evictions"] += 1
+
+    def remember(self, rows):
+        """Pass store rows through, caching each one (e.g. a menu page being shown)."""
+        for row in rows:
+            now = time.monotonic()
+            yield self._put(row, now)
+            self._evict()
+
+    def __getitem__(self, item_id):
+        now = time.monotonic()
+        row = self._fresh(item_id, now)
+        if row is not None:
+            self.stats["hits"] += 1
+            return row
+        return self.get_many([item_id])[item_id]
+
+    def __contains__(self, item_id):
+        try:
+            self[item_id]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        """The resident items only."""
+        return iter(list(self._entries))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def items(self):
+        return [(item_id, entry[0]) for item_id, entry in self._entries.items()]
+
+    # --- Pinning -------------------------------------------------------------
+
+    def pin(self, item_id):
+        self._pins[item_id] = self._pins.get(item_id, 0) + 1
+
+    def unpin(self, item_id):
+        count = self._pins.get(item_id, 0) - 1
+        if count > 0:
+            self._pins[item_id] = count
+        else:
+            self._pins.pop(item_id, None)
+            self._evict()
+
+    # --- Reporting -------------------------------------------------------------
+
+    def hit_ratio(self):
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+    def resident_bytes(self):
+        """Rough size of the resident rows: the dicts plus their keys and values."""
+        total = 0
+        for row, _ in self._entries.values():
+            total += sys.getsizeof(row) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in row.items())
+        return total
+
+    def report(self):
+        return (
+            f"Catalog: {len(self._entries)} item(s) resident ({len(self._pins)} pinned, "
+            f"~{self.resident_bytes() / 1024:.0f} KiB), hit ratio {self.hit_ratio():.0%}, "
+            f"{self.stats['queries']} queries for {self.stats['rows_fetched']} row(s), "
+            f"{self.stats['evictions']} eviction(s)"
+        )
+
+
+class PinningCart(ReservedCart):
+    """ReservedCart over a LazyCatalog: each line pins its item until the line goes or unpin_all()."""
+
+    def __init__(self, session_id, store, catalog=None):
+        super().__init__(session_id, store, catalog)
+        self._pinned = set()
+
+    def _apply(self, item_id, delta):
+        super()._apply(item_id, delta)
+        if item_id in self._qty and item_id not in self._pinned:
+            self.store.pin(item_id)
+            self._pinned.add(item_id)
+        elif item_id not in self._qty and item_id in self._pinned:
+            self.store.unpin(item_id)
+            self._pinned.discard(item_id)
+
+    def unpin_all(self):
+        """Let the cart's items be evicted again, e.g. once the order is saved."""
+        for item_id in self._pinned:
+            self.store.unpin(item_id)
+        self._pinned.clear()
+
+    def clear(self):
+        super().clear()
+        self.unpin_all()
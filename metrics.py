@@ -0,0 +1,191 @@
+# metrics.py
+# Built-in timing for the checkout hot path.
+# Turned on with SHOP_METRICS=1 in the environment. Spans are counted into latency
+# histograms per name; time spent waiting for the customer at input() is kept apart from
+# time the program itself spends, and both are written out at exit as a Prometheus text
+# file and a JSON summary.
+#
+# When metrics are off, @timed returns the function unchanged and span() hands back one
+# shared no-op context manager, so instrumented code runs as if it weren't.
+#
+#   SHOP_METRICS=1 python shopping_cart_noDB.py
+#   SHOP_METRICS=1 SHOP_METRICS_PROM=/var/lib/node_exporter/shop.prom python batch_orders.py orders.jsonl
+import atexit
+import builtins
+import contextlib
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+ENABLED = os.environ.get("SHOP_METRICS", "") not in ("", "0")
+PROM_PATH = os.environ.get("SHOP_METRICS_PROM", "metrics.prom")
+JSON_PATH = os.environ.get("SHOP_METRICS_JSON", "metrics.json")
+
+# histogram upper bounds in seconds (+Inf is implied)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# kinds of span: "db" queries, "render" (printing menus and bills), "stage" (a step of the
+# checkout flow, customer waits included) and "user" (waiting at input())
+USER = "user"
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Histogram:
+    __slots__ = ("kind", "count", "total", "max", "buckets")
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile, capped at the largest seen."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, n in zip(BUCKETS, self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Registry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.started = time.perf_counter()
+
+    def observe(self, name, kind, seconds):
+        with self._lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = Histogram(kind)
+            hist.observe(seconds)
+
+    def summary(self):
+        wall = time.perf_counter() - self.started
+        user_wait = sum(h.total for h in self.histograms.values() if h.kind == USER)
+        spans = {}
+        for name, h in sorted(self.histograms.items()):
+            spans[name] = {
+                "kind": h.kind, "count": h.count, "total_seconds": round(h.total, 6),
+                "mean_seconds": round(h.total / h.count, 6) if h.count else 0.0,
+                "p50_seconds": h.quantile(0.5), "p95_seconds": h.quantile(0.95), "max_seconds": round(h.max, 6),
+            }
+        return {
+            "wall_seconds": round(wall, 6),
+            "user_wait_seconds": round(user_wait, 6),
+            "system_seconds": round(wall - user_wait, 6),
+            "spans": spans,
+        }
+
+    def prometheus(self):
+        summary = self.summary()
+        lines = [
+            "# HELP shop_span_seconds Time spent in instrumented code, by span.",
+            "# TYPE shop_span_seconds histogram",
+        ]
+        for name, h in sorted(self.histograms.items()):
+            labels = f'span="{name}",kind="{h.kind}"'
+            seen = 0
+            for bound, n in zip(BUCKETS, h.buckets):
+                seen += n
+                lines.append(f'shop_span_seconds_bucket{{{labels},le="{bound:g}"}} {seen}')
+            lines.append(f'shop_span_seconds_bucket{{{labels},le="+Inf"}} {h.count}')
+            lines.append(f"shop_span_seconds_sum{{{labels}}} {h.total:.6f}")
+            lines.append(f"shop_span_seconds_count{{{labels}}} {h.count}")
+        for metric, help_text in (
+            ("wall_seconds", "Wall-clock time since the process started."),
+            ("user_wait_seconds", "Time spent waiting for the customer at input()."),
+            ("system_seconds", "Wall-clock time not spent waiting for the customer."),
+        ):
+            lines.append(f"# HELP shop_{metric} {help_text}")
+            lines.append(f"# TYPE shop_{metric} gauge")
+            lines.append(f"shop_{metric} {summary[metric]}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, prom_path=PROM_PATH, json_path=JSON_PATH):
+        # written to a temp file and renamed, so a scraper never reads half a file
+        for path, text in ((prom_path, self.prometheus()), (json_path, json.dumps(self.summary(), indent=2) + "\n")):
+            if not path:
+                continue
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, path)
+
+
+REGISTRY = Registry()
+
+
+@contextlib.contextmanager
+def _span(name, kind):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe(name, kind, time.perf_counter() - start)
+
+
+def span(name, kind="stage"):
+    """Time a block: `with span("checkout.save"): ...`."""
+    if not ENABLED:
+        return _NULL_SPAN
+    return _span(name, kind)
+
+
+def timed(name=None, kind="db"):
+    """Decorator timing every call of a function (named after it unless name is given)."""
+    def decorate(func):
+        if not ENABLED:
+            return func
+        span_name = name or f"{func.__module__}.{func.__qualname__}"
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    REGISTRY.observe(span_name, kind, time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                REGISTRY.observe(span_name, kind, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def timed_input(prompt=""):
+    """input() that books the wait as customer time. Flows bind it only when metrics are on."""
+    start = time.perf_counter()
+    try:
+        return builtins.input(prompt)
+    finally:
+        REGISTRY.observe("input", USER, time.perf_counter() - start)
+
+
+if ENABLED:
+    atexit.register(REGISTRY.export)
@@ -0,0 +1,39 @@
+# money.py
+# Amounts of money as integer paise (1 Rs = 100 paise).
+# Integer arithmetic is exact and much cheaper than Decimal, so carts, bills and batch
+# paths work in paise; rupee values from the catalog or the database are converted once
+# at the boundary with to_paise() and turned back into Decimal with to_rupees() for SQL.
+#
+# Rounding: converting rupees to paise and taking a percentage both round half up
+# (away from zero), the way a printed bill is rounded.
+from decimal import Decimal, ROUND_HALF_UP
+
+PAISE_PER_RUPEE = 100
+_ONE_PAISA = Decimal("0.01")
+
+
+def to_paise(rupees):
+    """Rupees (int, float, str or Decimal) -> int paise, rounded half up."""
+    if isinstance(rupees, int):
+        return rupees * PAISE_PER_RUPEE
+    if not isinstance(rupees, Decimal):
+        rupees = Decimal(str(rupees))  # str() so 0.1 means 0.1, not the nearest binary float
+    return int(rupees.quantize(_ONE_PAISA, rounding=ROUND_HALF_UP).scaleb(2))
+
+
+def to_rupees(paise):
+    """int paise -> Decimal rupees with two places, e.g. for NUMERIC columns."""
+    return Decimal(paise).scaleb(-2).quantize(_ONE_PAISA)
+
+
+def percent_of(paise, percent):
+    """percent (int or Decimal/str, e.g. "2.5") of an amount, rounded half up to the paisa."""
+    share = Decimal(paise) * Decimal(str(percent)) / 100
+    return int(share.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def format_money(paise):
+    """'1234.50' style, matching the {:.2f} the bills used to print."""
+    sign = "-" if paise < 0 else ""
+    rupees, rest = divmod(abs(paise), PAISE_PER_RUPEE)
+    return f"{sign}{rupees}.{rest:02d}"
@@ -0,0 +1,240 @@
+# order_journal.py
+# Write-behind order saving.
+# A finished order is appended to a local append-only journal and fsync'd, and the cashier
+# moves on; a background worker drains the journal into PostgreSQL, several orders per
+# transaction. The last journal sequence number applied is stored in the same transaction,
+# so replaying the journal after a crash commits every order exactly once.
+#
+# The cashier is only told an order was recorded, not saved: the database can still refuse
+# it after checkout (e.g. a hold that expired, an item deleted since), and such an order is
+# moved to <journal>.rejected for someone to follow up.
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from db import pooled_connection, _insert_order_batched
+from driver import psycopg2
+from metrics import timed
+from reservations import OutOfStock, consume_reservations
+
+JOURNAL_PATH = "orders.journal"
+JOURNAL_BATCH_MAX = 50          # orders per drain transaction
+JOURNAL_FLUSH_INTERVAL = 0.5    # seconds the worker waits for more orders before committing
+JOURNAL_RETRY_DELAY = 2.0       # seconds before retrying after a failed commit
+JOURNAL_COMPACT_BYTES = 1 << 20 # truncate the file once fully applied and larger than this
+
+JOURNAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS order_journal_state (
+    journal  TEXT   PRIMARY KEY,
+    last_seq BIGINT NOT NULL
+);
+"""
+
+
+def _encode(customer, cart, delivery_charge, grand_total, session_id):
+    return {
+        "customer": {key: customer.get(key, "") for key in ("name", "phone", "address")},
+        "cart": [[item_id, qty] for item_id, qty in cart.items()],
+        "delivery_charge": delivery_charge,     # paise
+        "grand_total": grand_total,
+        "session_id": session_id,
+    }
+
+
+def _decode(entry):
+    return (
+        entry["customer"],
+        {item_id: qty for item_id, qty in entry["cart"]},
+        entry["delivery_charge"],
+        entry["grand_total"],
+        entry.get("session_id"),
+    )
+
+
+class OrderJournal:
+
+    def __init__(self, path=JOURNAL_PATH, name=None, batch_max=JOURNAL_BATCH_MAX,
+                 flush_interval=JOURNAL_FLUSH_INTERVAL):
+        self.path = path
+        self.name = name or os.path.abspath(path)
+        self.batch_max = batch_max
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._pending = deque()           # (seq, entry) not yet committed
+        self._appended_seq = 0
+        self._committed_seq = 0
+        self._isolate_until = 0           # commit one order at a time up to here, to find a bad one
+        self.stats = {"appended": 0, "committed": 0, "rejected": 0, "batches": 0, "batch_sizes": [], "failures": 0}
+        self._ensure_schema()
+        self._recover()
+        self._file = open(path, "a", encoding="utf-8")
+        self._worker = threading.Thread(target=self._run, name="order-journal", daemon=True)
+        self._worker.start()
+
+    # --- startup ---------------------------------------------------------
+
+    def _ensure_schema(self):
+        with pooled_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(JOURNAL_SCHEMA)
+            cur.execute("SELECT last_seq FROM order_journal_state WHERE journal = %s", (self.name,))
+            row = cur.fetchone()
+            conn.commit()
+            cur.close()
+        self._committed_seq = row[0] if row else 0
+        self._appended_seq = self._committed_seq
+
+    def _recover(self):
+        """Queue every journalled order the database hasn't committed yet."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # torn final write from a crash: that order was never acknowledged
+                seq = record["seq"]
+                self._appended_seq = max(self._appended_seq, seq)
+                if seq > self._committed_seq:
+                    self._pending.append((seq, record))
+        if self._pending:
+            print(f"Order journal: replaying {len(self._pending)} uncommitted order(s).")
+            self._wakeup.set()
+
+    # --- producer side ------------------------------------------------------
+
+    @timed("journal.append")
+    def append(self, customer, cart, delivery_charge, grand_total, session_id=None):
+        """Durably record an order. Returns its sequence number once it is on disk."""
+        entry = _encode(customer, cart, delivery_charge, grand_total, session_id)
+        with self._lock:
+            self._appended_seq += 1
+            entry["seq"] = self._appended_seq
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending.append((entry["seq"], entry))
+            self.stats["appended"] += 1
+        self._wakeup.set()
+        return entry["seq"]
+
+    def lag(self):
+        """Orders acknowledged but not yet committed to the database."""
+        return self._appended_seq - self._committed_seq
+
+    def report(self):
+        sizes = self.stats["batch_sizes"]
+        avg = sum(sizes) / len(sizes) if sizes else 0
+        return (f"journal lag {self.lag()} order(s); {self.stats['committed']} committed in "
+                f"{self.stats['batches']} batch(es), avg {avg:.1f}, max {max(sizes, default=0)}; "
+                f"{self.stats['failures']} failed attempt(s)")
+
+    # --- worker ----------------------------------------------------------------
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            if not self._stopping.is_set():
+                time.sleep(self.flush_interval)  # let a few more orders arrive
+            self._wakeup.clear()
+            while self._pending:
+                if self._commit_batch() == "retry":
+                    if self._stopping.is_set():
+                        return
+                    time.sleep(JOURNAL_RETRY_DELAY)
+            self._maybe_compact()
+            if self._stopping.is_set():
+                return
+
+    def _save_state(self, cur, last_seq):
+        cur.execute(
+            "INSERT INTO order_journal_state (journal, last_seq) VALUES (%s, %s) "
+            "ON CONFLICT (journal) DO UPDATE SET last_seq = EXCLUDED.last_seq",
+            (self.name, last_seq)
+        )
+
+    @timed("journal.commit_batch")
+    def _commit_batch(self):
+        """
+        Commit the next batch in one transaction. Returns "ok", "retry" (database
+        unreachable) or "isolate" (an order in the batch is bad; go one by one).
+        """
+        size = 1 if self._committed_seq < self._isolate_until else self.batch_max
+        with self._lock:
+            batch = [self._pending[i] for i in range(min(size, len(self._pending)))]
+        last_seq = batch[-1][0]
+        try:
+            with pooled_connection() as conn:
+                cur = conn.cursor()
+                new_customers = set()  # rows this batch inserts stay out of CUSTOMER_CACHE (see db._customer_id)
+                for _, entry in batch:
+                    customer, cart, delivery_charge, grand_total, session_id = _decode(entry)
+                    if session_id:
+                        consume_reservations(cur, session_id, cart)
+                    _insert_order_batched(cur, customer, cart, delivery_charge, grand_total,
+                                          decrement_stock=not session_id, new_customers=new_customers)
+                self._save_state(cur, last_seq)
+                conn.commit()
+                cur.close()
+        except (OutOfStock, ValueError, psycopg2.DataError, psycopg2.IntegrityError) as e:
+            self.stats["failures"] += 1
+            if len(batch) > 1:
+                self._isolate_until = last_seq
+                return "isolate"
+            return self._reject(batch[0], e)
+        except Exception as e:
+            self.stats["failures"] += 1
+            print("Order journal: commit failed, will retry:", e, file=sys.stderr)  # not in the next customer's prompts
+            return "retry"
+        self._done(batch)
+        self.stats["committed"] += len(batch)
+        self.stats["batches"] += 1
+        self.stats["batch_sizes"].append(len(batch))
+        return "ok"
+
+    def _reject(self, item, error):
+        """Move an order the database refuses to <journal>.rejected so it can't block the rest."""
+        seq, entry = item
+        try:
+            with pooled_connection() as conn:
+                cur = conn.cursor()
+                self._save_state(cur, seq)
+                conn.commit()
+                cur.close()
+        except Exception as e:
+            print("Order journal: commit failed, will retry:", e, file=sys.stderr)
+            return "retry"
+        with open(self.path + ".rejected", "a", encoding="utf-8") as f:
+            f.write(json.dumps(dict(entry, error=str(error))) + "\n")
+        print(f"Order journal: order #{seq} rejected ({error}); see {self.path}.rejected", file=sys.stderr)
+        self._done([item])
+        self.stats["rejected"] += 1
+        return "ok"
+
+    def _done(self, batch):
+        with self._lock:
+            for _ in batch:
+                self._pending.popleft()
+            self._committed_seq = batch[-1][0]
+
+    def _maybe_compact(self):
+        with self._lock:
+            if self._pending or self._file.tell() < JOURNAL_COMPACT_BYTES:
+                return
+            self._file.truncate(0)
+            self._file.seek(0)
+            os.fsync(self._file.fileno())
+
+    def close(self, timeout=None):
+        """Drain what is left (waiting up to timeout seconds) and close the file."""
+        self._stopping.set()
+        self._wakeup.set()
+        self._worker.join(timeout)
+        with self._lock:
+            self._file.close()
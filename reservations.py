@@ -0,0 +1,263 @@
+# reservations.py
+# Stock holds for carts that are still being filled in.
+# Stock is taken from `store` the moment an item is added to a cart, with a conditional
+# `qty >= n` update, so two terminals can never sell the same unit. Each hold is recorded in
+# `reservations` with an expiry; a background sweeper puts expired holds back on the shelf.
+# Every cart move pushes back the expiry of all of the session's holds, so only carts left
+# untouched for RESERVATION_TTL lose them.
+import sys
+import threading
+import uuid
+
+import db
+from cart import Cart
+from db import pooled_connection, _insert_order_batched
+from driver import extras
+from metrics import timed
+
+RESERVATION_TTL = 15 * 60       # seconds a hold survives without activity
+SWEEP_INTERVAL = 30             # seconds between sweeper runs
+
+RESERVATIONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reservations (
+    session_id  TEXT        NOT NULL,
+    item_id     INTEGER     NOT NULL REFERENCES store (item_id),
+    qty         INTEGER     NOT NULL CHECK (qty >= 0),
+    expires_at  TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (session_id, item_id)
+);
+CREATE INDEX IF NOT EXISTS reservations_expires_at_idx ON reservations (expires_at);
+"""
+
+
+# Take %(qty)s of %(item_id)s if there is that much; one row (item_id, stock left) if taken.
+TAKE = "UPDATE store SET qty = qty - %(qty)s WHERE item_id = %(item_id)s AND qty >= %(qty)s RETURNING item_id, qty"
+TAKE_SHARDED = (
+    "SELECT item_id, qty FROM (SELECT %(item_id)s AS item_id, stock_take(%(item_id)s, %(qty)s) AS qty) t "
+    "WHERE qty IS NOT NULL"
+)
+
+
+# Push back the expiry of the session's other holds; part of every reserve/release statement.
+TOUCH = (
+    "touched AS (UPDATE reservations SET expires_at = now() + %(ttl)s * interval '1 second' "
+    "WHERE session_id = %(session_id)s AND item_id <> %(item_id)s)"
+)
+
+
+def _restock(rows, qty):
+    """Statement putting `qty` back for every item_id in CTE `rows`; returns the stock left per item."""
+    if db.SHARDED_STOCK:
+        return f"SELECT stock_give({rows}.item_id, ({qty})::int) FROM {rows}"
+    return f"UPDATE store SET qty = store.qty + {qty} FROM {rows} WHERE store.item_id = {rows}.item_id RETURNING store.qty"
+
+
+class OutOfStock(Exception):
+    pass
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+def ensure_reservations_table():
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(RESERVATIONS_SCHEMA)
+        conn.commit()
+        cur.close()
+
+
+@timed("db.reserve_stock")
+def reserve_stock(session_id, item_id, qty, ttl=RESERVATION_TTL):
+    """
+    Take qty units of item_id off the shelf for session_id in one statement.
+    Returns (reserved, stock_left). When reserved is False nothing was changed and
+    stock_left is the current stock, so the caller can refresh what it shows.
+    """
+    take = TAKE_SHARDED if db.SHARDED_STOCK else TAKE
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""
+            WITH taken AS ({take}), held AS (
+                INSERT INTO reservations (session_id, item_id, qty, expires_at)
+                SELECT %(session_id)s, item_id, %(qty)s, now() + %(ttl)s * interval '1 second' FROM taken
+                ON CONFLICT (session_id, item_id) DO UPDATE
+                    SET qty = reservations.qty + EXCLUDED.qty, expires_at = EXCLUDED.expires_at
+            ), {TOUCH}
+            SELECT qty FROM taken
+            """,
+            {"session_id": session_id, "item_id": item_id, "qty": qty, "ttl": ttl}
+        )
+        row = cur.fetchone()
+        if row is None:
+            # Lost the race (or never had enough). Only this path pays for a second query.
+            if db.SHARDED_STOCK:
+                cur.execute("SELECT stock_level(%s)", (item_id,))
+            else:
+                cur.execute("SELECT qty FROM store WHERE item_id = %s", (item_id,))
+            current = cur.fetchone()
+            conn.rollback()
+            cur.close()
+            return False, current[0] if current else 0
+        conn.commit()
+        cur.close()
+    return True, row[0]
+
+
+@timed("db.release_stock")
+def release_stock(session_id, item_id, qty, ttl=RESERVATION_TTL):
+    """Give back part of a hold. Returns the stock now on the shelf, or None if no such hold."""
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""
+            WITH released AS (
+                UPDATE reservations SET qty = qty - %(qty)s, expires_at = now() + %(ttl)s * interval '1 second'
+                WHERE session_id = %(session_id)s AND item_id = %(item_id)s AND qty >= %(qty)s
+                RETURNING item_id
+            ), {TOUCH}
+            """ + _restock("released", "%(qty)s"),
+            {"session_id": session_id, "item_id": item_id, "qty": qty, "ttl": ttl}
+        )
+        row = cur.fetchone()
+        conn.commit()
+        cur.close()
+    return row[0] if row else None
+
+
+@timed("db.release_session")
+def release_session(session_id):
+    """Drop every hold of a session (cancelled order) and put the stock back."""
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            WITH released AS (
+                DELETE FROM reservations WHERE session_id = %s RETURNING item_id, qty
+            )
+            """ + _restock("released", "released.qty"),
+            (session_id,)
+        )
+        conn.commit()
+        cur.close()
+
+
+def consume_reservations(cur, session_id, cart):
+    """
+    Turn a session's holds into a sale inside the caller's order transaction.
+    Stock for the cart was already taken when items were added; holds that expired in the
+    meantime are taken again with the same conditional update, and anything held but no
+    longer in the cart goes back. Raises OutOfStock if an expired hold can't be re-taken.
+    """
+    cur.execute("DELETE FROM reservations WHERE session_id = %s RETURNING item_id, qty", (session_id,))
+    held = dict(cur.fetchall())
+    shortfall = []
+    surplus = []
+    for item_id in set(cart) | set(held):
+        diff = cart.get(item_id, 0) - held.get(item_id, 0)
+        if diff > 0:
+            shortfall.append((item_id, diff))
+        elif diff < 0:
+            surplus.append((item_id, -diff))
+    if shortfall:
+        if db.SHARDED_STOCK:
+            take = ("SELECT v.item_id FROM (VALUES %s) AS v(item_id, qty) "
+                    "WHERE stock_take(v.item_id, v.qty) IS NOT NULL")
+        else:
+            take = ("UPDATE store SET qty = store.qty - v.qty FROM (VALUES %s) AS v(item_id, qty) "
+                    "WHERE store.item_id = v.item_id AND store.qty >= v.qty RETURNING store.item_id")
+        extras.execute_values(cur, take, shortfall, page_size=len(shortfall))
+        taken = {row[0] for row in cur.fetchall()}
+        missing = [item_id for item_id, _ in shortfall if item_id not in taken]
+        if missing:
+            raise OutOfStock(f"Not enough stock left for items: {sorted(missing)}")
+    if surplus:
+        extras.execute_values(cur, "WITH v (item_id, qty) AS (VALUES %s) " + _restock("v", "v.qty"),
+                       surplus, page_size=len(surplus))
+
+
+@timed("db.expire_reservations")
+def expire_reservations():
+    """Return stock of every expired hold. One statement; returns the number of holds swept."""
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            WITH expired AS (
+                DELETE FROM reservations WHERE expires_at < now() RETURNING item_id, qty
+            ), per_item AS (
+                SELECT item_id, sum(qty) AS qty, count(*) AS holds FROM expired GROUP BY item_id
+            ), restocked AS (
+            """ + _restock("per_item", "per_item.qty") + """
+            )
+            SELECT coalesce(sum(holds), 0), (SELECT count(*) FROM restocked) FROM per_item
+            """
+        )
+        swept = cur.fetchone()[0]
+        conn.commit()
+        cur.close()
+    return swept
+
+
+class ReservationSweeper(threading.Thread):
+    """Daemon thread that calls expire_reservations() every `interval` seconds."""
+
+    def __init__(self, interval=SWEEP_INTERVAL):
+        super().__init__(name="reservation-sweeper", daemon=True)
+        self.interval = interval
+        self.swept = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.swept += expire_reservations()
+            except Exception as e:
+                print("Reservation sweep failed:", e, file=sys.stderr)  # not on the customer's screen
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def start_sweeper(interval=SWEEP_INTERVAL):
+    sweeper = ReservationSweeper(interval)
+    sweeper.start()
+    return sweeper
+
+
+@timed("db.save_reserved_order")
+def save_reserved_order(session_id, customer, cart, delivery_charge, grand_total):
+    """save_order for a cart whose stock is held by session_id: the holds become the sale."""
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        consume_reservations(cur, session_id, cart)
+        _insert_order_batched(cur, customer, cart, delivery_charge, grand_total, decrement_stock=False)
+        conn.commit()
+        cur.close()
+
+
+class ReservedCart(Cart):
+    """
+    Cart whose stock moves are holds in the database rather than edits of the local store.
+    After every move the local store is refreshed with the stock the database reports.
+    """
+
+    def __init__(self, session_id, store, catalog=None):
+        super().__init__(store, catalog)
+        self.session_id = session_id
+
+    def _take_stock(self, item_id, qty):
+        reserved, stock_left = reserve_stock(self.session_id, item_id, qty)
+        self.store[item_id]["qty"] = stock_left
+        return reserved
+
+    def _return_stock(self, item_id, qty):
+        stock_left = release_stock(self.session_id, item_id, qty)
+        if stock_left is not None:
+            self.store[item_id]["qty"] = stock_left
+
+    def _return_all_stock(self):
+        release_session(self.session_id)
+        super()._return_all_stock()
@@ -0,0 +1,197 @@
+# search_index.py
+# Find items by name instead of by id.
+# Names are split into lowercase word tokens. Each token has a postings list of the items
+# containing it, kept sorted by rank, and the sorted vocabulary turns a prefix into a range
+# of tokens. A query's terms all match as prefixes of some token in the name ("app jui"
+# finds "Apple Juice"); results come back best first:
+#
+#   1. in stock before out of stock (read live from the item's row)
+#   2. one-word queries: the word starts the name ("milk" ranks "Milk (1L)" above
+#      "Chocolate Milk")
+#   3. shorter names, then lower item_id
+#
+# A query only walks postings in rank order until it has its top K, so it costs about the
+# same at a million items as at a hundred. Short prefixes that cover many tokens ("a")
+# are merged once and cached; update() drops the cached prefixes an item touches.
+# A multi-word query walks its rarest term and checks the others per candidate, so it is
+# slower when the rarest term's best-ranked items mostly lack the other words.
+#
+#   index = SearchIndex.from_store(store)     # any item_id -> {"name", "qty", ...} mapping
+#   index.search("app jui", 5)                # -> [item_id, ...]
+#   index.update(item_id, store[item_id])     # after a rename or a new item (None removes)
+import heapq
+import re
+from bisect import bisect_left, insort
+from itertools import islice
+
+TOKEN_RE = re.compile(r"\w+")
+DEFAULT_LIMIT = 10
+MERGE_FANOUT = 64           # prefixes matching more tokens than this use the prefix cache
+PREFIX_CACHE_DEPTH = 256    # ranked items kept per cached prefix
+MAX_SCAN = 5_000            # candidates looked at per query before settling for what was found
+TOKEN_END = "\U0010ffff"    # sorts after every token that starts with a given prefix
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class SearchIndex:
+    """Ranked prefix/token search over item names. Stock is read from the rows at query time."""
+
+    def __init__(self):
+        self._rows = {}       # item_id -> the store's row, read live for name/qty
+        self._tokens = {}     # item_id -> tokens indexed for it, first occurrence order
+        self._key = {}        # item_id -> (len(name), item_id), the rank within a tier
+        self._lead = {}       # token -> ids whose name starts with it, by key
+        self._inner = {}      # token -> ids with it further in, by key
+        self._vocab = []      # sorted tokens
+        self._prefix_cache = {}
+
+    @classmethod
+    def from_store(cls, store):
+        """Index every item of store in one pass (faster than update() per item)."""
+        index = cls()
+        for item_id, row in store.items():
+            tokens = index._remember(item_id, row)
+            for position, token in enumerate(tokens):
+                tier = index._lead if position == 0 else index._inner
+                tier.setdefault(token, []).append(item_id)
+        for tier in (index._lead, index._inner):
+            for postings in tier.values():
+                postings.sort(key=index._key.__getitem__)
+        index._vocab = sorted(set(index._lead).union(index._inner))
+        return index
+
+    def _remember(self, item_id, row):
+        name = row["name"]
+        tokens = tuple(dict.fromkeys(tokenize(name)))
+        self._rows[item_id] = row
+        self._tokens[item_id] = tokens
+        self._key[item_id] = (len(name), item_id)
+        return tokens
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, item_id):
+        return item_id in self._rows
+
+    # --- Incremental updates -----------------------------------------------------
+
+    def update(self, item_id, row):
+        """(Re)index one item from its row, e.g. after a rename; row=None removes it."""
+        old = self._rows.get(item_id)
+        if old is not None:
+            if row is not None and self._key[item_id] == (len(row["name"]), item_id) \
+                    and self._tokens[item_id] == tuple(dict.fromkeys(tokenize(row["name"]))):
+                self._rows[item_id] = row  # same tokens and rank: only the row object changes
+                return
+            self._unindex(item_id)
+        if row is None:
+            return
+        tokens = self._remember(item_id, row)
+        for position, token in enumerate(tokens):
+            tier = self._lead if position == 0 else self._inner
+            postings = tier.get(token)
+            if postings is None:
+                postings = tier[token] = []
+                i = bisect_left(self._vocab, token)
+                if i == len(self._vocab) or self._vocab[i] != token:
+                    self._vocab.insert(i, token)
+            insort(postings, item_id, key=self._key.__getitem__)
+            self._forget_prefixes(token)
+
+    def _unindex(self, item_id):
+        key = self._key[item_id]
+        for position, token in enumerate(self._tokens[item_id]):
+            tier = self._lead if position == 0 else self._inner
+            postings = tier[token]
+            del postings[bisect_left(postings, key, key=self._key.__getitem__)]
+            if not postings:
+                del tier[token]
+                if token not in self._lead and token not in self._inner:
+                    del self._vocab[bisect_left(self._vocab, token)]
+            self._forget_prefixes(token)
+        del self._rows[item_id], self._tokens[item_id], self._key[item_id]
+
+    def _forget_prefixes(self, token):
+        if self._prefix_cache:
+            for end in range(1, len(token) + 1):
+                self._prefix_cache.pop((token[:end], True), None)
+                self._prefix_cache.pop((token[:end], False), None)
+
+    # --- Queries -------------------------------------------------------------------
+
+    def _merged(self, tokens, tiered=True):
+        """Ids under any of tokens in rank order (name-leading tier first if tiered), each once."""
+        seen = set()
+        tiers = [(self._lead, self._inner)] if not tiered else [(self._lead,), (self._inner,)]
+        for group in tiers:
+            lists = [tier[token] for tier in group for token in tokens if token in tier]
+            merged = lists[0] if len(lists) == 1 else heapq.merge(*lists, key=self._key.__getitem__)
+            for item_id in merged:
+                if item_id not in seen:
+                    seen.add(item_id)
+                    yield item_id
+
+    def _token_range(self, prefix):
+        lo = bisect_left(self._vocab, prefix)
+        return lo, bisect_left(self._vocab, prefix + TOKEN_END, lo)
+
+    def _postings_count(self, prefix):
+        """How many postings a prefix covers; inf for the wide ones (not worth counting)."""
+        lo, hi = self._token_range(prefix)
+        if hi - lo > MERGE_FANOUT:
+            return float("inf")
+        return sum(len(self._lead.get(token, ())) + len(self._inner.get(token, ())) for token in self._vocab[lo:hi])
+
+    def _candidates(self, prefix, tiered):
+        lo, hi = self._token_range(prefix)
+        if hi - lo <= MERGE_FANOUT:
+            yield from self._merged(self._vocab[lo:hi], tiered)
+            return
+        cached = self._prefix_cache.get((prefix, tiered))
+        if cached is None:
+            cached = list(islice(self._merged(self._vocab[lo:hi], tiered), PREFIX_CACHE_DEPTH))
+            self._prefix_cache[prefix, tiered] = cached
+        yield from cached
+        if len(cached) == PREFIX_CACHE_DEPTH:
+            # a query that filtered out most of the cached head: carry on past it
+            yield from islice(self._merged(self._vocab[lo:hi], tiered), PREFIX_CACHE_DEPTH, None)
+
+    def search(self, text, limit=DEFAULT_LIMIT):
+        """The best `limit` item ids for text, best first (see the ranking at the top)."""
+        terms = tokenize(text)
+        if not terms or limit <= 0:
+            return []
+        # walk the rarest term's postings and check the others against each candidate's tokens
+        driver = terms[0] if len(terms) == 1 else min(terms, key=lambda term: (self._postings_count(term), -len(term)))
+        others = list(terms)
+        others.remove(driver)
+        # each other term as the set of tokens it matches, unless it matches too many to list
+        checks = []
+        for term in others:
+            lo, hi = self._token_range(term)
+            checks.append(term if hi - lo > MERGE_FANOUT else frozenset(self._vocab[lo:hi]))
+        in_stock, sold_out = [], []
+        for scanned, item_id in enumerate(self._candidates(driver, tiered=not others)):
+            if scanned == MAX_SCAN:
+                break
+            if checks:
+                tokens = self._tokens[item_id]
+                if not all(any(token.startswith(check) for token in tokens) if isinstance(check, str)
+                           else not check.isdisjoint(tokens) for check in checks):
+                    continue
+            if self._rows[item_id]["qty"] > 0:
+                in_stock.append(item_id)
+                if len(in_stock) == limit:
+                    break
+            elif len(sold_out) < limit:
+                sold_out.append(item_id)
+        return (in_stock + sold_out)[:limit]
+
+    def best(self, text):
+        """The top match for text, or None."""
+        found = self.search(text, 1)
+        return found[0] if found else None
@@ -0,0 +1,267 @@
+# shared_inventory.py
+# One stock view shared by every noDB lane on the machine.
+# The store lives in a named multiprocessing.shared_memory block laid out as fixed-width
+# columns:
+#
+#   header   magic, item count, name width
+#   ids      int64[count]
+#   price    int64[count]        paise
+#   qty      int64[count]
+#   names    count x NAME_WIDTH bytes, UTF-8, NUL padded
+#
+# SharedInventory reads it like a ColumnarInventory, so the menu and the bill code don't
+# change. Stock moves go through take()/give(), which hold a per-item lock: an fcntl byte
+# range lock on byte <row> of a lock file (so lanes that were started separately exclude
+# each other, and a lane that dies can't leave an item locked) plus a thread lock within
+# the process. SharedCart moves stock that way.
+#
+# The block outlives the lanes (until `python shared_inventory.py unlink` or a reboot).
+# snapshot() copies it into a memory-mapped file; if the block is gone, the next lane to
+# start maps the snapshot straight back into a new block instead of re-seeding.
+#
+#   python shared_inventory.py show
+#   python shared_inventory.py snapshot
+#   python shared_inventory.py unlink
+import argparse
+import contextlib
+import fcntl
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import weakref
+from multiprocessing import resource_tracker, shared_memory
+
+from cart import Cart
+from inventory import ColumnarInventory
+from money import to_paise
+
+SHARED_NAME = os.environ.get("SHOP_SHARED_INVENTORY", "shop_inventory")
+SNAPSHOT_PATH = os.environ.get("SHOP_INVENTORY_SNAPSHOT", "inventory.snap")
+NAME_WIDTH = 48                            # bytes per name; longer names are cut
+MAGIC = b"SHOPINV1"
+HEADER = struct.Struct("<8sqq")            # magic, count, name width
+
+
+def block_size(count, name_width=NAME_WIDTH):
+    return HEADER.size + 3 * 8 * count + name_width * count
+
+
+def lock_path(name):
+    return os.path.join(tempfile.gettempdir(), f"{name}.lock")
+
+
+def _open_block(name, size=0):
+    """Attach to (or with size, create) a block that isn't unlinked when this process exits."""
+    create = size > 0
+    try:
+        return shared_memory.SharedMemory(name, create=create, size=size, track=False)
+    except TypeError:
+        # before Python 3.13 every process that opens a block registers it for unlinking
+        # at exit; the block has to outlive the lane that created it
+        shm = shared_memory.SharedMemory(name, create=create, size=size)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def _detach(shm, columns, lock_file):
+    for column in columns:
+        column.release()   # the block can't be closed while views into it exist
+    shm.close()
+    lock_file.close()
+
+
+def _encode_name(name, width):
+    raw = name.encode("utf-8")[:width]
+    return raw.decode("utf-8", "ignore").encode("utf-8").ljust(width, b"\0")
+
+
+class SharedInventory(ColumnarInventory):
+    """
+    A ColumnarInventory whose columns are views into a shared memory block. Names and the
+    id -> row map are read once on attach; items can't be added afterwards.
+    """
+
+    def __init__(self, shm, decimal_prices=False):
+        super().__init__(decimal_prices)
+        magic, count, width = HEADER.unpack_from(shm.buf)
+        if magic != MAGIC:
+            raise ValueError(f"Shared memory block {shm.name!r} is not a shop inventory.")
+        self._shm = shm
+        self._lock_file = open(lock_path(shm.name.lstrip("/")), "a+b")
+        self._thread_lock = threading.Lock()
+        self._size = block_size(count, width)
+        offset = HEADER.size
+        self._ids, offset = self._column(offset, count)
+        self._price_paise, offset = self._column(offset, count)
+        self._qty, offset = self._column(offset, count)
+        names = bytes(shm.buf[offset:offset + width * count])
+        self._names = [names[row * width:(row + 1) * width].rstrip(b"\0").decode("utf-8") for row in range(count)]
+        self._index = {item_id: row for row, item_id in enumerate(self._ids)}
+        self._detach = weakref.finalize(
+            self, _detach, shm, (self._ids, self._price_paise, self._qty), self._lock_file
+        )
+
+    def _column(self, offset, count):
+        return self._shm.buf[offset:offset + 8 * count].cast("q"), offset + 8 * count
+
+    @property
+    def name(self):
+        return self._shm.name.lstrip("/")
+
+    @classmethod
+    def attach(cls, name=SHARED_NAME, decimal_prices=False):
+        return cls(_open_block(name), decimal_prices)
+
+    @classmethod
+    def create(cls, name, store, decimal_prices=False, name_width=NAME_WIDTH):
+        """A new block holding the item_id -> info dict store. FileExistsError if the name is taken."""
+        shm = _open_block(name, block_size(len(store), name_width))
+        HEADER.pack_into(shm.buf, 0, MAGIC, len(store), name_width)
+        rows = list(store.items())
+        offset = HEADER.size
+        for column in (
+            [item_id for item_id, _ in rows],
+            [to_paise(info["price"]) for _, info in rows],
+            [info["qty"] for _, info in rows],
+        ):
+            struct.pack_into(f"<{len(rows)}q", shm.buf, offset, *column)
+            offset += 8 * len(rows)
+        shm.buf[offset:offset + name_width * len(rows)] = b"".join(
+            _encode_name(info["name"], name_width) for _, info in rows
+        )
+        return cls(shm, decimal_prices)
+
+    @classmethod
+    def from_snapshot(cls, name, path, decimal_prices=False):
+        """A new block with the contents of a snapshot file, copied in one go."""
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as snap:
+            magic, count, width = HEADER.unpack_from(snap)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not an inventory snapshot.")
+            size = block_size(count, width)
+            shm = _open_block(name, size)
+            shm.buf[:size] = snap[:size]
+        return cls(shm, decimal_prices)
+
+    def __reduce__(self):
+        # worker processes re-attach by name
+        return type(self).attach, (self.name, self.decimal_prices)
+
+    def add(self, item_id, name, price, qty):
+        raise TypeError("Items can't be added to a shared inventory once it is created.")
+
+    def copy(self):
+        """A private ColumnarInventory with the current contents."""
+        return ColumnarInventory.from_dict(self, decimal_prices=self.decimal_prices)
+
+    # --- Locked stock moves ----------------------------------------------------
+
+    @contextlib.contextmanager
+    def _locked(self, row=None):
+        """Lock one row's byte of the lock file, or the whole file when row is None."""
+        start, length = (0, 0) if row is None else (row, 1)
+        with self._thread_lock:
+            fcntl.lockf(self._lock_file, fcntl.LOCK_EX, length, start)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._lock_file, fcntl.LOCK_UN, length, start)
+
+    def take(self, item_id, qty):
+        """Take qty of item_id if there is that much. Returns False (taking nothing) if not."""
+        row = self._index[item_id]
+        with self._locked(row):
+            if self._qty[row] < qty:
+                return False
+            self._qty[row] -= qty
+        return True
+
+    def give(self, item_id, qty):
+        row = self._index[item_id]
+        with self._locked(row):
+            self._qty[row] += qty
+
+    def snapshot(self, path=SNAPSHOT_PATH):
+        """Write a consistent copy of the block to path (through a temp file, then renamed)."""
+        tmp = path + ".tmp"
+        with self._locked(), open(tmp, "w+b") as f:
+            f.truncate(self._size)
+            with mmap.mmap(f.fileno(), self._size) as snap:
+                snap[:] = self._shm.buf[:self._size]
+                snap.flush()
+        os.replace(tmp, path)
+
+    def close(self):
+        """Detach this process (also done at exit); the block and its stock stay for the other lanes."""
+        self._detach()
+
+    def unlink(self):
+        """Remove the block. Lanes still attached keep their mapping until they exit."""
+        if getattr(self._shm, "_track", True):
+            resource_tracker.register(self._shm._name, "shared_memory")  # unlink() unregisters it
+        self._shm.unlink()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(lock_path(self.name))
+
+
+def open_shared_inventory(store, name=SHARED_NAME, snapshot=SNAPSHOT_PATH, decimal_prices=False):
+    """
+    Attach to the named block, or create it: from the snapshot file if there is one, else
+    from the item_id -> info dict store. Lanes starting together agree on one block.
+    """
+    with open(lock_path(name), "a+b") as guard:
+        fcntl.lockf(guard, fcntl.LOCK_EX)   # whole file: no lane is mid-create or mid-move
+        try:
+            return SharedInventory.attach(name, decimal_prices)
+        except FileNotFoundError:
+            pass
+        if snapshot and os.path.exists(snapshot):
+            return SharedInventory.from_snapshot(name, snapshot, decimal_prices)
+        return SharedInventory.create(name, store, decimal_prices)
+
+
+class SharedCart(Cart):
+    """Cart over a SharedInventory: every stock move is a locked take/give on the block."""
+
+    def _take_stock(self, item_id, qty):
+        return self.store.take(item_id, qty)
+
+    def _return_stock(self, item_id, qty):
+        self.store.give(item_id, qty)
+
+    def _return_all_stock(self):
+        for item_id, qty in self._qty.items():
+            self.store.give(item_id, qty)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect, snapshot or remove the shared noDB inventory.")
+    parser.add_argument("command", choices=["show", "snapshot", "unlink"])
+    parser.add_argument("--name", default=SHARED_NAME, help="shared memory block (default %(default)s)")
+    parser.add_argument("--snapshot", default=SNAPSHOT_PATH, help="snapshot file (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    try:
+        inventory = SharedInventory.attach(args.name)
+    except FileNotFoundError:
+        print(f"No shared inventory named {args.name!r}.")
+        return
+    try:
+        if args.command == "show":
+            print(f"{'ID':<3} {'Item':<18} {'Price(Rs)':>9} {'Stock':>8}")
+            for item_id, item in inventory.items():
+                print(f"{item_id:<3} {item['name']:<18} {item['price']:>9.2f} {item['qty']:>8}")
+        elif args.command == "snapshot":
+            inventory.snapshot(args.snapshot)
+            print(f"Wrote {len(inventory)} item(s) to {args.snapshot}.")
+        else:
+            inventory.unlink()
+            print(f"Removed shared inventory {args.name!r}; the next lane starts from the snapshot or the defaults.")
+    finally:
+        inventory.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,14 @@
 # shopping_cart_noDB.py
+import atexit
+import os
 import sys
-import copy
+
+from cart import Cart
+from inventory import make_inventory
+from delivery import load_pricing
+from metrics import ENABLED as METRICS_ENABLED, timed, timed_input
+from money import format_money
+from search_index import SearchIndex
 
 # Sample store inventory: item_id -> {name, price, qty}
 STORE_INITIAL = {
@@ -15,18 +23,46 @@ DELIVERY_RATES = [
     (15, 50),    # <=15 km => 50 Rs
     (30, 100),   # >15 and <=30 => 100 Rs
 ]
+PRICING = load_pricing(DELIVERY_RATES)  # delivery.json, if present, replaces these rates (see delivery.py)
+
+# "dict", "slots", "columnar" or "shared" (one stock for every lane; see shared_inventory.py)
+INVENTORY_LAYOUT = os.environ.get("SHOP_INVENTORY_LAYOUT", "slots")
+
+SEARCH_RESULTS = 10  # best matches shown for '/name' at the Item ID prompt
+SEARCH = None        # SearchIndex over STORE, built by the first search
 
+if METRICS_ENABLED:
+    input = timed_input  # customer think time is booked apart from system time
 
-def print_menu():
+
+@timed("checkout.print_menu", kind="render")
+def print_menu(name_filter=None):
+    """The whole menu, or with name_filter only the items best matching it (see search_store)."""
+    if name_filter:
+        rows = [(item_id, STORE[item_id]) for item_id in search_store(name_filter)]
+    else:
+        rows = STORE.items()
     print("\nWelcome to the Store — Available Items")
+    if name_filter:
+        print(f"(showing items matching '{name_filter}')")
     print("-" * 44)
     print(f"{'ID':<3} {'Item':<18} {'Price(Rs)':>9} {'Stock':>8}")
     print("-" * 44)
-    for item_id, info in STORE.items():
+    for item_id, info in rows:
         print(f"{item_id:<3} {info['name']:<18} {info['price']:>9.2f} {info['qty']:>8}")
+    if not rows:
+        print("No matching items.")
     print("-" * 44)
 
 
+def search_store(text, limit=SEARCH_RESULTS):
+    """Ids of the items best matching text, best first; in-stock items rank ahead."""
+    global SEARCH
+    if SEARCH is None:
+        SEARCH = SearchIndex.from_store(STORE)
+    return SEARCH.search(text, limit)
+
+
 def get_int(prompt, min_value=None, max_value=None):
     while True:
         try:
@@ -43,6 +79,23 @@ def get_int(prompt, min_value=None, max_value=None):
         return val
 
 
+def get_item_id_or_search(prompt):
+    """Like get_int(prompt, min_value=0), but '/text' returns the search text instead."""
+    while True:
+        raw = input(prompt).strip()
+        if raw.startswith("/"):
+            return raw[1:].strip()
+        try:
+            val = int(raw)
+        except ValueError:
+            print("Please enter a valid integer.")
+            continue
+        if val < 0:
+            print("Value must be at least 0.")
+            continue
+        return val
+
+
 def get_float(prompt, min_value=None, max_value=None):
     while True:
         try:
@@ -59,6 +112,7 @@ def get_float(prompt, min_value=None, max_value=None):
         return val
 
 
+@timed("checkout.print_cart", kind="render")
 def print_cart(cart):
     if not cart:
         print("\nCart is empty.")
@@ -67,28 +121,37 @@ def print_cart(cart):
     print("-" * 44)
     print(f"{'ID':<3} {'Item':<20} {'Qty':>5} {'Price':>9} {'Total':>10}")
     print("-" * 44)
-    subtotal = 0.0
-    for item_id, qty in cart.items():
-        name = STORE_INITIAL[item_id]['name']  # price/name from initial store; qty in STORE is dynamic
-        price = STORE_INITIAL[item_id]['price']
-        total = price * qty
-        subtotal += total
-        print(f"{item_id:<3} {name:<20} {qty:>5} {price:>9.2f} {total:>10.2f}")
+    # names/prices come from STORE_INITIAL (the cart's catalog); the subtotal is kept by the cart
+    for item_id, name, qty, price, total in cart.lines():
+        print(f"{item_id:<3} {name:<20} {qty:>5} {format_money(price):>9} {format_money(total):>10}")
     print("-" * 44)
-    print(f"{'Subtotal':<30} {subtotal:>14.2f}")
+    print(f"{'Subtotal':<30} {format_money(cart.subtotal):>14}")
+
+
+def new_cart():
+    """A cart over STORE; with the shared layout, stock moves are locked against other lanes."""
+    if INVENTORY_LAYOUT == "shared":
+        from shared_inventory import SharedCart  # POSIX only (fcntl locks)
+        return SharedCart(STORE, catalog=STORE_INITIAL)
+    return Cart(STORE, catalog=STORE_INITIAL)
 
 
+@timed("checkout.choose_items", kind="stage")
 def choose_items(cart=None):
     """
     Add items to cart. If cart provided, add to it; otherwise create a new cart.
     This function adjusts STORE quantities immediately when items are added.
     """
     if cart is None:
-        cart = {}
+        cart = new_cart()
+    name_filter = None
     while True:
-        print_menu()
-        print("Enter the ID of the item to add to cart (or 0 to finish):")
-        item_id = get_int("Item ID: ", min_value=0)
+        print_menu(name_filter)
+        print("Enter the ID of the item to add to cart (or 0 to finish, /name to search, / to show all):")
+        item_id = get_item_id_or_search("Item ID: ")
+        if isinstance(item_id, str):
+            name_filter = item_id or None
+            continue
         if item_id == 0:
             break
         if item_id not in STORE:
@@ -101,8 +164,9 @@ def choose_items(cart=None):
         max_allowed = store_qty
         qty = get_int(f"Enter quantity (1 to {max_allowed}): ", min_value=1, max_value=max_allowed)
         # add to cart and reduce store stock
-        cart[item_id] = cart.get(item_id, 0) + qty
-        STORE[item_id]["qty"] -= qty
+        if not cart.add(item_id, qty):
+            print(f"Sorry, only {STORE[item_id]['qty']} x {STORE[item_id]['name']} left (sold at another counter).")
+            continue
         print(f"Added {qty} x {STORE[item_id]['name']} to cart.")
         # ask if user wants to continue shopping
         cont = input("Add more items? (y/n): ").strip().lower()
@@ -116,6 +180,7 @@ def choose_items(cart=None):
     return cart
 
 
+@timed("checkout.edit_cart", kind="stage")
 def edit_cart(cart):
     """Allow changing quantity of an item already in cart (0 to remove)."""
     if not cart:
@@ -136,29 +201,20 @@ def edit_cart(cart):
     if new_qty == current_qty:
         print("Quantity unchanged.")
         return cart
+    # the cart takes or returns the difference in stock
+    if not cart.set_qty(item_id, new_qty):
+        print("Not enough stock to increase to that quantity.")
+        return cart
     if new_qty == 0:
-        # remove from cart and restore stock
-        del cart[item_id]
-        STORE[item_id]["qty"] += current_qty
         print(f"Removed {STORE_INITIAL[item_id]['name']} from cart.")
     elif new_qty > current_qty:
-        # increase: consume additional stock
-        delta = new_qty - current_qty
-        if delta > STORE[item_id]["qty"]:
-            print("Not enough stock to increase to that quantity.")
-            return cart
-        cart[item_id] = new_qty
-        STORE[item_id]["qty"] -= delta
         print(f"Increased {STORE_INITIAL[item_id]['name']} to {new_qty}.")
     else:
-        # decrease: return stock
-        delta = current_qty - new_qty
-        cart[item_id] = new_qty
-        STORE[item_id]["qty"] += delta
         print(f"Decreased {STORE_INITIAL[item_id]['name']} to {new_qty}.")
     return cart
 
 
+@timed("checkout.remove_from_cart", kind="stage")
 def remove_from_cart(cart):
     if not cart:
         print("Cart is empty. Nothing to remove.")
@@ -170,13 +226,12 @@ def remove_from_cart(cart):
     if item_id not in cart:
         print("That item is not in your cart.")
         return cart
-    qty = cart[item_id]
-    del cart[item_id]
-    STORE[item_id]["qty"] += qty  # restore stock
+    qty = cart.remove(item_id)  # restores stock
     print(f"Removed {qty} x {STORE_INITIAL[item_id]['name']} from cart.")
     return cart
 
 
+@timed("checkout.customer_details", kind="stage")
 def get_customer_details():
     print("\n--- Customer Details ---")
     name = input("Full name: ").strip()
@@ -209,17 +264,30 @@ def choose_delivery_method():
             print("Invalid choice. Please select 1 or 2.")
 
 
-def calc_delivery_charge():
+def delivery_charge_for(dist, zone=None):
+    """Charge in paise for delivering dist km (in zone, if given), or None if it can't be delivered."""
+    return PRICING.charge_for_distance(dist, zone)
+
+
+@timed("checkout.delivery", kind="stage")
+def calc_delivery_charge(address=""):
+    # an address the pricing config can locate is priced by zone; otherwise ask for the distance
+    quote = PRICING.quote(address) if address else None
+    # the address's zone still applies to a distance typed in after its quote (e.g. a blocked zone)
+    zone = PRICING.zone_named(quote.zone) if quote is not None and quote.zone else None
     while True:
-        dist = get_float("Enter distance from store in km (e.g. 12.5): ", min_value=0.0)
-        if dist <= DELIVERY_RATES[0][0]:
-            print(f"Delivery available. Charge: Rs {DELIVERY_RATES[0][1]}")
-            return DELIVERY_RATES[0][1], dist
-        elif dist <= DELIVERY_RATES[1][0]:
-            print(f"Delivery available. Charge: Rs {DELIVERY_RATES[1][1]}")
-            return DELIVERY_RATES[1][1], dist
+        if quote is not None:
+            dist, charge = quote.distance_km, quote.charge
+            print(f"Distance from store: {dist:.1f} km" + (f" ({quote.zone})" if quote.zone else ""))
+            quote = None
+        else:
+            dist = get_float("Enter distance from store in km (e.g. 12.5): ", min_value=0.0)
+            charge = delivery_charge_for(dist, zone)
+        if charge is not None:
+            print(f"Delivery available. Charge: Rs {format_money(charge)}")
+            return charge, dist
         else:
-            print("Delivery not available for distances greater than 30 km.")
+            print(PRICING.unavailable_message(dist))
             choice = input("Choose: (1) Enter another distance  (2) Pickup instead\nSelect 1 or 2: ").strip()
             if choice == "1":
                 continue
@@ -228,6 +296,7 @@ def calc_delivery_charge():
                 return None, dist  # None signals pickup / no delivery
 
 
+@timed("checkout.print_bill", kind="render")
 def print_bill(cart, customer, delivery_charge):
     if "address" not in customer:
         customer["address"] = ""
@@ -240,28 +309,25 @@ def print_bill(cart, customer, delivery_charge):
     print("-" * 60)
     print(f"{'Item':<25} {'Qty':>5} {'Price(Rs)':>12} {'Total(Rs)':>12}")
     print("-" * 60)
-    subtotal = 0.0
-    for item_id, qty in cart.items():
-        name = STORE_INITIAL[item_id]['name']
-        price = STORE_INITIAL[item_id]['price']
-        total = price * qty
-        subtotal += total
-        print(f"{name:<25} {qty:>5} {price:>12.2f} {total:>12.2f}")
+    for _, name, qty, price, total in cart.lines():
+        print(f"{name:<25} {qty:>5} {format_money(price):>12} {format_money(total):>12}")
+    subtotal = cart.subtotal
     print("-" * 60)
-    print(f"{'Subtotal':<44} {subtotal:>12.2f}")
+    print(f"{'Subtotal':<44} {format_money(subtotal):>12}")
     if delivery_charge is None:
-        print(f"{'Delivery (pickup)':<44} {0.00:>12.2f}")
+        print(f"{'Delivery (pickup)':<44} {format_money(0):>12}")
         grand_total = subtotal
     else:
-        print(f"{'Delivery charge':<44} {delivery_charge:>12.2f}")
+        print(f"{'Delivery charge':<44} {format_money(delivery_charge):>12}")
         grand_total = subtotal + delivery_charge
     print("=" * 60)
-    print(f"{'GRAND TOTAL (Rs)':<44} {grand_total:>12.2f}")
+    print(f"{'GRAND TOTAL (Rs)':<44} {format_money(grand_total):>12}")
     print("=" * 60)
     print("Thank you for shopping with us!")
     print("=" * 60)
 
 
+@timed("checkout.manage_cart", kind="stage")
 def manage_cart_before_checkout(cart):
     """Interactive loop allowing user to edit/delete/add items before proceeding."""
     while True:
@@ -292,8 +358,7 @@ def manage_cart_before_checkout(cart):
             cart = choose_items(cart)
         elif choice == "5":
             # restore stock for all items and cancel
-            for item_id, qty in list(cart.items()):
-                STORE[item_id]["qty"] += qty
+            cart.clear()
             return "cancel", {}
         else:
             print("Invalid option. Please enter a number between 1 and 5.")
@@ -302,8 +367,12 @@ def manage_cart_before_checkout(cart):
 
 def main():
     # create fresh store copy for each run
-    global STORE
-    STORE = copy.deepcopy(STORE_INITIAL)
+    global STORE, SEARCH
+    STORE = make_inventory(STORE_INITIAL, INVENTORY_LAYOUT)
+    SEARCH = None
+    if INVENTORY_LAYOUT == "shared":
+        # stock is shared with the other lanes and kept between runs; save it for restarts
+        atexit.register(STORE.snapshot)
     print("=== Simple Console Shopping Cart ===")
     while True:
         cart = choose_items()
@@ -327,7 +396,7 @@ def main():
         method = choose_delivery_method()
         if method == "delivery":
             customer.update(get_delivery_address())
-            delivery_charge, _ = calc_delivery_charge()
+            delivery_charge, _ = calc_delivery_charge(customer["address"])
             if delivery_charge is None:
                 method = "pickup"
         else:
@@ -1,23 +1,95 @@
+import atexit
 import sys
-from db import fetch_all_store_items, update_store_qty, save_order
-from decimal import Decimal
+from catalog_cache import CatalogCache, ensure_catalog_schema
+from customers import ensure_customer_schema
+import db
+from db import iter_store_items
+from reservations import (
+    OutOfStock, ReservedCart, ensure_reservations_table, new_session_id, save_reserved_order,
+    start_sweeper,
+)
+from cart import Cart
+from delivery import load_pricing
+from lazy_catalog import LazyCatalog, PinningCart
+from metrics import ENABLED as METRICS_ENABLED, span, timed, timed_input
+from money import format_money
+from search_index import SearchIndex
+from stock_shards import ensure_stock_shards_schema
+from warmup import PendingStore, Warmup
 
 DELIVERY_RATES = [
     (15, 50),    # <=15 km => 50 Rs
     (30, 100),   # >15 and <=30 => 100 Rs
 ]
+PRICING = load_pricing(DELIVERY_RATES)  # delivery.json, if present, replaces these rates (see delivery.py)
 
+WRITE_BEHIND = False  # journal orders locally and commit them in the background (see order_journal.py)
 
-def print_menu(store):
+MENU_PAGE_SIZE = 20
+SEARCH_RESULTS = MENU_PAGE_SIZE  # best matches shown for '/name' at the Item ID prompt
+STREAM_MENU = False  # browse the menu through a server-side cursor instead of the in-memory store
+
+LAZY_CATALOG = False  # fetch items by id into a bounded LRU instead of loading the whole store (see lazy_catalog.py)
+
+WARM_UP = True  # connect and load the catalog on a background thread while the banner prints (see warmup.py)
+
+if METRICS_ENABLED:
+    input = timed_input  # customer think time is booked apart from system time
+
+
+@timed("checkout.print_menu", kind="render")
+def print_menu(store, page_size=None, name_filter=None, matches=None):
+    """
+    store is the item mapping (dict or inventory.Inventory) or any iterable of item rows
+    (e.g. db.iter_store_items()).
+    With page_size the list is shown a page at a time and rows are only read as far as
+    the customer pages. name_filter keeps items whose name contains it, unless matches
+    (the ids a search found for it, best first) is given; then those are shown in order.
+    """
+    if matches is not None:
+        rows = ((item_id, store[item_id]) for item_id in matches)
+    elif hasattr(store, 'items'):
+        rows = store.items()
+    else:
+        rows = ((row['item_id'], row) for row in store)
+    if name_filter and matches is None:
+        needle = name_filter.lower()
+        rows = ((item_id, info) for item_id, info in rows if needle in info['name'].lower())
     print("\nWelcome to the Store — Available Items")
+    if name_filter:
+        print(f"(showing items matching '{name_filter}')")
     print("-" * 44)
     print(f"{'ID':<3} {'Item':<18} {'Price(Rs)':>9} {'Stock':>8}")
     print("-" * 44)
-    for item_id, info in store.items():
+    shown = 0
+    for item_id, info in rows:
+        if page_size and shown and shown % page_size == 0:
+            more = input("-- Enter for more, q to stop -- ").strip().lower()
+            if more == "q":
+                break
         print(f"{item_id:<3} {info['name']:<18} {info['price']:>9.2f} {info['qty']:>8}")
+        shown += 1
+    if shown == 0:
+        print("No matching items.")
     print("-" * 44)
 
 
+def show_menu(store, name_filter=None, search=None):
+    """search(text, limit) -> ranked item ids, e.g. CatalogCache.search; used for name_filter if given."""
+    if name_filter and search is not None:
+        print_menu(store, MENU_PAGE_SIZE, name_filter, search(name_filter, SEARCH_RESULTS))
+        return
+    if not STREAM_MENU and not LAZY_CATALOG:
+        print_menu(store, MENU_PAGE_SIZE, name_filter)
+        return
+    rows = iter_store_items(name_filter, itersize=MENU_PAGE_SIZE)
+    try:
+        # a lazy catalog keeps the rows shown, so the id typed next is usually a hit
+        print_menu(store.remember(rows) if LAZY_CATALOG else rows, MENU_PAGE_SIZE)
+    finally:
+        rows.close()  # hand the connection back even if the customer stopped paging
+
+
 def get_int(prompt, min_value=None, max_value=None):
     while True:
         try:
@@ -34,6 +106,23 @@ def get_int(prompt, min_value=None, max_value=None):
         return val
 
 
+def get_item_id_or_search(prompt):
+    """Like get_int(prompt, min_value=0), but '/text' returns the search text instead."""
+    while True:
+        raw = input(prompt).strip()
+        if raw.startswith("/"):
+            return raw[1:].strip()
+        try:
+            val = int(raw)
+        except ValueError:
+            print("Please enter a valid integer.")
+            continue
+        if val < 0:
+            print("Value must be at least 0.")
+            continue
+        return val
+
+
 def get_float(prompt, min_value=None, max_value=None):
     while True:
         try:
@@ -50,6 +139,7 @@ def get_float(prompt, min_value=None, max_value=None):
         return val
 
 
+@timed("checkout.print_cart", kind="render")
 def print_cart(cart, store):
     if not cart:
         print("\nCart is empty.")
@@ -58,24 +148,29 @@ def print_cart(cart, store):
     print("-" * 60)
     print(f"{'ID':<3} {'Item':<25} {'Qty':>5} {'Price':>9} {'Total':>10}")
     print("-" * 60)
-    subtotal = Decimal('0.00')
-    for item_id, qty in cart.items():
-        name = store[item_id]['name']
-        price = store[item_id]['price']
-        total = price * qty
-        subtotal += total
-        print(f"{item_id:<3} {name:<25} {qty:>5} {price:>9.2f} {total:>10.2f}")
+    for item_id, name, qty, price, total in cart.lines():
+        print(f"{item_id:<3} {name:<25} {qty:>5} {format_money(price):>9} {format_money(total):>10}")
     print("-" * 60)
-    print(f"{'Subtotal':<44} {subtotal:>12.2f}")
+    print(f"{'Subtotal':<44} {format_money(cart.subtotal):>12}")
 
 
-def choose_items(cart=None, store=None):
+@timed("checkout.choose_items", kind="stage")
+def choose_items(cart=None, store=None, search=None):
+    """
+    Add items to cart. A ReservedCart holds the stock in the database as each item is
+    added and refreshes the local store with the real stock left. '/name' searches by
+    name: ranked through search() if given (see show_menu), else by substring.
+    """
     if cart is None:
-        cart = {}
+        cart = Cart(store)
+    name_filter = None
     while True:
-        print_menu(store)
-        print("Enter the ID of the item to add to cart (or 0 to finish):")
-        item_id = get_int("Item ID: ", min_value=0)
+        show_menu(store, name_filter, search)
+        print("Enter the ID of the item to add to cart (or 0 to finish, /name to search, / to show all):")
+        item_id = get_item_id_or_search("Item ID: ")
+        if isinstance(item_id, str):
+            name_filter = item_id or None
+            continue
         if item_id == 0:
             break
         if item_id not in store:
@@ -87,9 +182,10 @@ def choose_items(cart=None, store=None):
             continue
         max_allowed = store_qty
         qty = get_int(f"Enter quantity (1 to {max_allowed}): ", min_value=1, max_value=max_allowed)
-        # add to cart and reduce stock in store dict
-        cart[item_id] = cart.get(item_id, 0) + qty
-        store[item_id]["qty"] -= qty
+        # add to cart and reduce stock
+        if not cart.add(item_id, qty):
+            print(f"Sorry, only {store[item_id]['qty']} x {store[item_id]['name']} left (sold at another counter).")
+            continue
         print(f"Added {qty} x {store[item_id]['name']} to cart.")
         cont = input("Add more items? (y/n): ").strip().lower()
         while cont not in ("y", "yes", "n", "no"):
@@ -102,6 +198,7 @@ def choose_items(cart=None, store=None):
     return cart
 
 
+@timed("checkout.edit_cart", kind="stage")
 def edit_cart(cart, store):
     if not cart:
         print("Cart is empty. Nothing to edit.")
@@ -119,23 +216,19 @@ def edit_cart(cart, store):
     if new_qty == current_qty:
         print("Quantity unchanged.")
         return cart
+    if not cart.set_qty(item_id, new_qty):
+        print(f"Not enough stock to increase to that quantity (only {store[item_id]['qty']} more left).")
+        return cart
     if new_qty == 0:
-        del cart[item_id]
-        store[item_id]["qty"] += current_qty
         print(f"Removed {store[item_id]['name']} from cart.")
     elif new_qty > current_qty:
-        delta = new_qty - current_qty
-        cart[item_id] = new_qty
-        store[item_id]["qty"] -= delta
         print(f"Increased {store[item_id]['name']} to {new_qty}.")
     else:
-        delta = current_qty - new_qty
-        cart[item_id] = new_qty
-        store[item_id]["qty"] += delta
         print(f"Decreased {store[item_id]['name']} to {new_qty}.")
     return cart
 
 
+@timed("checkout.remove_from_cart", kind="stage")
 def remove_from_cart(cart, store):
     if not cart:
         print("Cart is empty. Nothing to remove.")
@@ -144,13 +237,12 @@ def remove_from_cart(cart, store):
     item_id = get_int("Enter the item ID to remove (0 to cancel): ", min_value=0)
     if item_id == 0 or item_id not in cart:
         return cart
-    qty = cart[item_id]
-    del cart[item_id]
-    store[item_id]["qty"] += qty
+    qty = cart.remove(item_id)
     print(f"Removed {qty} x {store[item_id]['name']} from cart.")
     return cart
 
 
+@timed("checkout.customer_details", kind="stage")
 def get_customer_details():
     print("\n--- Customer Details ---")
     name = input("Full name: ").strip()
@@ -182,17 +274,30 @@ def choose_delivery_method():
             print("Invalid choice. Please select 1 or 2.")
 
 
-def calc_delivery_charge():
+def delivery_charge_for(dist, zone=None):
+    """Charge in paise for delivering dist km (in zone, if given), or None if it can't be delivered."""
+    return PRICING.charge_for_distance(dist, zone)
+
+
+@timed("checkout.delivery", kind="stage")
+def calc_delivery_charge(address=""):
+    # an address the pricing config can locate is priced by zone; otherwise ask for the distance
+    quote = PRICING.quote(address) if address else None
+    # the address's zone still applies to a distance typed in after its quote (e.g. a blocked zone)
+    zone = PRICING.zone_named(quote.zone) if quote is not None and quote.zone else None
     while True:
-        dist = get_float("Enter distance from store in km (e.g. 12.5): ", min_value=0.0)
-        if dist <= DELIVERY_RATES[0][0]:
-            print(f"Delivery available. Charge: Rs {DELIVERY_RATES[0][1]}")
-            return DELIVERY_RATES[0][1], dist
-        elif dist <= DELIVERY_RATES[1][0]:
-            print(f"Delivery available. Charge: Rs {DELIVERY_RATES[1][1]}")
-            return DELIVERY_RATES[1][1], dist
+        if quote is not None:
+            dist, charge = quote.distance_km, quote.charge
+            print(f"Distance from store: {dist:.1f} km" + (f" ({quote.zone})" if quote.zone else ""))
+            quote = None
+        else:
+            dist = get_float("Enter distance from store in km (e.g. 12.5): ", min_value=0.0)
+            charge = delivery_charge_for(dist, zone)
+        if charge is not None:
+            print(f"Delivery available. Charge: Rs {format_money(charge)}")
+            return charge, dist
         else:
-            print("Delivery not available for distances greater than 30 km.")
+            print(PRICING.unavailable_message(dist))
             choice = input("Choose: (1) Enter another distance  (2) Pickup instead\nSelect 1 or 2: ").strip()
             if choice == "1":
                 continue
@@ -201,6 +306,7 @@ def calc_delivery_charge():
                 return None, dist
 
 
+@timed("checkout.print_bill", kind="render")
 def print_bill(cart, customer, delivery_charge, store):
     if "address" not in customer:
         customer["address"] = ""
@@ -213,34 +319,31 @@ def print_bill(cart, customer, delivery_charge, store):
     print("-" * 60)
     print(f"{'Item':<25} {'Qty':>5} {'Price(Rs)':>12} {'Total(Rs)':>12}")
     print("-" * 60)
-    subtotal = Decimal('0.00')
-    for item_id, qty in cart.items():
-        name = store[item_id]['name']
-        price = store[item_id]['price']
-        total = price * qty
-        subtotal += total
-        print(f"{name:<25} {qty:>5} {price:>12.2f} {total:>12.2f}")
+    for _, name, qty, price, total in cart.lines():
+        print(f"{name:<25} {qty:>5} {format_money(price):>12} {format_money(total):>12}")
+    subtotal = cart.subtotal
     print("-" * 60)
-    print(f"{'Subtotal':<44} {subtotal:>12.2f}")
+    print(f"{'Subtotal':<44} {format_money(subtotal):>12}")
     if delivery_charge is None:
-        print(f"{'Delivery (pickup)':<44} {0.00:>12.2f}")
+        print(f"{'Delivery (pickup)':<44} {format_money(0):>12}")
         grand_total = subtotal
     else:
-        print(f"{'Delivery charge':<44} {delivery_charge:>12.2f}")
+        print(f"{'Delivery charge':<44} {format_money(delivery_charge):>12}")
         grand_total = subtotal + delivery_charge
     print("=" * 60)
-    print(f"{'GRAND TOTAL (Rs)':<44} {grand_total:>12.2f}")
+    print(f"{'GRAND TOTAL (Rs)':<44} {format_money(grand_total):>12}")
     print("=" * 60)
     print("Thank you for shopping with us!")
     print("=" * 60)
-    return grand_total
+    return grand_total  # paise
 
 
-def manage_cart_before_checkout(cart, store):
+@timed("checkout.manage_cart", kind="stage")
+def manage_cart_before_checkout(cart, store, search=None):
     while True:
         if not cart:
             print("\nYour cart is empty. Please add items before checkout.")
-            cart = choose_items(cart, store)
+            cart = choose_items(cart, store, search)
             if not cart:
                 print("No items added. Cancelling order.")
                 return "cancel", {}
@@ -261,26 +364,69 @@ def manage_cart_before_checkout(cart, store):
         elif choice == "3":
             cart = remove_from_cart(cart, store)
         elif choice == "4":
-            cart = choose_items(cart, store)
+            cart = choose_items(cart, store, search)
         elif choice == "5":
-            for item_id, qty in list(cart.items()):
-                store[item_id]["qty"] += qty
+            cart.clear()  # gives all stock back
             return "cancel", {}
         else:
             print("Invalid option. Please enter a number between 1 and 5.")
 
 
-def main():
+def _close_journal(journal):
+    print("Saving remaining orders to database...")
+    journal.close()
+    print(journal.report())
+
+
+def _warm_up(catalog):
+    """Schema checks, the first pooled connection and the catalog's first load. Returns the catalog."""
+    ensure_reservations_table()
+    ensure_catalog_schema()
+    ensure_customer_schema()
+    if db.SHARDED_STOCK:
+        ensure_stock_shards_schema()
+    start_sweeper()
+    catalog.get()
+    return catalog
+
+
+def main(storage=None):
+    """
+    Run the checkout loop. By default against PostgreSQL with stock holds; pass a
+    storage.Storage (e.g. SQLiteStorage) to run the same flow against that instead.
+    """
     print("=== Simple Console Shopping Cart ===")
+    journal = None
+    if storage is None:
+        catalog = LazyCatalog() if LAZY_CATALOG else CatalogCache()
+        warmup = Warmup(lambda: _warm_up(catalog), background=WARM_UP)
+        if LAZY_CATALOG:
+            atexit.register(lambda: print(catalog.report()))
+        if WRITE_BEHIND:
+            from order_journal import OrderJournal
+            journal = OrderJournal()
+            atexit.register(_close_journal, journal)
     while True:
-        store = fetch_all_store_items()
-        store = {item['item_id']: item for item in store}  # convert list to dict
-        cart = choose_items(store=store)
+        if storage is None:
+            if warmup.done:
+                store = warmup.wait().get()  # loaded once, then only changed rows are fetched
+            else:
+                # first customer: only reading the store (the menu) waits for the warm-up
+                store = PendingStore(lambda: warmup.wait().get())
+            session_id = new_session_id()
+            cart_class = PinningCart if LAZY_CATALOG else ReservedCart
+            # a lazy or streamed catalog isn't all in memory: search it with ILIKE instead
+            search = None if LAZY_CATALOG or STREAM_MENU else catalog.search
+            cart = choose_items(cart_class(session_id, store), store, search)
+        else:
+            store = {item['item_id']: item for item in storage.fetch_all_store_items()}
+            search = SearchIndex.from_store(store).search
+            cart = choose_items(Cart(store), store, search)
         if not cart:
             print("No purchase made. Exiting.")
             return
 
-        action, cart = manage_cart_before_checkout(cart, store)
+        action, cart = manage_cart_before_checkout(cart, store, search)
         if action == "cancel":
             print("Order cancelled.")
             again = input("Process another customer? (y/n): ").strip().lower()
@@ -293,7 +439,7 @@ def main():
         method = choose_delivery_method()
         if method == "delivery":
             customer.update(get_delivery_address())
-            delivery_charge, _ = calc_delivery_charge()
+            delivery_charge, _ = calc_delivery_charge(customer["address"])
             if delivery_charge is None:
                 method = "pickup"
         else:
@@ -302,8 +448,24 @@ def main():
             print("Pickup selected. No delivery charge will be applied.")
 
         grand_total = print_bill(cart, customer, delivery_charge, store)
-        save_order(customer, cart, delivery_charge, grand_total)
-        print("Order saved to database!")
+        try:
+            with span("checkout.save"):
+                if journal is not None:
+                    journal.append(customer, cart, delivery_charge, grand_total, session_id)
+                elif storage is None:
+                    save_reserved_order(session_id, customer, cart, delivery_charge, grand_total)
+                else:
+                    storage.save_order(customer, cart, delivery_charge, grand_total)
+            if journal is not None:
+                # only journalled: the database can still refuse it (see order_journal.py)
+                print("Order recorded! It will be saved to the database shortly.")
+            else:
+                print("Order saved to database!")
+        except OutOfStock as e:
+            cart.clear()
+            print("Order could not be saved, your reservation expired:", e)
+        if LAZY_CATALOG and storage is None:
+            cart.unpin_all()  # the order is saved; its items may be evicted again
 
         again = input("Process another customer? (y/n): ").strip().lower()
         if again not in ("y", "yes"):
@@ -311,8 +473,14 @@ def main():
 
 
 if __name__ == "__main__":
+    storage = None
+    if len(sys.argv) > 1:
+        # e.g. `python shopping_cart_withDB.py sqlite` or `... memory`
+        from shopping_cart_noDB import STORE_INITIAL
+        from storage import open_storage
+        storage = open_storage(sys.argv[1], seed=STORE_INITIAL)
     try:
-        main()
+        main(storage)
     except KeyboardInterrupt:
         print("\nSession cancelled by user. Goodbye.")
         sys.exit(0)
\ No newline at end of file
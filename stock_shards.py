@@ -0,0 +1,165 @@
+# stock_shards.py
+# Sharded stock counters for flash-sale items.
+# Every sale of an item normally updates its one `store` row, so lanes selling the same hot
+# item queue on that row's lock. A sharded item keeps its stock in N rows of
+# `store_stock_shards` instead (its store.qty drops to 0); a sale takes from one shard
+# that has enough, skipping shards another lane has locked, so up to N sales of the item
+# commit in parallel. The item's stock is store.qty plus the sum of its shards.
+#
+# The SQL functions below move stock for sharded and plain items alike:
+#   stock_take(item_id, n)  take n if there are n; returns the stock left, or NULL
+#   stock_give(item_id, n)  put n back; returns the stock left
+#   stock_level(item_id)    store.qty + shards
+# db.py and reservations.py call them instead of updating store.qty when db.SHARDED_STOCK
+# is on.
+#
+#   python stock_shards.py 3 16     # spread item 3 over 16 shards
+#   python stock_shards.py 3 0      # fold it back into its store row
+import argparse
+
+DEFAULT_SHARDS = 8
+
+STOCK_SHARDS_SCHEMA = """
+ALTER TABLE store ADD COLUMN IF NOT EXISTS stock_shards SMALLINT NOT NULL DEFAULT 0;
+CREATE TABLE IF NOT EXISTS store_stock_shards (
+    item_id INTEGER  NOT NULL REFERENCES store (item_id),
+    shard   SMALLINT NOT NULL,
+    qty     INTEGER  NOT NULL CHECK (qty >= 0),
+    PRIMARY KEY (item_id, shard)
+);
+
+CREATE OR REPLACE FUNCTION stock_level(p_item INTEGER) RETURNS INTEGER AS $$
+    SELECT s.qty + coalesce((SELECT sum(sh.qty) FROM store_stock_shards sh WHERE sh.item_id = p_item), 0)::int
+    FROM store s WHERE s.item_id = p_item;
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION stock_take(p_item INTEGER, p_qty INTEGER) RETURNS INTEGER AS $$
+DECLARE
+    n_shards  INTEGER;
+    start_at  INTEGER;
+    remaining INTEGER := p_qty;
+    shard_row RECORD;
+BEGIN
+    SELECT stock_shards INTO n_shards FROM store WHERE item_id = p_item;
+    IF n_shards IS NULL THEN
+        RETURN NULL;
+    END IF;
+    IF n_shards = 0 THEN
+        UPDATE store SET qty = qty - p_qty WHERE item_id = p_item AND qty >= p_qty;
+        RETURN CASE WHEN FOUND THEN stock_level(p_item) END;
+    END IF;
+
+    -- one shard with enough, starting from a random one, skipping shards other lanes hold
+    start_at := floor(random() * n_shards);
+    UPDATE store_stock_shards sh SET qty = sh.qty - p_qty
+    FROM (
+        SELECT shard FROM store_stock_shards
+        WHERE item_id = p_item AND qty >= p_qty
+        ORDER BY (shard - start_at + n_shards) % n_shards
+        LIMIT 1 FOR UPDATE SKIP LOCKED
+    ) pick
+    WHERE sh.item_id = p_item AND sh.shard = pick.shard;
+    IF FOUND THEN
+        RETURN stock_level(p_item);
+    END IF;
+
+    -- every shard with enough is busy, or the stock is spread too thin: lock them all (in
+    -- shard order) and take across shards
+    PERFORM 1 FROM store_stock_shards WHERE item_id = p_item ORDER BY shard FOR UPDATE;
+    IF (SELECT coalesce(sum(qty), 0) FROM store_stock_shards WHERE item_id = p_item) < p_qty THEN
+        RETURN NULL;
+    END IF;
+    FOR shard_row IN
+        SELECT shard, qty FROM store_stock_shards WHERE item_id = p_item AND qty > 0 ORDER BY qty DESC
+    LOOP
+        UPDATE store_stock_shards SET qty = qty - least(shard_row.qty, remaining)
+        WHERE item_id = p_item AND shard = shard_row.shard;
+        remaining := remaining - least(shard_row.qty, remaining);
+        EXIT WHEN remaining = 0;
+    END LOOP;
+    RETURN stock_level(p_item);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION stock_give(p_item INTEGER, p_qty INTEGER) RETURNS INTEGER AS $$
+DECLARE
+    n_shards INTEGER;
+    target   INTEGER;
+BEGIN
+    SELECT stock_shards INTO n_shards FROM store WHERE item_id = p_item;
+    IF coalesce(n_shards, 0) = 0 THEN
+        UPDATE store SET qty = qty + p_qty WHERE item_id = p_item;
+    ELSIF p_qty < 0 THEN
+        -- an unconditional decrement: from the shards if they have it, else the store row
+        IF stock_take(p_item, -p_qty) IS NULL THEN
+            UPDATE store SET qty = qty + p_qty WHERE item_id = p_item;
+        END IF;
+    ELSE
+        target := floor(random() * n_shards);
+        UPDATE store_stock_shards SET qty = qty + p_qty WHERE item_id = p_item AND shard = target;
+    END IF;
+    RETURN stock_level(p_item);
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# `SELECT * FROM store` with qty replaced by the summed stock. RealDictCursor keeps the last
+# column of a name, so the computed qty wins over store.qty.
+STORE_ROWS = (
+    "SELECT s.*, CASE WHEN s.stock_shards = 0 THEN s.qty ELSE stock_level(s.item_id) END AS qty "
+    "FROM store s"
+)
+
+
+def ensure_stock_shards_schema():
+    from db import pooled_connection  # db imports this module for STORE_ROWS
+
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(STOCK_SHARDS_SCHEMA)
+        conn.commit()
+        cur.close()
+
+
+def shard_item(item_id, shards=DEFAULT_SHARDS):
+    """
+    Spread an item's stock evenly over `shards` shard rows (0 folds it back into its store
+    row). Returns the item's total stock, which is unchanged.
+    """
+    from db import pooled_connection
+
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT qty FROM store WHERE item_id = %s FOR UPDATE", (item_id,))
+        row = cur.fetchone()
+        if row is None:
+            raise ValueError(f"No item {item_id} in store.")
+        cur.execute("DELETE FROM store_stock_shards WHERE item_id = %s RETURNING qty", (item_id,))
+        total = row[0] + sum(qty for (qty,) in cur.fetchall())
+        if shards:
+            cur.execute(
+                "INSERT INTO store_stock_shards (item_id, shard, qty) "
+                "SELECT %s, g, %s / %s + CASE WHEN g < %s %% %s THEN 1 ELSE 0 END "
+                "FROM generate_series(0, %s - 1) AS g",
+                (item_id, total, shards, total, shards, shards)
+            )
+            cur.execute("UPDATE store SET qty = 0, stock_shards = %s WHERE item_id = %s", (shards, item_id))
+        else:
+            cur.execute("UPDATE store SET qty = %s, stock_shards = 0 WHERE item_id = %s", (total, item_id))
+        conn.commit()
+        cur.close()
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Spread a hot item's stock over several counter rows.")
+    parser.add_argument("item_id", type=int)
+    parser.add_argument("shards", type=int, nargs="?", default=DEFAULT_SHARDS, help="0 to unshard")
+    args = parser.parse_args(argv)
+    ensure_stock_shards_schema()
+    total = shard_item(args.item_id, args.shards)
+    print(f"Item {args.item_id}: {total} in stock over {args.shards or 'no'} shard(s).")
+
+
+if __name__ == "__main__":
+    main()
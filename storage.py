@@ -0,0 +1,227 @@
+# storage.py
+# Where the catalog, stock and orders live, behind one small interface so the same cart
+# flow can run in memory, on an embedded SQLite file or on PostgreSQL.
+#
+#   fetch_all_store_items()                       -> list of {"item_id", "name", "price", "qty"}
+#   update_store_qty(item_id, qty_change)         stock change, negative or positive
+#   save_order(customer, cart, delivery_charge, grand_total) -> order_id
+#
+# Catalog prices are Decimal rupees in every backend, as they are when read from PostgreSQL;
+# the delivery charge and grand total handed to save_order are integer paise (money.py).
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from decimal import Decimal
+
+from metrics import timed
+from money import to_rupees
+
+SQLITE_PATH = "shopping_cart.db"
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS store (
+    item_id INTEGER PRIMARY KEY,
+    name    TEXT    NOT NULL,
+    price   DECTEXT NOT NULL,
+    qty     INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS customer (
+    customer_id INTEGER PRIMARY KEY,
+    name        TEXT NOT NULL,
+    phone       TEXT,
+    address     TEXT
+);
+CREATE TABLE IF NOT EXISTS orders (
+    order_id        INTEGER PRIMARY KEY,
+    customer_id     INTEGER NOT NULL REFERENCES customer (customer_id),
+    delivery_charge DECTEXT NOT NULL,
+    grand_total     DECTEXT NOT NULL,
+    created_at      TEXT    NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS order_items (
+    order_id INTEGER NOT NULL REFERENCES orders (order_id),
+    item_id  INTEGER NOT NULL REFERENCES store (item_id),
+    quantity INTEGER NOT NULL,
+    price    DECTEXT NOT NULL
+);
+"""
+
+# Money columns are declared DECTEXT: TEXT affinity keeps the exact digits, and the
+# converter hands them back as Decimal.
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_converter("DECTEXT", lambda raw: Decimal(raw.decode()))
+
+
+class Storage(ABC):
+    """Interface shared by the storage backends; a backend missing a method can't be built."""
+
+    @abstractmethod
+    def fetch_all_store_items(self):
+        ...
+
+    @abstractmethod
+    def update_store_qty(self, item_id, qty_change):
+        ...
+
+    @abstractmethod
+    def save_order(self, customer, cart, delivery_charge, grand_total):
+        ...
+
+    def close(self):
+        pass
+
+
+def _price(value):
+    return value if isinstance(value, Decimal) else Decimal(str(value)).quantize(Decimal("0.01"))
+
+
+class MemoryStorage(Storage):
+    """Everything in process; orders are kept in a list."""
+
+    def __init__(self, items):
+        self._items = {
+            item_id: {"item_id": item_id, "name": info["name"], "price": _price(info["price"]), "qty": info["qty"]}
+            for item_id, info in items.items()
+        }
+        self.orders = []
+        self._lock = threading.Lock()
+
+    def fetch_all_store_items(self):
+        with self._lock:
+            return [dict(item) for _, item in sorted(self._items.items())]
+
+    def update_store_qty(self, item_id, qty_change):
+        with self._lock:
+            self._items[item_id]["qty"] += qty_change
+
+    def save_order(self, customer, cart, delivery_charge, grand_total):
+        with self._lock:
+            missing = [item_id for item_id in cart if item_id not in self._items]
+            if missing:
+                raise ValueError(f"Items not found in store: {missing}")
+            lines = [(item_id, qty, self._items[item_id]["price"]) for item_id, qty in cart.items()]
+            for item_id, qty, _ in lines:
+                self._items[item_id]["qty"] -= qty
+            self.orders.append({
+                "customer": dict(customer),
+                "lines": lines,
+                "delivery_charge": to_rupees(delivery_charge or 0),
+                "grand_total": to_rupees(grand_total),
+            })
+            return len(self.orders)
+
+
+class SQLiteStorage(Storage):
+    """
+    Embedded database file in WAL mode: readers don't block the writer and commits are a
+    local fsync, not a network round trip. One connection, serialised by a lock, so it
+    can be shared by threads.
+    """
+
+    def __init__(self, path=SQLITE_PATH, seed=None):
+        self.path = path
+        self._conn = sqlite3.connect(
+            path, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False, isolation_level=None
+        )
+        self._lock = threading.Lock()
+        cur = self._conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute("PRAGMA foreign_keys=ON")
+        cur.executescript(SQLITE_SCHEMA)
+        if seed:
+            cur.execute("SELECT count(*) FROM store")
+            if cur.fetchone()[0] == 0:
+                cur.executemany(
+                    "INSERT INTO store (item_id, name, price, qty) VALUES (?,?,?,?)",
+                    [(item_id, info["name"], _price(info["price"]), info["qty"]) for item_id, info in seed.items()]
+                )
+        cur.close()
+
+    @timed("sqlite.fetch_all_store_items")
+    def fetch_all_store_items(self):
+        with self._lock:
+            cur = self._conn.execute("SELECT item_id, name, price, qty FROM store ORDER BY item_id")
+            rows = cur.fetchall()
+        return [{"item_id": item_id, "name": name, "price": price, "qty": qty} for item_id, name, price, qty in rows]
+
+    @timed("sqlite.update_store_qty")
+    def update_store_qty(self, item_id, qty_change):
+        with self._lock:
+            self._conn.execute("UPDATE store SET qty = qty + ? WHERE item_id = ?", (qty_change, item_id))
+
+    @timed("sqlite.save_order")
+    def save_order(self, customer, cart, delivery_charge, grand_total):
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                cur.execute(
+                    "INSERT INTO customer (name, phone, address) VALUES (?,?,?)",
+                    (customer['name'], customer['phone'], customer['address'])
+                )
+                cur.execute(
+                    "INSERT INTO orders (customer_id, delivery_charge, grand_total) VALUES (?,?,?)",
+                    (cur.lastrowid, to_rupees(delivery_charge or 0), to_rupees(grand_total))
+                )
+                order_id = cur.lastrowid
+                if cart:
+                    item_ids = list(cart)
+                    placeholders = ",".join("?" * len(item_ids))
+                    cur.execute(f"SELECT item_id, price FROM store WHERE item_id IN ({placeholders})", item_ids)
+                    prices = dict(cur.fetchall())
+                    missing = [item_id for item_id in item_ids if item_id not in prices]
+                    if missing:
+                        raise ValueError(f"Items not found in store: {missing}")
+                    cur.executemany(
+                        "INSERT INTO order_items (order_id, item_id, quantity, price) VALUES (?,?,?,?)",
+                        [(order_id, item_id, qty, prices[item_id]) for item_id, qty in cart.items()]
+                    )
+                    cur.executemany(
+                        "UPDATE store SET qty = qty - ? WHERE item_id = ?",
+                        [(qty, item_id) for item_id, qty in cart.items()]
+                    )
+                cur.execute("COMMIT")
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+            finally:
+                cur.close()
+        return order_id
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class PostgresStorage(Storage):
+    """The psycopg2 helpers in db.py (pooled connections, batched save_order)."""
+
+    def __init__(self):
+        import db
+        from customers import ensure_customer_schema
+        ensure_customer_schema()
+        self._db = db
+
+    def fetch_all_store_items(self):
+        return self._db.fetch_all_store_items()
+
+    def update_store_qty(self, item_id, qty_change):
+        self._db.update_store_qty(item_id, qty_change)
+
+    def save_order(self, customer, cart, delivery_charge, grand_total):
+        return self._db.save_order(customer, cart, delivery_charge, grand_total)
+
+    def close(self):
+        self._db.get_pool().closeall()
+
+
+def open_storage(kind, path=SQLITE_PATH, seed=None):
+    """kind is 'memory', 'sqlite' or 'postgres'. seed fills an empty memory/SQLite store."""
+    if kind == "memory":
+        return MemoryStorage(seed or {})
+    if kind == "sqlite":
+        return SQLiteStorage(path, seed=seed)
+    if kind == "postgres":
+        return PostgresStorage()
+    raise ValueError(f"Unknown storage: {kind!r} (choose memory, sqlite or postgres)")
@@ -0,0 +1,62 @@
+from cart import Cart
+from money import format_money, percent_of, to_paise, to_rupees
+
+
+def make_store():
+    return {
+        1: {"name": "Apple", "price": 20.0, "qty": 50},
+        2: {"name": "Pen", "price": "0.10", "qty": 100},
+        3: {"name": "Milk (1L)", "price": 45.5, "qty": 2},
+    }
+
+
+def test_money_round_trips():
+    assert to_paise(0.1) == 10
+    assert to_paise("0.005") == 1
+    assert to_paise(45) == 4500
+    assert str(to_rupees(4550)) == "45.50"
+    assert percent_of(1001, "2.5") == 25
+    assert format_money(-5) == "-0.05"
+
+
+def test_totals_follow_every_change():
+    store = make_store()
+    cart = Cart(store)
+    assert cart.add(1, 3)
+    assert cart.add(2, 7)
+    assert cart.subtotal == 3 * 2000 + 7 * 10
+    assert cart.reserved_qty == 10
+
+    assert cart.set_qty(1, 1)
+    assert cart.remove(2) == 7
+    assert cart.subtotal == 2000
+    assert list(cart.lines()) == [(1, "Apple", 1, 2000, 2000)]
+    assert store[1]["qty"] == 49 and store[2]["qty"] == 100
+
+
+def test_out_of_stock_changes_nothing():
+    store = make_store()
+    cart = Cart(store)
+    assert cart.add(3, 2)
+    assert not cart.add(3, 1)
+    assert not cart.set_qty(3, 3)
+    assert cart.subtotal == 2 * 4550 and store[3]["qty"] == 0
+
+
+def test_clear_gives_stock_back():
+    store = make_store()
+    cart = Cart(store)
+    cart.add(1, 5)
+    cart.add(3, 1)
+    cart.clear()
+    assert cart.subtotal == 0 and cart.reserved_qty == 0 and not cart
+    assert store[1]["qty"] == 50 and store[3]["qty"] == 2
+
+
+def test_price_is_kept_when_the_catalog_changes():
+    store = make_store()
+    cart = Cart(store)
+    cart.add(1, 1)
+    store[1]["price"] = 99
+    cart.add(1, 1)
+    assert cart.subtotal == 4000
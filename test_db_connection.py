@@ -1,20 +1,27 @@
 import psycopg2
 
-# DB credentials
-DB_HOST = 'localhost'
-DB_NAME = 'shopping_cart'
-DB_USER = 'admin'
-DB_PASSWORD = 'admin123'
+from db import DB_HOST, DB_PORT, DB_REPLICAS, REPLICA_LAG, REPLICA_MAX_LAG, get_connection, parse_endpoint
 
-try:
-    conn = psycopg2.connect(
-        host=DB_HOST,
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
-    )
-    print("✅ Connection successful!")
-    conn.close()
-except psycopg2.Error as e:
-    print("❌ Connection failed.")
-    print("Error:", e)
+# The primary (DB_HOST) and every read replica in DB_REPLICAS / SHOP_DB_REPLICAS, e.g.
+#   SHOP_DB_REPLICAS=localhost:5433 python test_db_connection.py
+for role, (host, port) in [("primary", (DB_HOST, DB_PORT))] + [("replica", parse_endpoint(spec)) for spec in DB_REPLICAS]:
+    try:
+        conn = get_connection(host, port)
+        cur = conn.cursor()
+        cur.execute("SELECT pg_is_in_recovery()")
+        in_recovery = cur.fetchone()[0]
+        cur.execute(REPLICA_LAG)
+        lag = float(cur.fetchone()[0])
+        conn.close()
+        print(f"✅ {role} {host}:{port} connection successful!", end=" ")
+        if role == "primary" and in_recovery:
+            print("⚠️  but it is a standby: writes will fail.")
+        elif role == "replica" and not in_recovery:
+            print("⚠️  but it is not a standby: reads will see only its own data.")
+        elif role == "replica":
+            print(f"Lag {lag:.1f}s ({'serves reads' if lag <= REPLICA_MAX_LAG else f'over {REPLICA_MAX_LAG}s, reads go to the primary'}).")
+        else:
+            print()
+    except psycopg2.Error as e:
+        print(f"❌ {role} {host}:{port} connection failed.")
+        print("Error:", e)
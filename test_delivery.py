@@ -0,0 +1,36 @@
+from delivery import DeliveryPricing, Tiers
+
+
+def test_charge_at_tier_limits():
+    tiers = Tiers([[15, 50], [30, 100]])
+    assert tiers.charge_for(0) == 5000
+    assert tiers.charge_for(15) == 5000
+    assert tiers.charge_for(15.01) == 10000
+    assert tiers.charge_for(30) == 10000
+    assert tiers.charge_for(30.01) is None
+
+
+def test_nan_and_negative_distances_are_not_deliverable():
+    tiers = Tiers([[15, 50], [30, 100]])
+    for dist in (float("nan"), float("inf"), -0.5, -3):
+        assert tiers.charge_for(dist) is None
+    assert DeliveryPricing().charge_for_distance(float("nan")) is None
+
+
+def test_zones_and_surcharges():
+    pricing = DeliveryPricing({
+        "store": {"lat": 12.97, "lon": 77.59},
+        "tiers": [[15, 50], [30, 100]],
+        "surcharges": [{"name": "fuel", "percent": 5}, {"name": "packing", "flat": 10}],
+        "zones": [{"name": "airport", "bbox": [13.0, 77.6, 13.02, 77.62], "flat": 150},
+                  {"name": "lake", "bbox": [12.9, 77.5, 12.92, 77.52], "blocked": True}],
+    })
+    assert pricing.charge_for_distance(10) == 5000 + 250 + 1000
+    airport = pricing.zone_named("airport")
+    assert pricing.charge_for_distance(10, airport) == 15000 + 750 + 1000
+    assert pricing.charge_for_distance(1, pricing.zone_named("lake")) is None
+
+    quote = pricing.quote_location(13.01, 77.61)
+    assert quote.zone == "airport" and quote.charge == 16750
+    assert pricing.quote_location(12.91, 77.51).charge is None
+    assert pricing.zone_at(12.5, 77.0) is None
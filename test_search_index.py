@@ -0,0 +1,50 @@
+from search_index import SearchIndex
+
+
+def make_store():
+    return {
+        1: {"name": "Chocolate Milk", "qty": 5},
+        2: {"name": "Milk (1L)", "qty": 20},
+        3: {"name": "Apple Juice", "qty": 10},
+        4: {"name": "Milk Bread", "qty": 0},
+        5: {"name": "Apple", "qty": 50},
+        6: {"name": "Almond Milk", "qty": 3},
+    }
+
+
+def test_name_leading_match_ranks_first():
+    index = SearchIndex.from_store(make_store())
+    # in stock before sold out; names starting with the word first, then shorter names
+    assert index.search("milk") == [2, 6, 1, 4]
+    assert index.search("mil", 2) == [2, 6]
+
+
+def test_prefixes_of_every_term_must_match():
+    index = SearchIndex.from_store(make_store())
+    assert index.search("app jui") == [3]
+    assert index.search("app") == [5, 3]
+    assert index.search("milk app") == []
+    assert index.best("choc") == 1
+    assert index.search("") == [] and index.search("milk", 0) == []
+
+
+def test_stock_is_read_at_query_time():
+    store = make_store()
+    index = SearchIndex.from_store(store)
+    store[2]["qty"] = 0
+    assert index.search("milk") == [6, 1, 2, 4]
+
+
+def test_update_matches_a_fresh_index():
+    store = make_store()
+    index = SearchIndex.from_store(store)
+    store[7] = {"name": "Milkshake", "qty": 4}
+    index.update(7, store[7])
+    store[1] = {"name": "Dark Chocolate", "qty": 5}
+    index.update(1, store[1])
+    index.update(6, None)
+    del store[6]
+    fresh = SearchIndex.from_store(store)
+    for query in ("milk", "m", "choc", "dark choc", "a"):
+        assert index.search(query) == fresh.search(query)
+    assert index.search("milk") == [2, 7, 4]  # same length: lower id first
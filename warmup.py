@@ -0,0 +1,89 @@
+# warmup.py
+# Start-up work done on a background thread while the lane prints its banner.
+# The DB flow used to connect, check its schema and load the whole catalog before the
+# first menu could be drawn. Warmup runs that on a thread as soon as main() starts, and
+# PendingStore hands the first customer's menu a store that only waits for it when it is
+# first read, so the wait is whatever is left of the warm-up by then.
+import threading
+import time
+from collections.abc import Mapping
+
+from metrics import span
+
+
+class Warmup:
+    """
+    Runs target() on a daemon thread (or right away with background=False). wait()
+    returns its result, or raises what it raised.
+    """
+
+    def __init__(self, target, background=True, name="warmup"):
+        self._target = target
+        self._result = None
+        self._error = None
+        self._done = threading.Event()
+        self.seconds = None           # how long target() took
+        if background:
+            threading.Thread(target=self._run, name=name, daemon=True).start()
+        else:
+            self._run()
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            self._result = self._target()
+        except BaseException as e:
+            self._error = e
+        finally:
+            self.seconds = time.perf_counter() - start
+            self._done.set()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Warm-up still running after {timeout}s.")
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class PendingStore(Mapping):
+    """
+    The store a warm-up is still loading: load() (which waits for the warm-up) runs on
+    the first read, and every read after that goes straight to the loaded store. Other
+    attributes are forwarded to the loaded store the same way.
+    """
+
+    def __init__(self, load):
+        self._load = load
+        self._store = None
+
+    def _get(self):
+        if self._store is None:
+            with span("startup.warmup_wait"):
+                self._store = self._load()
+        return self._store
+
+    def __getattr__(self, name):
+        # anything else the loaded store offers (e.g. LazyCatalog.remember / pin) waits for it too
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._get(), name)
+
+    def __getitem__(self, item_id):
+        return self._get()[item_id]
+
+    def __iter__(self):
+        return iter(self._get())
+
+    def __len__(self):
+        return len(self._get())
+
+    def __contains__(self, item_id):
+        return item_id in self._get()
+
+    def items(self):
+        return self._get().items()